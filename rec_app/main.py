@@ -111,6 +111,7 @@ class RecVars(EventDispatcher):
     hdf_compression_strenght = ConfigParserProperty(5, 'recording', "hdf_compression_strenght", "app_config", val_type=int)
     hdf_fletcher32 = ConfigParserProperty(True, 'recording', "hdf_fletcher32", "app_config", val_type=val_type_loader)
     hdf_shuffle = ConfigParserProperty(True, 'recording', "hdf_shuffle", "app_config", val_type=val_type_loader)
+    hdf_compression_pars = ConfigParserProperty('', 'recording', "hdf_compression_pars", "app_config", val_type=str)
     
     def __init__(self, val_dict, **kwargs):
         self.app = App.get_running_app()
@@ -124,6 +125,7 @@ class RecVars(EventDispatcher):
         self.bind(hdf_compression_strenght=lambda inst, val: self.set_val('hdf_compression_strenght', val))
         self.bind(hdf_fletcher32=lambda inst, val: self.set_val('hdf_fletcher32', val))
         self.bind(hdf_shuffle=lambda inst, val: self.set_val('hdf_shuffle', val))
+        self.bind(hdf_compression_pars=lambda inst, val: self.set_val('hdf_compression_pars', val))
 
     def set_val(self, key, val):
         """
@@ -0,0 +1,182 @@
+"""
+Decoding of incoming interface data to rows of the line buffer
+
+Used by the Interface and by processes that decode the data of an interface
+themselves (see interface_drivers/serial_process_controller.py)
+"""
+
+import numpy as np
+
+
+class DataDecoder:
+    """
+    Mixin that converts incoming data (dictionaries from json lines or blocks
+    of records from binary frames) to rows / blocks of the line buffer and 
+    converts the controller time stamps (us) to absolute time
+
+    Attributes:
+        line_fields (list): (chip, subpar) for each field in the line buffer (subpar is None for top level values)
+        starttime (float): The start time of the controller.
+        lasttime (float): The last recorded time.
+        samplerate (int): The sample rate of the controller.
+        emarate (float): The theoretical maximum of the EMA (Exponential Moving Average) rate.
+
+    Methods:
+        compile_decoder(): Compiles the function that converts incoming data to a row of the line buffer.
+        decode_block(records, dtype): Converts a block of records to a block of the line buffer.
+        _recorded_chips(): Returns the chips that are recorded (override).
+        _set_chip_status(chip, status): Called with the status of a chip while decoding (override).
+        _do_time(us): Processes the timestamp of the data.
+        _do_time_block(us): Processes the timestamps of a block of data.
+        _calc_ema(dt): Calculates the Exponential Moving Average (EMA) rate.
+    """
+    line_fields = []
+    starttime = 0
+    lasttime = None
+    samplerate = 256
+    emarate = 0
+
+    _decoder = None                     # compiled function to convert incoming data to a row
+    _decoder_chips = frozenset()        # chips that were recorded when decoder was compiled
+
+    def compile_decoder(self):
+        """
+        Compiles a function that converts the incoming data dictionary to a row
+        (tuple) for the line buffer, so that field names do not have to be split and
+        looked up for every sample. Fields of chips that are not recorded are nan.
+        The status of the chips ("#ST") is updated while decoding.
+
+        e.g. for line fields: [("time", None), ("OIS", "SIG"), ("OIS", "STIM")]:
+
+            def decode(data):
+                c0 = data.get('OIS', EMPTY)
+                if '#ST' in c0: set_status('OIS', c0['#ST'])
+                return (data.get('time', nan), c0.get('SIG', nan), c0.get('STIM', nan),)
+        """
+        recorded = self._recorded_chips()
+        chip_vars = {chip: f"c{i}" for i, chip in enumerate(
+            dict.fromkeys(chip for chip, subpar in self.line_fields 
+                          if subpar is not None and chip in recorded))}
+
+        values = []
+        for chip, subpar in self.line_fields:
+            if subpar is None:
+                values.append(f"data.get({chip!r}, nan)")
+            elif chip in chip_vars:
+                values.append(f"{chip_vars[chip]}.get({subpar!r}, nan)")
+            else:
+                values.append("nan")
+
+        code = ["def decode(data):"]
+        for chip, var in chip_vars.items():
+            code.append(f"    {var} = data.get({chip!r}, EMPTY)")
+            code.append(f"    if '#ST' in {var}: set_status({chip!r}, {var}['#ST'])")
+        code.append(f"    return ({', '.join(values)},)")
+
+        namespace = {"nan": np.nan, "EMPTY": {}, "set_status": self._set_chip_status}
+        exec("\n".join(code), namespace)
+
+        self._decoder = namespace["decode"]
+        self._decoder_chips = recorded
+
+    def decode_block(self, records, dtype):
+        """
+        converts a block of records (from a binary frame) to the dtype of the 
+        line buffer, time is calculated from us
+
+        Args:
+            records (np.ndarray): structured array with new data
+            dtype (np.dtype): dtype of the line buffer
+
+        Returns:
+            np.ndarray: block with dtype of the line buffer
+        """
+        block = np.empty(records.shape[0], dtype=dtype)
+        for name in records.dtype.names:
+            block[name] = records[name]
+        t = block["time"] = self._do_time_block(records["us"])
+
+        if records.shape[0] > 1:
+            # mean time step from the absolute time, so that loops of us are counted
+            self._calc_ema((t[-1] - t[0]) * 1e6 / (records.shape[0] - 1), n=records.shape[0])
+        return block
+
+    def _recorded_chips(self):
+        """
+        returns names of the chips that are recorded (placeholder)
+        """
+        return set()
+
+    def _set_chip_status(self, chip, status):
+        """
+        placeholder for function that is called with the status of a chip 
+        """
+        pass
+
+    def _do_time(self, us):
+        """
+        convert relative micro seconds to absolute time
+
+        Args:
+            us (int): microseconds since start of recording
+
+        Returns:
+            float: absolute time
+        """
+        sec = us * 1e-6
+
+        if self.lasttime is None:
+            # adjust starttime to start of rec on arduino
+            self.starttime -= sec
+            self.lasttime = 0
+
+        # track last time to count loop of us
+        if sec < self.lasttime:
+            self.starttime += 0xFFFF_FFFF / 1e6
+        self.lasttime = sec
+
+        t = self.starttime + sec
+        return t
+
+    def _do_time_block(self, us):
+        """
+        convert a block of relative micro seconds to absolute time
+        (vectorized version of _do_time)
+
+        Args:
+            us (np.ndarray): microseconds since start of recording
+
+        Returns:
+            np.ndarray: absolute time
+        """
+        sec = us * 1e-6
+
+        if self.lasttime is None:
+            # adjust starttime to start of rec on arduino
+            self.starttime -= sec[0]
+            self.lasttime = 0
+
+        # count loops of us
+        loops = np.cumsum(sec < np.concatenate(([self.lasttime], sec[:-1])))
+        t = self.starttime + loops * (0xFFFF_FFFF / 1e6) + sec
+
+        self.starttime += loops[-1] * (0xFFFF_FFFF / 1e6)
+        self.lasttime = sec[-1]
+        return t
+
+    def _calc_ema(self, dt, n=1):
+        """
+        update ema of the sample rate
+
+        Args:
+            dt (float): time between samples in microseconds
+            n (int, optional): number of samples dt is averaged over. Defaults to 1.
+        """
+        if dt == 0:
+            return
+        dt /= 1e6
+        if self.emarate == 0:
+            self.emarate = 1 / dt
+        else:
+            n_ema = self.samplerate * 60  # ema over 1 min
+            self.emarate += ((1 / dt) - self.emarate) * min(1, n / n_ema)
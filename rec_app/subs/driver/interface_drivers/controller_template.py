@@ -15,6 +15,7 @@ class Controller:
     disconnected = asyncio.Event()
 
     device = None # placeholder for the device or bus driver
+    decodes_data = False # True if the controller decodes and saves the data itself (see set_decoder)
 
     @final
     def __init__(self, **kwargs) -> None:
@@ -48,6 +49,33 @@ class Controller:
         """
         pass
 
+    def do_block(self, *args, **kwargs) -> None:
+        """
+        placeholder for function called with new data blocks (np.ndarray with records)
+        """
+        pass
+
+    def negotiate_frames(self, dtype=None) -> None:
+        """
+        propose a binary data format with records of dtype to the device,
+        does nothing for controllers that do not support binary frames
+        """
+        pass
+
+    def set_decoder(self, schema=None) -> None:
+        """
+        placeholder for controllers that decode and save the data themselves:
+        schema (dict) describes the line buffer and the shared buffer to write to
+        (see Interface._decoder_schema), None stops decoding
+        """
+        pass
+
+    def update_decoder(self, **kwargs) -> None:
+        """
+        placeholder: update parts of the schema (e.g. recorded chips)
+        """
+        pass
+
     async def on_connect_default(self, *args, **kwargs) -> None:
         """
         called when connected
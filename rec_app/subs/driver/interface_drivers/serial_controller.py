@@ -1,7 +1,21 @@
 """
 Interface driver for RPi pico micro controller
 
+Data is received as json lines (newline delimited) or, when negotiated with the
+controller, as binary frames:
 
+    | magic (2) | schema id (u2) | n samples (u2) | payload bytes (u4) | crc32 (u4) | payload |
+
+    - magic:        FRAME_MAGIC (cannot start a line of (utf-8) json text),
+                    frames are only detected at the start of a line or
+                    directly after another frame
+    - schema id:    id of the record format (see frame_schema_id)
+    - n samples:    number of records in the payload
+    - payload:      packed little endian records with the negotiated dtype
+    - crc32:        crc32 of the payload
+
+all header values are little endian. Idle, CTRL and feedback messages are
+always sent as json lines
 """
 from subs.driver.interface_drivers.controller_template import Controller
 
@@ -13,6 +27,11 @@ from serial.tools import list_ports
 import json
 from json import JSONDecodeError
 
+import struct
+import time
+import zlib
+import numpy as np
+
 
 # Logger
 try:
@@ -28,18 +47,100 @@ except:
     log = lambda *args: print("SERIAL_CTRL", *args)
 
 
+FRAME_MAGIC = b"\xa5\x5a"                       # start of binary frame
+FRAME_MAGIC_START = FRAME_MAGIC[0]
+FRAME_BOUNDARY = b"\n" + FRAME_MAGIC            # frames are only detected at the start of a line
+FRAME_HEADER = struct.Struct("<2sHHII")         # magic, schema id, n samples, payload bytes, crc32
+MAX_FRAME_SIZE = 0x10_0000                      # max payload size, larger frames are considered corrupt
+
+
+def frame_schema_id(dtype):
+    """
+    creates the id of a record format for binary frames
+
+    Args:
+        dtype (np.dtype): dtype of the records
+
+    Returns:
+        int: 16 bit schema id (never 0, 0 indicates the json protocol)
+    """
+    return (zlib.crc32(str(np.dtype(dtype).descr).encode()) & 0xFFFF) or 1
+
+
+def encode_frame(schema_id, records):
+    """
+    packs records in a binary frame (reference for the controller drivers and testing)
+
+    Args:
+        schema_id (int): schema id of the record format
+        records (np.ndarray): records to send (little endian)
+
+    Returns:
+        bytes: frame
+    """
+    payload = records.tobytes()
+    return FRAME_HEADER.pack(FRAME_MAGIC, schema_id, records.shape[0],
+                             len(payload), zlib.crc32(payload)) + payload
+
+
+class FramingStats():
+    """
+    Counts received bytes, lines and frames of a protocol
+
+    - frames:       number of binary frames received
+    - lines:        number of lines received
+    - bytes:        number of bytes processed (complete lines and frames)
+    - max_pending:  max number of bytes waiting for the rest of their line / frame
+    - errors:       number of corrupt frames
+    """
+    def __init__(self) -> None:
+        self.frames = self.lines = self.bytes = self.max_pending = self.errors = 0
+        self._last = (time.monotonic(), 0, 0, 0)
+
+    def rates(self):
+        """
+        returns rates since the previous call and resets max pending
+
+        Returns:
+            dict: frames/s, lines/s, bytes/s, max pending bytes and errors
+        """
+        now = time.monotonic()
+        t, frames, lines, n_bytes = self._last
+        dt = (now - t) or 1e-9
+        out = {"frames/s": (self.frames - frames) / dt,
+               "lines/s": (self.lines - lines) / dt,
+               "bytes/s": (self.bytes - n_bytes) / dt,
+               "max pending": self.max_pending,
+               "errors": self.errors,
+               }
+        self._last = (now, self.frames, self.lines, self.bytes)
+        self.max_pending = 0
+        return out
+
+    def summary(self):
+        """
+        returns the rates since the previous call as text for the log
+        """
+        return ", ".join(f"{k}: {v:,.0f}" for k, v in self.rates().items())
+
+
 class IOProtocol(asyncio.Protocol):
-    sub_buffer = bytearray()  # sub buffer to cache incoming data until '\n is found'
     parent = None
     transport = None
 
-    RECV_BUFFER_SIZE = 10000
     DELIMITER = b"\n"
+    frames = False                      # detect binary frames (only json lines if False, see Controller.negotiate_frames)
 
     def __init__(self, **kwargs) -> None:
         self.__dict__.update(kwargs)
         super().__init__()
 
+        # data is kept here until a complete line or frame is received, 
+        # processed data is deleted from the front (which does not copy the rest)
+        self.sub_buffer = bytearray()
+
+        self.stats = FramingStats()
+
     def connection_made(self, transport):
         self.transport = transport
         transport.serial.rts = False  # You can manipulate Serial object via transport
@@ -51,10 +152,115 @@ class IOProtocol(asyncio.Protocol):
         self.save(data)
 
     def save(self, incoming):
-        self.sub_buffer.extend(incoming)
-        if self.DELIMITER in self.sub_buffer:
-            *data, self.sub_buffer = self.sub_buffer.split(self.DELIMITER)
-            [self.do(d) for d in data]
+        buf = self.sub_buffer
+        n_old = len(buf)
+        buf += incoming
+
+        # the pending data contains no complete line, only the new data has to be 
+        # searched for lines and frames, unless a frame is waiting to be completed
+        if buf.find(b"\n", n_old) == -1:
+            if self.frames and buf and buf[0] == FRAME_MAGIC_START:
+                self._save_framed()
+            return
+        if (self.frames and buf.find(FRAME_MAGIC_START) != -1                 # fast (memchr) pre check
+                and (buf[0] == FRAME_MAGIC_START or buf.find(FRAME_BOUNDARY, n_old) != -1)):
+            self._save_framed()
+            return
+
+        # only lines: process all complete lines at once
+        *lines, rest = buf.split(b"\n")
+        self.sub_buffer = rest
+        do = self.do
+        for line in lines:
+            do(line)
+
+        stats = self.stats
+        stats.lines += len(lines)
+        stats.bytes += len(buf) - len(rest)
+        if len(buf) > stats.max_pending:
+            stats.max_pending = len(buf)                # pending data is largest when a line is complete
+
+    def _save_framed(self):
+        """
+        processes the lines and frames in the receive buffer, frames are only
+        detected at the start of a line or directly after another frame
+        """
+        buf = self.sub_buffer
+        start, end = 0, len(buf)
+        if end > self.stats.max_pending:
+            self.stats.max_pending = end                # pending data is largest when a line or frame is complete
+
+        while start < end:
+            if buf[start] == FRAME_MAGIC_START and buf.startswith(FRAME_MAGIC, start):
+                n_bytes = self.save_frame(start)
+                if not n_bytes:
+                    break           # wait for rest of frame
+                start += n_bytes
+                continue
+
+            # lines upto the next frame
+            frame_start = buf.find(FRAME_BOUNDARY, start)
+            idx = buf.rfind(b"\n", start, end if frame_start == -1 else frame_start + 1)
+            if idx == -1:
+                break               # wait for rest of line (or of the magic)
+
+            # process all complete lines at once
+            lines = buf[start:idx].split(b"\n")
+            do = self.do
+            for line in lines:
+                do(line)
+            self.stats.lines += len(lines)
+            start = idx + 1
+            if frame_start == -1:
+                break               # rest is an incomplete line
+
+        self.stats.bytes += start
+        del buf[:start]
+
+    def save_frame(self, start):
+        """
+        unpacks binary frame at start of the receive buffer
+
+        Args:
+            start (int): position of the frame magic in the receive buffer
+
+        Returns:
+            int: number of bytes processed, 0 if the frame is not complete yet
+        """
+        buf = self.sub_buffer
+        if len(buf) - start < FRAME_HEADER.size:
+            return 0
+
+        _, schema_id, n_samples, n_bytes, crc = FRAME_HEADER.unpack_from(buf, start)
+        if n_bytes > MAX_FRAME_SIZE:
+            return self._resync(start)
+
+        frame_end = start + FRAME_HEADER.size + n_bytes
+        if len(buf) < frame_end:
+            return 0
+
+        payload = buf[start + FRAME_HEADER.size:frame_end]      # copy, the receive buffer changes
+        if zlib.crc32(payload) != crc:
+            return self._resync(start)
+
+        self.do_frame(schema_id, n_samples, payload)
+        self.stats.frames += 1
+        return frame_end - start
+
+    def _resync(self, start):
+        """
+        drop corrupt data upto the next frame or line
+
+        Returns:
+            int: number of bytes to drop
+        """
+        log("corrupt frame received, dropping data until next frame or line", "warning")
+        self.stats.errors += 1
+        buf = self.sub_buffer
+        ends = [i - start for i in (buf.find(FRAME_MAGIC, start + 1),
+                                    buf.find(self.DELIMITER, start + 1) + len(self.DELIMITER))
+                if i > start]
+        return min(ends, default=len(buf) - start)
 
     def write(self, data):
         if self.transport is not None:
@@ -86,6 +292,12 @@ class IOProtocol(asyncio.Protocol):
         """
         pass
 
+    def do_frame(self, schema_id, n_samples, payload):
+        """
+        placeholder for function which is called with new binary frames
+        """
+        pass
+
     def on_connection_loss(self):
         """
         placeholder for what is called when connection is lost
@@ -122,11 +334,16 @@ class SerialController(Controller):
     )
     BAUDRATE = 20_000_000
 
+    frame_dtype = None      # dtype of records in binary frames, None if json protocol is used
+    frame_schema_id = 0     # schema id of the negotiated frame format (0: json)
+
     async def start(self) -> None:
         await self._setup_reader(self.device)
         log(f"connected to {self.device}", "info")
 
     def _on_connection_loss(self):
+        if self.protocol is not None:
+            log(f"disconnected from {self.device}, received: {self.protocol.stats.summary()}", "info")
         self.disconnected.set()
         self.EXIT.set()
         self.connected.clear()
@@ -147,6 +364,7 @@ class SerialController(Controller):
 
         # connect functions that are called on new data, and changes in connection
         self.protocol.do = self._preprocess_data
+        self.protocol.do_frame = self._preprocess_frame
         self.protocol.on_connection_loss = self._on_connection_loss
         self.protocol.on_write_pause, self.protocol.on_write_resume = (
             self.on_write_pause,
@@ -170,6 +388,46 @@ class SerialController(Controller):
             pass  # data is string (feedback etc)
         self.do(data)
 
+    def _preprocess_frame(self, schema_id, n_samples, payload):
+        if schema_id != self.frame_schema_id or self.frame_dtype is None:
+            log(f"frame with unknown schema: {schema_id}, dropped", "debug")
+            return
+        self.do_block(np.frombuffer(payload, dtype=self.frame_dtype, count=n_samples))
+
+    def negotiate_frames(self, dtype=None):
+        """
+        propose binary frames with records of dtype to the controller, frames
+        with this format are decoded from now on. The controller confirms with 
+        {"CTRL": {"frame": schema id}} if it supports the format, otherwise
+        data is received as json lines.
+
+        Args:
+            dtype (np.dtype, optional): dtype of records, None switches back
+                                        to the json protocol. Defaults to None.
+        """
+        if dtype is None:
+            self.frame_dtype, self.frame_schema_id = None, 0
+            self.write({"CTRL": {"frame": 0}})
+            return
+
+        dtype = np.dtype(dtype).newbyteorder("<")
+        self.frame_dtype, self.frame_schema_id = dtype, frame_schema_id(dtype)
+        if self.protocol:
+            self.protocol.frames = True             # detect frames from now on (also if they are refused)
+        self.write({"CTRL": {"frame": {"id": self.frame_schema_id,
+                                       "fields": list(dtype.names),
+                                       "dtypes": [dtype[n].str for n in dtype.names],
+                                       }}})
+
+    def framing_stats(self):
+        """
+        returns statistics of received data since the previous call 
+        (frames/s, lines/s, bytes/s, max pending bytes, errors)
+        """
+        if self.protocol is None:
+            return {}
+        return self.protocol.stats.rates()
+
     def on_write_pause(self):
         """
         called when writing is paused
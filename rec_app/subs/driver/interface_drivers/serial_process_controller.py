@@ -0,0 +1,352 @@
+"""
+Interface driver for RPi pico micro controller that reads and decodes the
+serial data in a separate process
+
+The worker process reads the serial port, decodes json lines and binary frames
+and writes the data directly in the shared buffer. Only control, idle and
+feedback messages are sent to the interface in the GUI process (through a queue),
+so that the recording does not depend on the load of the GUI (and vice versa).
+
+Flow:
+    1. the worker sends all messages to the interface until the first data arrives
+    2. the first data is sent to the interface, which creates the line buffer and
+       the shared buffer from it and sends the schema back (set_decoder); data
+       that arrives in the meantime is kept by the worker
+    3. the worker decodes all data (incl. the kept data) and writes it to the shared buffer
+    4. on (re)start of a recording, the interface resets the decoder (set_decoder(None))
+       and the flow starts again at 1.
+"""
+from subs.driver.interface_drivers.controller_template import Controller
+from subs.driver.interface_drivers.serial_controller import (
+    IOProtocol, SerialController, frame_schema_id)
+from subs.driver.data_decoder import DataDecoder
+from subs.recording.buffer import SharedBuffer, BlockWriter
+
+import asyncio
+import json
+from json import JSONDecodeError
+import time
+from multiprocessing import Process, Queue
+from queue import Empty
+
+import numpy as np
+import serial
+
+
+# Logger
+try:
+    from subs.log import create_logger
+
+    logger = create_logger()
+
+    def log(message, level="info"):
+        cls_name = "SERIAL_PROCESS"
+        getattr(logger, level)(f"{cls_name}: {message}")  # change CLASSNAME here
+
+except:
+    log = lambda *args: print("SERIAL_PROCESS", *args)
+
+
+class SerialWorker(DataDecoder):
+    """
+    Reads and decodes data from the serial port, runs in a separate process
+
+    - device:       serial port
+    - baudrate:     baudrate of serial port
+    - q_in:         queue with commands from the controller: (cmd, value)
+                        "write":    bytes to write to the serial port
+                        "decoder":  schema to decode and save data (dict), None to stop
+                        "update":   update parts of the schema (dict)
+                        "frames":   dtype (descr) of binary frames, None for json lines
+                        "stop":     stop the worker
+    - q_out:        queue with messages for the controller (decoded json or bytes),
+                    None indicates that the connection is lost
+    """
+    READ_TIMEOUT = 0.01             # max time to wait for serial data
+    MAX_PENDING = 0x1_0000          # max number of samples to keep while waiting for the schema
+    REPORT_INTERVAL = 1             # interval (s) to send rate and chip status to the interface
+    STATS_INTERVAL = 600            # interval (s) to log the framing statistics
+
+    def __init__(self, device, baudrate, q_in, q_out) -> None:
+        self.device = device
+        self.baudrate = baudrate
+        self.q_in = q_in
+        self.q_out = q_out
+
+        self.running = False
+        self.schema = None              # schema received from interface
+        self.pending = None             # data that arrived while waiting for the schema
+        self.block_writer = None
+        self.chip_status = {}           # chip status changes since last report
+        self.recorded = set()
+
+        self.frame_dtype = None
+        self.frame_schema_id = 0
+        self.protocol = None            # splits the data in lines and frames (see IOProtocol)
+
+    def run(self):
+        try:
+            port = serial.Serial(self.device, baudrate=self.baudrate,
+                                 timeout=self.READ_TIMEOUT)
+        except serial.SerialException as e:
+            log(f"cannot open {self.device}: {e}", "error")
+            self.q_out.put(None)
+            return
+
+        self.shared_buffer = SharedBuffer()
+        protocol = self.protocol = IOProtocol(do=self.on_line, do_frame=self.on_frame)
+        last_report = last_stats = time.monotonic()
+        self.running = True
+
+        try:
+            while self.running:
+                self.process_commands(port)
+                data = port.read(port.in_waiting or 1)
+                if data:
+                    protocol.save(data)
+
+                elif self.block_writer is not None:
+                    self.block_writer.flush()   # no new data: write what is collected
+
+                if time.monotonic() - last_report >= self.REPORT_INTERVAL:
+                    self.report()
+                    last_report = time.monotonic()
+
+                if last_report - last_stats >= self.STATS_INTERVAL:
+                    log(f"received: {protocol.stats.summary()}", "info")
+                    last_stats = last_report
+
+        except (serial.SerialException, OSError) as e:
+            log(f"connection with {self.device} lost: {e}", "warning")
+
+        finally:
+            if self.block_writer is not None:
+                self.block_writer.flush()
+            port.close()
+            log(f"disconnected from {self.device}, received: {protocol.stats.summary()}", "info")
+            self.q_out.put(None)
+
+    def process_commands(self, port):
+        """
+        process all commands from the controller
+        """
+        try:
+            while True:
+                cmd, value = self.q_in.get_nowait()
+                if cmd == "write":
+                    port.write(value)
+                elif cmd == "decoder":
+                    self.set_decoder(value)
+                elif cmd == "update":
+                    self.update_decoder(value)
+                elif cmd == "frames":
+                    self.frame_dtype = None if value is None else np.dtype(value)
+                    self.frame_schema_id = 0 if value is None else frame_schema_id(self.frame_dtype)
+                    if value is not None:
+                        self.protocol.frames = True     # detect frames from now on
+                elif cmd == "stop":
+                    self.running = False
+        except Empty:
+            pass
+
+    def set_decoder(self, schema):
+        """
+        set up decoding and saving of data with the schema of the interface,
+        or stop decoding if schema is None
+        """
+        if self.block_writer is not None:
+            self.block_writer.flush()
+
+        self.schema = schema
+        self.block_writer = None
+
+        if schema is None:
+            self.pending = None
+            return
+
+        # link to (new) buffer of the interface
+        name = schema["buffer_name"]
+        self.shared_buffer.check_new()
+
+        self.line_dtype = np.dtype(schema["dtype"])
+        self.line_fields = schema["line_fields"]
+        self.recorded = set(schema["recorded"])
+        self.starttime, self.lasttime = schema["starttime"], schema["lasttime"]
+        self.samplerate, self.emarate = schema["samplerate"], schema["emarate"]
+        self.compile_decoder()
+
+        self.block_writer = BlockWriter(self.shared_buffer, name, self.line_dtype,
+                                        block_size=schema["block_size"],
+                                        max_latency=schema["max_latency"])
+
+        # decode data that arrived while waiting for the schema
+        pending, self.pending = self.pending or [], None
+        [self.save_data(data) for data in pending]
+
+    def update_decoder(self, update):
+        """
+        update parts of the schema and recompile the decoder
+        """
+        if self.schema is None:
+            return
+        self.schema.update(update)
+        self.recorded = set(self.schema["recorded"])
+        self.compile_decoder()
+
+    def on_line(self, line):
+        try:
+            data = json.loads(line)
+        except (JSONDecodeError, TypeError):
+            self.q_out.put(line)            # data is string (feedback etc)
+            return
+
+        if not isinstance(data, dict):
+            self.q_out.put(data)
+            return
+
+        if "CTRL" in data:
+            self.q_out.put({"CTRL": data.pop("CTRL")})
+
+        if not data:
+            return
+
+        if "idle" in data:
+            self.q_out.put(data)
+
+        elif self.block_writer is not None:
+            self.save_data(data)
+
+        elif self.pending is None:
+            # first data: send to interface to create the schema
+            self.pending = [data]
+            self.q_out.put(json.loads(line))
+
+        elif len(self.pending) < self.MAX_PENDING:
+            self.pending.append(data)
+
+    def on_frame(self, schema_id, n_samples, payload):
+        if (self.block_writer is None or self.frame_dtype is None
+                or schema_id != self.frame_schema_id):
+            return
+        records = np.frombuffer(payload, dtype=self.frame_dtype, count=n_samples)
+        block = self.decode_block(records, self.line_dtype)
+        self.block_writer.flush()
+        self.shared_buffer.add_to_buf(self.schema["buffer_name"], block)
+
+    def save_data(self, data):
+        if ("us" in data) and ("time" not in data):
+            data["time"] = self._do_time(data["us"])
+
+        if "sDt" in data:
+            self._calc_ema(data.pop("sDt"))
+
+        self.block_writer.add(self._decoder(data))
+
+    def report(self):
+        """
+        send rate and chip status changes to the interface
+        """
+        if self.schema is None:
+            return
+        out = {"emarate": self.emarate}
+        if self.chip_status:
+            out["chip_status"], self.chip_status = self.chip_status, {}
+        self.q_out.put({"CTRL": out})
+
+    def _recorded_chips(self):
+        return self.recorded
+
+    def _set_chip_status(self, chip, status):
+        self.chip_status[chip] = status
+
+
+class SerialProcessController(Controller):
+    """
+    Controller for serial devices that reads and decodes the data in a
+    separate process (see SerialWorker)
+    """
+    BAUDRATE = SerialController.BAUDRATE
+    DEVICES = SerialController.DEVICES
+    JOIN_TIMEOUT = 2                # time to wait for worker to stop
+    decodes_data = True
+
+    q_in = None                     # messages from worker
+    q_out = None                    # commands for worker
+    worker = None                   # worker process
+
+    def _setup(self) -> None:
+        self.connected = asyncio.Event()
+        self.disconnected = asyncio.Event()
+        self.EXIT = asyncio.Event()
+
+    async def start(self) -> None:
+        self.q_in, self.q_out = Queue(), Queue()
+        self.worker = Process(target=SerialWorker(self.device, self.BAUDRATE,
+                                                  self.q_out, self.q_in).run,
+                              daemon=True)
+        self.worker.start()
+        await self.on_connect_default(self.device)
+        log(f"connected to {self.device} (worker pid: {self.worker.pid})", "info")
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self.EXIT.is_set():
+            msg = await loop.run_in_executor(None, self.q_in.get)
+            if msg is None:
+                break                   # connection lost
+            self._preprocess_data(msg)
+
+        self.connected.clear()
+        self.disconnected.set()
+        self.on_disconnect(self)
+
+    def write(self, data):
+        if self.q_out is None:
+            return
+        data = json.dumps(data)
+        if isinstance(data, str):
+            data = data.encode()
+        self.q_out.put(("write", data + b"\n"))
+
+    def set_decoder(self, schema=None):
+        """
+        let the worker decode and save the data with the schema of the interface,
+        None stops decoding in the worker (data is sent to the interface again)
+        """
+        if self.q_out is not None:
+            self.q_out.put(("decoder", schema))
+
+    def update_decoder(self, **kwargs):
+        if self.q_out is not None:
+            self.q_out.put(("update", kwargs))
+
+    def negotiate_frames(self, dtype=None):
+        """
+        propose binary frames to the controller, see SerialController.negotiate_frames
+        """
+        if self.q_out is None:
+            return
+        if dtype is None:
+            self.q_out.put(("frames", None))
+            self.write({"CTRL": {"frame": 0}})
+            return
+
+        dtype = np.dtype(dtype).newbyteorder("<")
+        self.q_out.put(("frames", dtype.descr))
+        self.write({"CTRL": {"frame": {"id": frame_schema_id(dtype),
+                                       "fields": list(dtype.names),
+                                       "dtypes": [dtype[n].str for n in dtype.names],
+                                       }}})
+
+    def stop(self):
+        self.EXIT.set()
+        if self.q_out is not None:
+            self.q_out.put(("stop", None))
+
+    def exit(self, *args, **kwargs):
+        if self.worker is None:
+            return
+        self.worker.join(self.JOIN_TIMEOUT)
+        if self.worker.is_alive():
+            self.worker.kill()
+            self.worker.join()
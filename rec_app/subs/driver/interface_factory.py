@@ -9,11 +9,13 @@ from serial.tools import list_ports
 from subs.driver.interfaces import Interface
 from subs.driver.interface_drivers.internal_controller import InternalController
 from subs.driver.interface_drivers.serial_controller import SerialController
+from subs.driver.interface_drivers.serial_process_controller import SerialProcessController
 from subs.driver.interface_drivers.broadcast_receiver import BroadCastController
 
 import asyncio
 import traceback
 from subs.log import create_logger
+from subs.gui.vars import SERIAL_WORKER_PROCESS
 
 
 
@@ -152,7 +154,8 @@ class InterfaceFactory:
         Create and start a serial interface for the given port.
 
         This function creates an Interface object with the given port,
-        on_connect, and on_disconnect callbacks, and a SerialController.
+        on_connect, and on_disconnect callbacks, and a SerialController
+        (or a SerialProcessController if SERIAL_WORKER_PROCESS is set).
         It then awaits the interface's async_start method and adds it to the
         connected_devices dictionary.
 
@@ -161,7 +164,7 @@ class InterfaceFactory:
 
         """
         interface = Interface(
-            SerialController,
+            SerialProcessController if SERIAL_WORKER_PROCESS else SerialController,
             on_connect=self.on_connect,
             on_disconnect=self.on_disconnect,
             device=port,
@@ -3,9 +3,11 @@ import json
 
 import time
 
-from subs.recording.buffer import SharedBuffer
+from subs.recording.buffer import SharedBuffer, BlockWriter
+from subs.recording.buffer_manager import BufferManager
 
 from subs.driver.interface_drivers.chip import Chip
+from subs.driver.data_decoder import DataDecoder
 
 from subs.gui.vars import INTERFACE_MINIMAL_VERSION
 
@@ -31,10 +33,10 @@ def log(message, level="info"):
     getattr(logger, level)(f"{cls_name}: {message}")  # change CLASSNAME here
 
 
-from subs.gui.vars import MAX_MEM
+from subs.gui.vars import MAX_MEM, BUFFER_SOA
 
 
-class Interface:
+class Interface(DataDecoder):
     """
     A class representing an interface for microcontroller devices
 
@@ -53,13 +55,19 @@ class Interface:
         samplerate (int): The sample rate of the controller.
         emarate (float): The theoretical maximum of the EMA (Exponential Moving Average) rate.
         current_rate (int): The current sample rate.
+        max_freq (int): The max sample rate of the current protocol (MAX_FREQ or MAX_FREQ_FRAMES).
+        requested_freq (int): The last sample rate set by the user, limited to max_freq when sent.
         buffer_length (int): The length of the buffer.
         micro (MicroController): The microcontroller object.
         shared_buffer (SharedBuffer): The shared buffer object.
+        buffer_manager (BufferManager): Divides MAX_MEM over the buffers of all interfaces.
+        block_writer (BlockWriter): Collects incoming samples and commits them to the shared buffer in blocks.
 
     Methods:
         connect_buffer(): Connects the buffer and sets the data structure.
         set_buffer_dims(data): Sets the dimensions of the buffer.
+        resize_buffer(length): Resizes the buffer (called by the buffer manager).
+        retention(): Time (s) of data that fits in the buffer.
         async_start(): Asynchronously starts the controller.
         start_stop(start=None): Starts or stops the controller.
         adjust_freq(freq): Adjusts the sample frequency of the controller.
@@ -68,22 +76,49 @@ class Interface:
         _on_disconnect(dev): Callback function when the controller is disconnected.
         on_disconnect(dev): Callback function when the controller is disconnected.
         on_incoming(): Handles incoming data from the microcontroller.
+        on_incoming_block(records): Handles incoming blocks of records (binary frames) from the microcontroller.
         do_idle(data): Processes idle data received from the microcontroller.
         do_new_data(data): Processes new data received from the microcontroller.
-        save_data(data): Saves the data in memory.
+        compile_decoder(): Compiles the function that converts incoming data to a row of the line buffer.
+        save_data(row): Saves a row of data in memory.
+        flush_data(): Commits samples that are still collected in the block writer.
         do_feedback(data, e): Handles feedback messages received from the microcontroller.
+        write(value): Sends commands to the controller (limits the recording frequency to max_freq).
         set_dev(dev): Sets the connected device information.
         _do_time(data): Processes the timestamp of the data.
+        _do_time_block(us): Processes the timestamps of a block of data.
         _calc_ema(dt): Calculates the Exponential Moving Average (EMA) rate.
         exit(): Stops the controller and performs cleanup operations.
     """
 
-    # Max memory buffer can use, can be overwritten by  IO class with actual mem limit defined in vars.py
+    # Max memory the buffers of all interfaces can use (divided by the buffer manager), 
+    # can be overwritten by  IO class with actual mem limit defined in vars.py
     MAX_MEM = MAX_MEM
 
     # specify dtypes for saving
     dtypes = {"time": "f8", "us": "u4", "sDt": "u2", None: "f4"}
 
+    # max time (s) incoming samples are collected before they are written to the shared buffer,
+    # the block size is calculated from this and the sample rate
+    BLOCK_LATENCY = 0.05
+
+    # max sample rate (Hz) with json lines and with binary frames
+    MAX_FREQ = 2048
+    MAX_FREQ_FRAMES = 8192
+    max_freq = MAX_FREQ             # max sample rate of the current protocol
+    requested_freq = None           # last sample rate set by the user (can be above max_freq)
+
+    # steps of the recording frequency setting: [lower, upper, step]
+    FREQ_STEPS = [[1, 32, 8],
+                  [32, 64, 32],
+                  [64, 128, 64],
+                  [128, 256, 128],
+                  [256, 512, 256],
+                  [512, 1024, 256],
+                  [1024, 2048, 512],
+                  [2048, 8192, 2048],
+                  ]
+
     def __init__(self, 
                  Controller, 
                  device=None,
@@ -106,12 +141,15 @@ class Interface:
 
         # length of buffer (will be calculated from buffer_time * startrate)
         self.line_buffer = np.array([])
+        self.line_fields = []           # (chip, subpar) for each field in line buffer (subpar is None for top level values)
         self.buffer_length = 0
+        self.block_writer = None
         self.__dict__.update(kwargs)
         self.app = App.get_running_app()
 
         self.controller = Controller(
             do=self.on_incoming,
+            do_block=self.on_incoming_block,
             on_connect=self._on_connect,
             on_disconnect=self._on_disconnect,
             device=device,
@@ -121,6 +159,7 @@ class Interface:
         self.settings_received = asyncio.Event()        # is set to True once name etc is received from controller
 
         self.shared_buffer = SharedBuffer()
+        self.buffer_manager = BufferManager(MAX_MEM=self.MAX_MEM)
 
         self.ID = None   # will be overwritten with serial number / unique ID of interface
         self.version = "" # version of microcontroller driver
@@ -141,17 +180,58 @@ class Interface:
         """
         Create shared numpy array to store data in buffer under name of the interface
         """
-        bytes_per_samplepoint = self.line_buffer.nbytes
-
-        self.buffer_length = int(self.MAX_MEM / bytes_per_samplepoint)
+        # length from the share of the memory for this interface (resizes other interfaces)
+        self.buffer_length = self.buffer_manager.register(
+            self.get_buffer_name(),
+            self.current_rate or self.samplerate,
+            SharedBuffer.bytes_per_item(self.line_buffer.dtype, pyramid=True),
+            resize=self.resize_buffer,
+        )
         self.shared_buffer.add_parameter(
             self.get_buffer_name(), 
             self.line_buffer.dtype, 
-            self.buffer_length
+            self.buffer_length,
+            pyramid=True,           # min / max envelope for plotting
+            soa=BUFFER_SOA,
         )
 
         self.parameters = set(self.line_buffer.dtype.names)
 
+        self.block_writer = BlockWriter(
+            self.shared_buffer,
+            self.get_buffer_name(),
+            self.line_buffer.dtype,
+            block_size=(self.current_rate or self.samplerate) * self.BLOCK_LATENCY,
+            max_latency=self.BLOCK_LATENCY,
+        )
+
+    def resize_buffer(self, length):
+        """
+        resize the shared buffer to length items (keeps the newest data),
+        called by the buffer manager if the memory is divided again
+
+        returns False if the buffer cannot be resized now: the controller 
+        writes the data in another process during the recording (the buffer 
+        is sized again on the next start)
+        """
+        name = self.get_buffer_name()
+        if name not in self.shared_buffer.buffer:
+            return False
+        if self.run and self.controller.decodes_data:
+            return False
+
+        self.flush_data()
+        self.shared_buffer.resize_parameter(name, length)
+        self.buffer_length = length
+        log(f"{name}: buffer resized to {length} items "
+            f"({self.retention():.0f} s)", "info")
+
+    def retention(self):
+        """
+        time (s) of data that fits in the buffer at the current rate
+        """
+        return self.buffer_manager.retention(self.get_buffer_name())
+
     async def async_start(self):
         # called from app.IO and interface factory to start interface
         await self.controller.start()
@@ -181,13 +261,18 @@ class Interface:
             self.lasttime = None
             self.starttime = time.time()
             self.emarate = 0
-            out["freq"] = self.samplerate
+            self._set_max_freq(self.MAX_FREQ)       # json until frames are confirmed
+            out["freq"] = min(self.samplerate, self.max_freq)
             # clear / reset buffers
+            self.controller.set_decoder(None)       # new schema is sent on first data
             self.reset_buffer()
+            # start with json, frames are negotiated when the format of the data is known
+            self.controller.negotiate_frames(None)
 
         else:
             # Stop
             self.starttime = 0
+            self.flush_data()
             
         # write start
         self.controller.write({"CTRL": out})
@@ -195,6 +280,7 @@ class Interface:
         self.sensors["CTRL"].status = 5 if self.run else 0
 
     def adjust_freq(self, freq):
+        freq = min(freq, self.max_freq)
         self.samplerate = freq
         self.controller.write({"CTRL": {"freq": freq}})
         self.current_rate = freq
@@ -225,16 +311,8 @@ class Interface:
                         "type": "plusminin",
                         "desc": "Recording Frequency (Hz)",
                         "key": "freq",
-                        "steps": [
-                            [1, 32, 8],
-                            [32, 64, 32],
-                            [64, 128, 64],
-                            [128, 256, 128],
-                            [256, 512, 256],
-                            [512, 1024, 256],
-                            [1024, 2048, 512],
-                        ],
-                        "limits": [1, 2048],
+                        "steps": self._freq_steps(self.max_freq),
+                        "limits": [1, self.max_freq],
                         "live_widget": True,
                         "default_value": 256,
                     },
@@ -294,12 +372,27 @@ class Interface:
             
             elif k == "freq":
                 # set actual frequency
+                if v != self.current_rate:
+                    self.buffer_manager.set_rate(self.get_buffer_name(), v)
                 self.current_rate = v
             
             elif k == "version":
                 # check version
                 self.version = v
                 self._version_check(v)
+
+            elif k == "frame":
+                # controller confirmed binary frame format (0: json lines)
+                self._set_max_freq(self.MAX_FREQ_FRAMES if v else self.MAX_FREQ)
+                if (self.requested_freq 
+                        and min(self.requested_freq, self.max_freq) != self.current_rate):
+                    self.write({"CTRL": {"freq": self.requested_freq}})     # (limited in write)
+
+            elif k == "chip_status":
+                # status of chips, reported by controllers that decode the data themselves
+                for chip, status in v.items():
+                    if chip in self.sensors:
+                        self._set_chip_status(chip, status)
                 
             else:
                 setattr(self, k, v)
@@ -335,6 +428,15 @@ class Interface:
             for par in chip.parameter_short_names
         }
 
+        recorded = self._recorded_chips()
+        if self.controller.decodes_data:
+            if self.buffer_length and recorded != self._decoder_chips:
+                self._decoder_chips = recorded
+                self.controller.update_decoder(recorded=list(recorded))
+
+        elif self._decoder is not None and recorded != self._decoder_chips:
+            self._decoder = None        # recompile on next data
+
     def do_new_data(self, data):
         if ("us" in data) and ("time" not in data):
             data["time"] = self._do_time(data["us"])
@@ -348,30 +450,97 @@ class Interface:
             # create buffer based on incoming data
             self.set_buffer_dims()
 
+            # propose binary frames with the format of the line buffer
+            if "us" in self.line_buffer.dtype.names:
+                self.controller.negotiate_frames(self._frame_dtype())
 
-        _last_chip = ""
-        # unpack dictionary
-        for parname in self.line_buffer.dtype.fields:
-            par, *subpar = parname.split("_")
-            val = data.get(par, np.nan)
+            if self.controller.decodes_data:
+                # controller decodes and saves the data from here (incl. this sample)
+                self._decoder_chips = self._recorded_chips()
+                self.controller.set_decoder(self._decoder_schema())
 
-            if isinstance(val, dict):
-                # add data to line buffer
-                self.line_buffer[parname] = val.get(subpar[0], np.nan)
-                # get status
-                if par != _last_chip:
-                    _status = val.pop("#ST") if "#ST" in val else None
-                    if _status is not None:
-                        self.sensors[par].status = _status
-                    _last_chip = par
-            else:
-                # add data to line_buffer
-                self.line_buffer[par] = val
+        if self.controller.decodes_data:
+            return
+
+        if self._decoder is None:
+            self.compile_decoder()
+
+        self.save_data(self._decoder(data))
+
+    def _decoder_schema(self):
+        """
+        everything a controller needs to decode and save the data itself
+        (see Controller.set_decoder)
+        """
+        return {"buffer_name": self.get_buffer_name(),
+                "dtype": self.line_buffer.dtype.descr,
+                "line_fields": self.line_fields,
+                "recorded": list(self._decoder_chips),
+                "starttime": self.starttime,
+                "lasttime": self.lasttime,
+                "samplerate": self.samplerate,
+                "emarate": self.emarate,
+                "block_size": self.block_writer.block_size,
+                "max_latency": self.BLOCK_LATENCY,
+                }
+
+    def _recorded_chips(self):
+        """
+        returns names of the chips that are recorded
+        """
+        return {name for name, chip in self.sensors.items() if chip.record}
+
+    def _set_chip_status(self, chip, status):
+        self.sensors[chip].status = status
+
+    def on_incoming_block(self, records):
+        """
+        Processes a block of records from a binary frame, records have the
+        dtype of the line buffer without time
+
+        Args:
+            records (np.ndarray): structured array with new data
+        """
+        if self.block_writer is None or records.shape[0] == 0:
+            return
+
+        block = self.decode_block(records, self.line_buffer.dtype)
+
+        self.block_writer.flush()                  # keep order with data from json lines
+        self.shared_buffer.add_to_buf(self.get_buffer_name(), block)
+
+    def _frame_dtype(self):
+        """
+        dtype of the records in binary frames: line buffer without time 
+        (time is calculated from us)
+        """
+        return np.dtype([(name, self.line_buffer.dtype[name]) 
+                         for name in self.line_buffer.dtype.names
+                         if name != "time"])
+
+    def _freq_steps(self, max_freq):
+        """
+        returns the steps of the recording frequency setting up to max_freq
+        """
+        return [[low, min(high, max_freq), step] for low, high, step in self.FREQ_STEPS
+                if low < max_freq]
 
-        self.save_data()
+    def _set_max_freq(self, max_freq):
+        """
+        changes the upper limit of the recording frequency, frequencies above
+        it are limited in write
+        """
+        self.max_freq = max_freq
+        if "CTRL" not in self.sensors:
+            return
+        for item in self.sensors["CTRL"].control_panel:
+            if item.get("key") == "freq":
+                item["limits"] = [1, max_freq]
+                item["steps"] = self._freq_steps(max_freq)
 
     def create_line_buffer(self, data):
         dtypes = []
+        fields = []
 
         sensors = self.sensors
         for par, val in data.items():
@@ -398,19 +567,25 @@ class Interface:
                         (f"{par}_{subpar}", self.dtypes.get(subpar, self.dtypes[None]))
                         for subpar in val
                     ]
+                    fields += [(par, subpar) for subpar in val]
             else:
                 dtypes.append((par, self.dtypes.get(par, self.dtypes[None])))
+                fields.append((par, None))
 
         self.line_buffer = np.zeros(1, dtype=dtypes)
+        self.line_fields = fields
+        self._decoder = None
 
-    def save_data(
-        self,
-    ):
-        # save data in memory
-        self.shared_buffer.add_1_to_buffer(
-            self.get_buffer_name(),
-            self.line_buffer,
-        )
+    def save_data(self, row):
+        # save data in memory (committed per block by the block writer)
+        self.block_writer.add(row)
+
+    def flush_data(self):
+        """
+        write samples that are still in the block writer to the shared buffer
+        """
+        if self.block_writer is not None:
+            self.block_writer.flush()
 
     def do_feedback(self, data):
         """
@@ -430,41 +605,6 @@ class Interface:
         except:
             pass
 
-    def _do_time(self, us):
-        """
-        convert relative micro seconds to absolute time
-
-        Args:
-            us (int): microseconds since start of recording
-
-        Returns:
-            float: absolute time
-        """
-        sec = us * 1e-6
-
-        if self.lasttime is None:
-            # adjust starttime to start of rec on arduino
-            self.starttime -= sec
-            self.lasttime = 0
-
-        # track last time to count loop of us
-        if sec < self.lasttime:
-            self.starttime += 0xFFFF_FFFF / 1e6
-        self.lasttime = sec
-
-        t = self.starttime + sec
-        return t
-
-    def _calc_ema(self, dt):
-        if dt == 0:
-            return
-        dt /= 1e6
-        if self.emarate == 0:
-            self.emarate = 1 / dt
-        else:
-            n = self.samplerate * 60  # ema over 1 min
-            self.emarate = (self.emarate - (self.emarate / n)) + ((1 / dt) / n)
-    
     def _version_check(self, version):
         """
         Check if version is bigger that required minimum, report if not.
@@ -498,6 +638,14 @@ class Interface:
 
     def write(self, value):
         # process controller commands / config
+        ctrl = value.get("CTRL", {})
+        if "freq" in ctrl:
+            self.requested_freq = ctrl["freq"]
+            if ctrl["freq"] > self.max_freq:
+                log(f"{self.name}: recording frequency {ctrl['freq']} Hz is above the "
+                    f"maximum of the protocol, set to {self.max_freq} Hz", "warning")
+                value = {**value, "CTRL": {**ctrl, "freq": self.max_freq}}
+
         try:
             # cmd is record and intended for interface
             self.record = value["CTRL"]["record"]
@@ -527,6 +675,10 @@ class Interface:
         resets shared buffer (disconnects and removes all data and statusses related to self)
         """
         name_id = self.get_buffer_name()
+        if self.block_writer is not None:
+            self.block_writer.clear()
+            self.block_writer = None
+
         if name_id in self.shared_buffer.buffer:
             self.shared_buffer.reset(par=name_id)  # reset buffer counters
             self.shared_buffer.remove_parameter(name_id) # remove current device from buffer
@@ -537,6 +689,7 @@ class Interface:
         self.start_stop(False)
         self.controller.stop()
         self.controller.exit()
+        self.buffer_manager.unregister(self.get_buffer_name())
 
 if __name__ == "__main__":
     """ """
@@ -32,6 +32,8 @@ timedelta   TimedeltaSettings    # custom class for timedelta objects
 
 import json
 
+from subs.recording.compression import available_codecs
+
 _settings_panel = {
 "Main": [
     {# guiApp.setupname
@@ -100,10 +102,18 @@ _settings_panel = {
     {# guiApp.rec_vars.hdf_compression
      "title": "Compression Type",
         "type": "options",
-        "desc": "Compression Type to use (gzip: better compression, lzf: faster)",
+        "desc": "Compression Type to use (gzip: better compression, lzf / lz4: faster, "
+                "zstd / blosc: fast with good compression, need hdf5plugin)",
         "section": "recording",
         "key": "hdf_compression",
-        "options": ["gzip", "lzf", "None"],
+        "options": available_codecs(),
+    },
+    {# guiApp.rec_vars.hdf_compression_pars
+     "title": "Compression per Parameter",
+        "type": "string",
+        "desc": "Compression Type for specific parameters, e.g.: notes=gzip, *=lz4",
+        "section": "recording",
+        "key": "hdf_compression_pars",
     },
     {# guiApp.rec_vars.hdf_compression_strenght
      "title": "Compression Strenght",
@@ -89,13 +89,23 @@ kv_str = """
         id: recf
         pos_hint: {'right': 0.99, 'top': 1}
         size_hint: 0.08, 0.05
-        text: '{} ({:.0f}) Hz.'.format(app.IO.rec_pars['samplerate'], app.IO.rec_pars['emarate'])
+        text: '{} ({:.0f}) Hz. - buffer: {:.1f} h'.format(app.IO.rec_pars['samplerate'], app.IO.rec_pars['emarate'], app.IO.rec_pars['retention'] / 3600)
         font_size: '10sp'
         color: 0.5, 0.5, 0.5, 0.9
         halign: 'right'
         size: self.texture_size  # prevents label from turning black if too much text
 
 
+    Label:
+        id: saver_status
+        pos_hint: {'right': 0.99, 'top': 0.94}
+        size_hint: 0.08, 0.05
+        text: app.IO.rec_pars['saver']
+        font_size: '10sp'
+        color: 0.5, 0.5, 0.5, 0.9
+        halign: 'right'
+        size: self.texture_size  # prevents label from turning black if too much text
+
     Label:
         id: plotting
         pos_hint: {'right': 0.99, 'top': 0.97}
@@ -1,7 +1,15 @@
 from datetime import timedelta
 
 # PARS:
-MAX_MEM = 128e6                     # max mem to use for buffers in Bytes
+MAX_MEM = 128e6                     # max mem to use for buffers in Bytes (divided over the interfaces)
+SERIAL_WORKER_PROCESS = False       # read and decode serial interfaces in a separate process
+SAVER_PROCESS = False               # compress and write the h5 files in a separate process
+SAVER_JOURNAL = True                # keep a journal of the data to recover files after a crash / power loss
+SAVER_DELTA_COLUMNS = {}            # store columns delta encoded (smaller files, read with subs/recording/reader.py),
+                                    # {column: scale to integer units}, e.g. {"time": 1e6, "us": 1}
+BUFFER_POOL_SIZE = 0                # shared memory reserved (and faulted in) at start for all buffers, e.g. MAX_MEM * 1.1
+                                    # (0: separate shared memory per buffer, memory is only used when it is written)
+BUFFER_SOA = False                  # store interface buffers per column (contiguous columns for plotting / saving)
 
 # COLORS (R, G, B, A):
 BACKBLACK = (0, 0.01, 0.07, 1)
@@ -144,11 +144,10 @@ class LastValWidget(BoxLayout):
         for interface in self.shared_buffer.buffer:
             if interface == 'notes':
                 continue
-            last_values = self.shared_buffer.get_buf(interface, 
-                                                     start=..., # has to be a value but not None
-                                                     end=None,  # None indicates last added data
-                                                     n_items=1, # number of items to get back from end (will overwrite start)
-                                                     )[0]
+            last_values, _ = self.shared_buffer.read_last(interface, n_items=1)
+            if last_values.shape[0] == 0:
+                continue                                        # no data yet
+            last_values = last_values[0]
             last_values = {k: v for k, v in zip(last_values.dtype.names, last_values)}
             self.data[interface.replace(" ", "\n")] = last_values
         self.create_widgets()
@@ -216,11 +215,11 @@ if __name__ == "__main__":
         }
 
 
-        def get_buf(self, interface, start, end, n_items):
+        def read_last(self, interface, n_items):
             if interface in self.buffer:
-                return self.buffer[interface]
+                return self.buffer[interface][-n_items:], 0
             else:
-                return []
+                return np.array([]), 0
 
     class TestIO:
         def __init__(self):
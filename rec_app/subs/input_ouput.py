@@ -11,7 +11,7 @@ controls recording, saving and plotting of the data
 """
 
 import asyncio
-from subs.gui.vars import SETTINGS_VAR
+from subs.gui.vars import SETTINGS_VAR, BUFFER_POOL_SIZE, SAVER_PROCESS, SAVER_JOURNAL, SAVER_DELTA_COLUMNS
 from functools import partial
 import numpy as np
 import threading as tr
@@ -20,7 +20,8 @@ import time
 import subs.network.client as nw_client     # import network client
 import subs.network.server as nw_server     # import network client
 
-from subs.recording.saver import Saver
+from subs.recording.saver import Saver, SaverProcess
+from subs.recording.compression import compression_options, parse_par_codecs
 
 from subs.driver.interface_factory import InterfaceFactory
 
@@ -125,7 +126,9 @@ class InputOutput(EventDispatcher):
     selected_interface = StringProperty("")
 
     rec_pars = DictProperty({'samplerate': 0,
-                             'emarate': 0})                             # pars from recorder
+                             'emarate': 0,
+                             'retention': 0,
+                             'saver': ''})                                # pars from recorder
 
     # placeholder for saver
     sav = None
@@ -177,8 +180,8 @@ class InputOutput(EventDispatcher):
         self.app.bind(
             setupname=lambda *_: self.client.rename(self.app.setupname) if self.client else ...)
 
-        # create shared memory
-        self.shared_buffer = SharedBuffer()
+        # create shared memory (reserves the pool for the buffers of all interfaces)
+        self.shared_buffer = SharedBuffer(POOL_SIZE=BUFFER_POOL_SIZE)
         self.buffer = self.shared_buffer.buffer
         self.data_structure = self.shared_buffer.data_structure
         self.get_buf = self.shared_buffer.get_buf
@@ -246,7 +249,7 @@ class InputOutput(EventDispatcher):
             save (bool, optional): Flag indicating whether to save the data or not. Defaults to True.
 
         Attributes:
-            sav (Saver): Saver object.
+            sav (Saver, SaverProcess): Saver object (SaverProcess if SAVER_PROCESS is set).
             running (bool): Flag indicating if recording has started.
             shared_buffer (data structure): Shared memory buffer containing recorded data.
             app (App): The main application object.
@@ -261,8 +264,14 @@ class InputOutput(EventDispatcher):
         if not self.client_ip:
             # create saver
             if save:
-                self.sav = Saver(recname=self.recording_name,
-                                 NEW_FILE_INTERVAL=self.new_file_interval)
+                compression, par_compression = self._saver_compression()
+                self.sav = (SaverProcess if SAVER_PROCESS else Saver)(
+                    recname=self.recording_name,
+                    NEW_FILE_INTERVAL=self.new_file_interval,
+                    compression=compression,
+                    par_compression=par_compression,
+                    JOURNAL=SAVER_JOURNAL,
+                    DELTA_COLUMNS=SAVER_DELTA_COLUMNS)
                 self.sav.start()
 
             else:
@@ -278,6 +287,20 @@ class InputOutput(EventDispatcher):
 
         self.running = True
 
+    def _saver_compression(self):
+        """
+        returns the compression for the saver from the recording settings:
+        compression parameters for all parameters and per parameter pattern
+        (see compression.py)
+        """
+        rec_vars = self.app.rec_vars
+        options = dict(level=rec_vars.hdf_compression_strenght,
+                       shuffle=rec_vars.hdf_shuffle,
+                       fletcher32=rec_vars.hdf_fletcher32)
+        return (compression_options(rec_vars.hdf_compression, **options),
+                {pattern: compression_options(codec, **options) for pattern, codec 
+                 in parse_par_codecs(rec_vars.hdf_compression_pars).items()})
+
     def stop_recording(self):
         """
         This function will stop the Recorder instance by calling its `stop` method and 
@@ -439,16 +462,33 @@ class InputOutput(EventDispatcher):
         - minrate: float, min limit sample rate
         - maxrate: float, max limit sample rate
         - emarate: float, current exponential avg theoretical max sample rate
+        - retention: float, time (s) of data that fits in the buffer
+        - saver: str, progress of the saver (data written, compression ratio,
+                 items waiting to be saved)
         """
+        self.rec_pars['saver'] = self._saver_status()
         if self.interfaces:
             dev = self.interfaces[self.selected_interface]
             _new_pars = {
                 "samplerate": dev.current_rate,
                 "emarate": dev.emarate,
                 "run": dev.run,
+                "retention": dev.retention(),
             }
             self.rec_pars.update(_new_pars)
 
+    def _saver_status(self):
+        """
+        progress of the saver as text, empty if not saving
+        """
+        if self.sav is None:
+            return ''
+        status = self.sav.get_status()
+        if not status['running']:
+            return ''
+        return (f"saved: {status['bytes_written'] / 1e6:.0f} MB "
+                f"({status['compression_ratio']:.1f}x) - lag: {status['lag']} items")
+
     def get_time_back_data(self, seconds_back, par=...):
         """
         get last recorded data upto x seconds back
@@ -546,11 +586,15 @@ class InputOutput(EventDispatcher):
 
         # Get Data
         try:
-            out = self.shared_buffer.get_time_back(
-                seconds_back=self.secondsback,
-                time_sub_par="time",
-                par=buff_block_name,
-                subpar=par).copy()
+            out = self.shared_buffer.read_consistent(
+                buff_block_name,
+                lambda: self.shared_buffer.get_time_back(
+                    seconds_back=self.secondsback,
+                    time_sub_par="time",
+                    par=buff_block_name,
+                    subpar=par,
+                    decimated_out_len=out_len,
+                    copy=True))
             return out
 
         except (KeyError, AttributeError) as e:
@@ -948,6 +992,11 @@ if __name__ == '__main__':
                 pass
             self.rec_vars = RecVars()
             self.rec_vars.data_length = 3600
+            self.rec_vars.hdf_compression = "gzip"
+            self.rec_vars.hdf_compression_strenght = 5
+            self.rec_vars.hdf_shuffle = False
+            self.rec_vars.hdf_fletcher32 = False
+            self.rec_vars.hdf_compression_pars = ""
 
             self.root = self
             self.root.ids = RecVars()
@@ -1,5 +1,10 @@
 from multiprocessing import shared_memory
+import mmap
+import os
 import queue
+import select
+import tempfile
+import time
 import numpy as np
 
 from queue import Empty
@@ -69,6 +74,208 @@ def create_shared_np(name, shape, dtype, fill=None):
     return shared_array
 
 
+class PoolSlab():
+    """
+    Stands in for the shared memory of arrays in a SharedPool (array._shm):
+    the memory stays reserved in the pool, close and unlink do nothing
+    """
+    def __init__(self, name) -> None:
+        self.name = name
+
+    def close(self):
+        pass
+
+    def unlink(self):
+        pass
+
+
+class SharedPool():
+    """
+    One shared memory block that is reserved (and optionally pre-faulted)
+    once, from which slabs are handed out to shared arrays, so that creating
+    and removing arrays does not create, unlink and fault in new shared memory.
+
+    The pool does not keep track of the slabs in use, the owner keeps the
+    offset and size of each slab and passes them to allocate.
+
+    - name:         name of the shared memory
+    - size:         size (bytes) to reserve if the pool does not exist yet,
+                    0 only links to an existing pool
+    - prefault:     fault in all pages on creation (and use huge pages if possible)
+    """
+    ALIGN = mmap.PAGESIZE               # slabs start on a new page
+
+    def __init__(self, name, size=0, prefault=True) -> None:
+        self.name = name.replace('/', "_")
+        self._shm = None
+        self.size = 0
+
+        try:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+
+        except FileNotFoundError:
+            if size <= 0:
+                return
+            self._shm = shared_memory.SharedMemory(create=True, name=self.name,
+                                                   size=int(self.aligned(size)))
+            if prefault:
+                self.prefault()
+
+        self.size = self._shm.size
+
+    def __bool__(self):
+        return self._shm is not None
+
+    @classmethod
+    def aligned(cls, n, align=None):
+        align = align or cls.ALIGN
+        return -(-int(n) // align) * align
+
+    def prefault(self):
+        """
+        fault in all pages of the pool now (instead of on first write to a slab)
+        """
+        _mmap = getattr(self._shm, "_mmap", None)
+        for advice in ("MADV_HUGEPAGE", "MADV_POPULATE_WRITE"):
+            try:
+                _mmap.madvise(getattr(mmap, advice))
+            except (AttributeError, OSError, ValueError):
+                if advice == "MADV_POPULATE_WRITE":
+                    # touch each page
+                    pages = np.frombuffer(self._shm.buf, dtype='u1')
+                    pages[::mmap.PAGESIZE] = 0
+                    del pages
+
+    def allocate(self, nbytes, used):
+        """
+        returns the offset of the first free slab of nbytes, or -1 if it
+        does not fit
+
+        - used:     (offset, size) of the slabs that are in use
+        """
+        nbytes = self.aligned(nbytes)
+        offset = 0
+        for start, size in sorted(used):
+            if start - offset >= nbytes:
+                break
+            offset = max(offset, self.aligned(start + size))
+        return offset if offset + nbytes <= self.size else -1
+
+    def array(self, offset, shape, dtype, fill=None):
+        """
+        returns a shared array at offset of the pool
+
+        - fill:     fill array with value
+        """
+        shared_array = NpArrayWithShm(shape, dtype=np.dtype(dtype),
+                                      buffer=self._shm.buf, offset=offset)
+        if fill is not None:
+            shared_array.fill(fill)
+        shared_array._shm = PoolSlab(self.name)
+        return shared_array
+
+    def close(self):
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError:
+                pass                # arrays of the pool are still in use
+
+    def unlink(self):
+        if self._shm is not None:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class Wakeup():
+    """
+    Wakes a waiting process (or thread) from other processes through a
+    named pipe (FIFO) in the temp dir, linked by name.
+
+    The reader (reader=True) creates the pipe and waits for it with wait(timeout),
+    writers call notify, which never blocks (the notification is dropped if 
+    there is no reader or the pipe is full).
+
+    If named pipes are not available (e.g. Windows), notify does nothing and
+    wait only waits for the timeout.
+
+    - name:     name of the pipe
+    - reader:   create and read the pipe
+    """
+    def __init__(self, name, reader=False) -> None:
+        self.path = os.path.join(tempfile.gettempdir(), f"{name.replace('/', '_')}.fifo")
+        self.reader = reader
+        self.fd = None
+        self._keep_open = None                      # write end of the reader (no EOF when writers close)
+
+        if reader and hasattr(os, "mkfifo"):
+            try:
+                os.mkfifo(self.path, 0o666)
+            except FileExistsError:
+                pass
+            self.fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+            self._keep_open = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+
+    def __bool__(self):
+        return self.fd is not None
+
+    def notify(self, retry=True):
+        """
+        wakes the reader, returns True if the notification was sent
+
+        - retry:    open the pipe again and retry once if the reader is gone 
+                    (a new reader, e.g. a restarted saver, created a new pipe)
+        """
+        if self.fd is None:
+            try:
+                self.fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            except (OSError, AttributeError):
+                return False                        # no reader (yet)
+        try:
+            os.write(self.fd, b"\0")
+            return True
+
+        except BlockingIOError:
+            return True                             # pipe full: reader is woken already
+
+        except OSError:
+            # reader is gone: open again
+            os.close(self.fd)
+            self.fd = None
+            return retry and self.notify(retry=False)
+
+    def wait(self, timeout=None):
+        """
+        waits for a notification or timeout (s), returns True if notified
+        """
+        if not self.reader or self.fd is None:
+            time.sleep(timeout or 0)
+            return False
+
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        try:
+            while os.read(self.fd, 0x1000):         # drain notifications
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        for fd in (self.fd, self._keep_open):
+            if fd is not None:
+                os.close(fd)
+        self.fd = self._keep_open = None
+
+    def unlink(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
 class SharedTable():
     """
     Creates a shared table (or dictionary) like numpy array
@@ -82,6 +289,7 @@ class SharedTable():
     array = None                        # np array with data
     
     index_lookup = {}                   # lookup dictionary with index: row number
+    columns = {}                        # cached views of the columns of array: {column name: np.ndarray}
     
     index = []                       # shared list wiht index names
     dtype = []                     # shared list with dtypes
@@ -105,6 +313,7 @@ class SharedTable():
         self.array = create_shared_np(name, shape, 
                                       dtype=columns)
         self.shms['array'] = self.array._shm
+        self.create_column_views()
        
         if not self.shape:
             self.create_shape_list(shape)
@@ -152,6 +361,26 @@ class SharedTable():
         self.create(name, dtypes, list(self.shape), list(self.index))
         self.create_index_loopup()
 
+    def create_column_views(self):
+        """
+        creates the cached (typed) views of each column of the array,
+        run if the array is recreated
+        """
+        self.columns = {name: self.array[name] for name in self.array.dtype.names}
+
+    def row(self, index):
+        """
+        returns a handle (TableRow) to get and set the values in the row of index 
+        (name or position) with plain integer indexing on the cached column views
+
+        NOTE: the handle is invalid when the row is removed or moved (e.g. new index), 
+              get a new handle after create_index_loopup
+        """
+        i = self.index_lookup.get(index, index)
+        if isinstance(i, str):
+            raise KeyError(index)
+        return TableRow(self.columns, i)
+
     def get(self, par, index=...):
         """
         par:        parameter to get use ... for all pars (e.g. for specific index point)
@@ -265,8 +494,23 @@ class SharedTable():
                 pass
 
 
-# TODO: creating a dictionary to refer to np arrays faster than struct array for getting and setting? (also maybe for buffer.py in recording?)
-#       can even update self.__dict__ to add pars as class variables. Use lookup = {i: data[i,...] or data[i] for i in range(data.size) or data.dtype.names}
+class TableRow():
+    """
+    Handle to one row of a SharedTable, values are get and set by column name:
+        row = table.row('name')
+        row['column'] += 1
+    """
+    __slots__ = ('columns', 'i')
+
+    def __init__(self, columns, i) -> None:
+        self.columns = columns          # column views of the table
+        self.i = i                      # position of the row
+
+    def __getitem__(self, column):
+        return self.columns[column][self.i]
+
+    def __setitem__(self, column, value):
+        self.columns[column][self.i] = value
 
 
 from multiprocessing import Queue
@@ -0,0 +1,612 @@
+"""
+Benchmarks for the recording pipeline
+
+run from the rec_app folder with:
+    python -m subs.recording.benchmark <name>
+
+e.g.:
+    python -m subs.recording.benchmark ingest
+
+all benchmarks use their own shared memory (prefixed with BENCH_NAME),
+which is removed again when the benchmark is finished
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from subs.recording.buffer import SharedBuffer, BlockWriter
+
+
+BENCH_NAME = "Benchmark"
+
+# typical row of an interface: time, us and some sensor channels
+ROW_DTYPE = ([("time", "f8"), ("us", "u4")]
+             + [(f"CHIP{i}_SIG", "f4") for i in range(8)])
+
+
+def _create_buffer(n_rows, dtype=ROW_DTYPE, par="bench", **kwargs):
+    """
+    create a shared buffer with one parameter for benchmarking
+    (kwargs are passed to add_parameter)
+    """
+    buff = SharedBuffer(name=BENCH_NAME)
+    if par in buff.buffer:
+        buff.remove_parameter(par)
+    buff.add_parameter(par, np.dtype(dtype), n_rows, **kwargs)
+    return buff, par
+
+
+def _cleanup(buff):
+    buff.unlink_all()
+    buff.close_all()
+    buff.data_structure.unlink()
+    buff.version._shm.unlink()
+
+
+def _report(name, n, dt, ref=None):
+    rate = n / dt
+    txt = f"{name:<40} {rate:>14,.0f} samples/s"
+    if ref is not None:
+        txt += f"   ({rate / ref:.1f}x)"
+    print(txt)
+    return rate
+
+
+def bench_ingest(n_samples=200_000, freq=2048, latency=0.05):
+    """
+    compare writing incoming samples one by one (add_1_to_buffer)
+    with collecting them in blocks (BlockWriter -> add_to_buf)
+    """
+    buff, par = _create_buffer(int(freq * 60))
+    rows = np.zeros(1024, dtype=ROW_DTYPE)
+    rows["time"] = np.arange(rows.size) / freq
+    rows["us"] = np.arange(rows.size) * (1e6 / freq)
+    rows = [r for r in rows]                # single rows as they come from the interface
+
+    print(f"ingest: {n_samples:,} samples, row size: {np.dtype(ROW_DTYPE).itemsize} bytes")
+    try:
+        t = time.perf_counter()
+        for i in range(n_samples):
+            buff.add_1_to_buffer(par, rows[i & 1023])
+        ref = _report("add_1_to_buffer", n_samples, time.perf_counter() - t)
+
+        for block_size in (int(freq * latency), 256):
+            buff.clear_parameter(par)
+            writer = BlockWriter(buff, par, ROW_DTYPE,
+                                 block_size=block_size, max_latency=latency)
+            t = time.perf_counter()
+            for i in range(n_samples):
+                writer.add(rows[i & 1023])
+            writer.flush()
+            _report(f"BlockWriter (block size: {block_size})", n_samples,
+                    time.perf_counter() - t, ref)
+
+    finally:
+        _cleanup(buff)
+
+
+def bench_frames(n_samples=100_000, samples_per_frame=64):
+    """
+    compare host cpu time for decoding json lines with binary frames
+    (IOProtocol.save -> decoded data)
+    """
+    import json
+    from subs.driver.interface_drivers.serial_controller import (
+        IOProtocol, encode_frame, frame_schema_id)
+
+    dtype = np.dtype([n for n in ROW_DTYPE if n[0] != "time"]).newbyteorder("<")
+    records = np.zeros(n_samples, dtype=dtype)
+    records["us"] = np.arange(n_samples) * 488
+    for name in dtype.names[1:]:
+        records[name] = np.random.random(n_samples)
+
+    # json lines as sent by the controller: {"us": .., "CHIP0": {"SIG": ..}, ..}
+    lines = b"".join(
+        json.dumps({"us": int(r["us"]), 
+                    **{n.split("_")[0]: {"SIG": float(r[n])} for n in dtype.names[1:]}}
+                   ).encode() + b"\n"
+        for r in records)
+
+    schema_id = frame_schema_id(dtype)
+    frames = b"".join(encode_frame(schema_id, records[i:i + samples_per_frame])
+                      for i in range(0, n_samples, samples_per_frame))
+
+    print(f"frames: {n_samples:,} samples, json: {len(lines) / n_samples:.0f} bytes/sample, "
+          f"frames: {len(frames) / n_samples:.0f} bytes/sample")
+
+    chunk = 4096    # bytes per data_received call
+
+    decoded = []
+    protocol = IOProtocol(do=lambda d: decoded.append(json.loads(d)))
+    t = time.perf_counter()
+    for i in range(0, len(lines), chunk):
+        protocol.save(lines[i:i + chunk])
+    ref = _report("json lines", len(decoded), time.perf_counter() - t)
+
+    decoded = []
+    protocol = IOProtocol(frames=True, do_frame=lambda s, n, p: decoded.append(
+        np.frombuffer(p, dtype=dtype, count=n)))
+    t = time.perf_counter()
+    for i in range(0, len(frames), chunk):
+        protocol.save(frames[i:i + chunk])
+    _report(f"binary frames ({samples_per_frame} samples/frame)",
+            sum(d.shape[0] for d in decoded), time.perf_counter() - t, ref)
+
+
+def bench_framing(n_bytes=15_000_000, burst_sizes=(64, 4096, 0x10_0000)):
+    """
+    splitting bursts of incoming data in lines: IOProtocol receive buffer 
+    (json lines only and with detection of binary frames) vs extending a 
+    bytearray and splitting it on every call (for short lines and for long 
+    lines that arrive in many bursts)
+    """
+    for line in (b'{"us": 123456789, "OIS": {"SIG": 0.1234, "STIM": 0.0}, "MOT": {"X": 0.5}}\n',
+                 b'{"notes": "' + b"x" * 0x4_0000 + b'"}\n'):
+        _bench_framing(line * (n_bytes // len(line)), burst_sizes)
+
+
+def _bench_framing(data, burst_sizes):
+    from subs.driver.interface_drivers.serial_controller import IOProtocol
+
+    line_len = data.index(b"\n") + 1
+    print(f"framing: {len(data) // line_len:,} lines of {line_len:,} bytes, "
+          f"{len(data) / 1e6:.1f} MB")
+
+    class SplitProtocol():
+        # reference: split the accumulated buffer on every call
+        sub_buffer = bytearray()
+
+        def save(self, incoming):
+            self.sub_buffer.extend(incoming)
+            if b"\n" in self.sub_buffer:
+                *lines, self.sub_buffer = self.sub_buffer.split(b"\n")
+                [do(d) for d in lines]
+
+    for burst in burst_sizes:
+        for name, protocol in (("bytearray split", SplitProtocol()),
+                               ("IOProtocol", IOProtocol()),
+                               ("IOProtocol, frames", IOProtocol(frames=True))):
+            count = [0]
+            def do(_):
+                count[0] += 1
+            protocol.do = do
+
+            view = memoryview(data)
+            t = time.perf_counter()
+            for i in range(0, len(data), burst):
+                protocol.save(view[i:i + burst])
+            dt = time.perf_counter() - t
+            rate = _report(f"{name} ({burst} bytes/burst)", count[0], dt,
+                           None if name == "bytearray split" else ref)
+            if name == "bytearray split":
+                ref = rate
+
+            if isinstance(protocol, IOProtocol):
+                stats = protocol.stats.rates()
+                print(f"{'':<40} {len(data) / dt / 1e6:>14.1f} MB/s, "
+                      f"max pending: {stats['max pending']} bytes")
+
+
+def bench_table(n_calls=200_000):
+    """
+    compare access of the data structure (SharedTable) by name (get / set)
+    with the cached row handles (SharedTable.row)
+    """
+    buff, par = _create_buffer(1024)
+    table = buff.data_structure
+    print(f"table: {n_calls:,} read + write of a counter")
+    try:
+        t = time.perf_counter()
+        for _ in range(n_calls):
+            table.set(table.get('n_written', par) + 1, 'n_written', par)
+        ref = _report("SharedTable get / set", n_calls, time.perf_counter() - t)
+
+        row = table.row(par)
+        t = time.perf_counter()
+        for _ in range(n_calls):
+            row['n_written'] += 1
+        _report("SharedTable row handle", n_calls, time.perf_counter() - t, ref)
+
+        data = np.zeros(1, dtype=ROW_DTYPE)[0]
+        t = time.perf_counter()
+        for _ in range(n_calls):
+            buff.add_1_to_buffer(par, data)
+        _report("add_1_to_buffer (row handle)", n_calls, time.perf_counter() - t)
+
+    finally:
+        _cleanup(buff)
+
+
+def bench_reads(n_reads=200, n_items=0x7FFF):
+    """
+    compare reading a block of items that is looped in the circular buffer:
+    concatenate + copy vs copy in a reusable output array
+    """
+    buff, par = _create_buffer(n_items * 4)
+    buff.add_to_buf(par, np.zeros(n_items * 4 - n_items // 2, dtype=ROW_DTYPE))
+    buff.add_to_buf(par, np.zeros(n_items, dtype=ROW_DTYPE))    # last block is looped
+    end = buff.row(par)['n_written']
+    start = end - n_items
+    print(f"reads: {n_reads} reads of {n_items:,} looped items")
+    try:
+        t = time.perf_counter()
+        for _ in range(n_reads):
+            buff.get_items(par, start, end).copy()
+        ref = _report("concatenate + copy", n_reads * n_items, time.perf_counter() - t)
+
+        t = time.perf_counter()
+        for _ in range(n_reads):
+            buff.get_items(par, start, end, copy=True)
+        _report("get_items(copy=True)", n_reads * n_items, time.perf_counter() - t, ref)
+
+        out = np.empty(n_items, dtype=ROW_DTYPE)
+        t = time.perf_counter()
+        for _ in range(n_reads):
+            buff.get_items(par, start, end, out=out)
+        _report("get_items(out=...)", n_reads * n_items, time.perf_counter() - t, ref)
+
+    finally:
+        _cleanup(buff)
+
+
+def bench_columns(n_reads=200, n_items=0x4_0000):
+    """
+    compare reading (and averaging) one column of a block of items with rows 
+    stored together (structured array) or each column stored separately (soa)
+    """
+    data = np.zeros(n_items, dtype=ROW_DTYPE)
+    data["CHIP0_SIG"] = np.random.random(n_items)
+    print(f"columns: {n_reads} reads of 1 column of {n_items:,} items")
+    refs = {}
+    for soa in (False, True):
+        buff, par = _create_buffer(n_items, soa=soa)
+        try:
+            buff.add_to_buf(par, data)
+            layout = "soa" if soa else "structured"
+            for name, read in (("copy column", lambda: buff.get_items(
+                                    par, 0, n_items, subpar="CHIP0_SIG", copy=True)),
+                               ("mean of column", lambda: buff.get_items(
+                                    par, 0, n_items, subpar="CHIP0_SIG").mean())):
+                t = time.perf_counter()
+                for _ in range(n_reads):
+                    read()
+                rate = _report(f"{layout}: {name}", n_reads * n_items,
+                               time.perf_counter() - t, refs.get(name))
+                refs.setdefault(name, rate)
+
+        finally:
+            _cleanup(buff)
+
+
+def bench_pool(n_restarts=10, n_items=0x10_0000):
+    """
+    compare recreating a parameter (as on start of a recording) and filling
+    it with data: separate shared memory per parameter vs slabs of a pool
+    that is reserved (and pre-faulted) once
+    """
+    data = np.zeros(n_items, dtype=ROW_DTYPE)
+    mb = n_items * np.dtype(ROW_DTYPE).itemsize / 1e6
+    print(f"pool: {n_restarts} x recreate + fill {mb:.0f} MB")
+    ref = None
+    for pool_size in (0, mb * 2e6):
+        buff = SharedBuffer(name=BENCH_NAME, POOL_SIZE=pool_size)
+        try:
+            t = time.perf_counter()
+            for _ in range(n_restarts):
+                if "bench" in buff.buffer:
+                    buff.remove_parameter("bench")
+                buff.add_parameter("bench", np.dtype(ROW_DTYPE), n_items)
+                buff.add_to_buf("bench", data)
+            rate = _report("pool" if pool_size else "separate shared memory",
+                           n_restarts * n_items, time.perf_counter() - t, ref)
+            ref = ref or rate
+
+        finally:
+            _cleanup(buff)
+
+
+def bench_codecs(n_items=0x10_0000, freq=2048):
+    """
+    record a synthetic stream through the Saver (read from the shared buffer, 
+    compress and write) with each available codec, reports the speed, 
+    cpu usage and compression ratio
+    """
+    import tempfile
+    from pathlib import Path
+    from subs.recording.saver import Saver
+    from subs.recording.compression import available_codecs, compression_options
+
+    # slowly changing signals with noise, like the sensors
+    data = np.zeros(n_items, dtype=ROW_DTYPE)
+    t = np.arange(n_items) / freq
+    data["time"] = t
+    data["us"] = t * 1e6
+    for i, name in enumerate(data.dtype.names[2:]):
+        data[name] = np.sin(t * (i + 1)) + np.random.normal(0, 0.01, n_items)
+    mb = data.nbytes / 1e6
+    print(f"codecs: {mb:.0f} MB ({n_items:,} samples)")
+
+    buff, par = _create_buffer(Saver.BLOCK_SIZE * 2)
+    try:
+        for codec in available_codecs():
+            for shuffle in ((False, True) if codec not in ("None", "blosc-bitshuffle") else (False,)):
+                with tempfile.TemporaryDirectory() as tmp:
+                    sav = Saver(paths={"save_dir": Path(tmp), "temp_dir": Path(tmp) / "temp"},
+                                compression=compression_options(codec, shuffle=shuffle),
+                                shared_buffer=buff, buffer=buff.buffer,
+                                data_structure=buff.data_structure, 
+                                recname="bench", out_buffers={}, JOURNAL=False, VERIFY=False)
+                    sav.new_file()
+                    buff.clear_parameter(par)
+
+                    t, cpu = time.perf_counter(), time.process_time()
+                    for i in range(0, n_items, Saver.BLOCK_SIZE):
+                        buff.add_to_buf(par, data[i:i + Saver.BLOCK_SIZE])
+                        sav.save_buffer(par)
+                    sav.file.flush()
+                    dt, cpu = time.perf_counter() - t, time.process_time() - cpu
+
+                    stored = sav.dataset[par].id.get_storage_size()
+                    sav.close_file()
+
+                name = f"{codec}{' + shuffle' if shuffle else ''}"
+                print(f"{name:<40} {mb / dt:>10,.1f} MB/s   cpu: {cpu / dt * 100:>3.0f}%"
+                      f"   ratio: {data.nbytes / stored:.2f}")
+
+    finally:
+        _cleanup(buff)
+
+
+def bench_datasets(n_items=0x20_0000, block_size=0x800, freq=2048):
+    """
+    compare writing blocks to a data set: resize on every block with 
+    automatic chunks (h5py) vs chunks from the rate and preallocation
+    (Saver.write), reports speed and file size
+    """
+    import tempfile
+    from pathlib import Path
+    from subs.recording.saver import Saver
+
+    class ResizeSaver(Saver):
+        # reference: resize on every write, chunks chosen by h5py
+        def create_dataset(self, key, data):
+            self.dataset[key] = self.file.create_dataset(
+                key, data=data, maxshape=(None, *data.shape[1:]), chunks=True,
+                **self.compression)
+            self.n_rows[key] = data.shape[0]
+
+        def write(self, key, data):
+            if key not in self.dataset:
+                return self.create_dataset(key, data)
+            dataset = self.dataset[key]
+            dataset.resize(dataset.shape[0] + data.shape[0], axis=0)
+            dataset[-data.shape[0]:] = data
+            self.n_rows[key] = dataset.shape[0]
+
+    data = np.zeros(n_items, dtype=ROW_DTYPE)
+    data["time"] = np.arange(n_items) / freq
+    print(f"datasets: {n_items:,} samples in blocks of {block_size}")
+    ref = None
+    for name, cls in (("resize per block", ResizeSaver), ("chunks + preallocation", Saver)):
+        with tempfile.TemporaryDirectory() as tmp:
+            sav = cls(paths={"save_dir": Path(tmp), "temp_dir": Path(tmp) / "temp"},
+                      recname="bench", compression={}, VERIFY=False)
+            sav.new_file()
+            t = time.perf_counter()
+            for i in range(0, n_items, block_size):
+                sav.write("bench", data[i:i + block_size])
+            sav.close_file()
+            rate = _report(name, n_items, time.perf_counter() - t, ref)
+            ref = ref or rate
+
+            file_size = sum(f.stat().st_size for f in (Path(tmp) / "bench").iterdir())
+            print(f"{'':<40} {file_size / 1e6:>14.1f} MB file")
+
+
+def bench_saveloop(duration=5, freq=12_800, rows_per_write=64, block_size=2048):
+    """
+    compare the save loop checking the buffer every SAVE_LOOP_INTERVAL with 
+    the save loop woken by the writer when a save block is written: 
+    reports the time from a full save block until it is saved and the cpu 
+    time of the process (writer + saver), idle (no parameters and no new data) 
+    and while writing. Polling is run with the default interval (saves 
+    blocks of 1 s) and with an interval of 1 save block, so that both loops
+    save the same blocks.
+    """
+    import tempfile
+    from pathlib import Path
+    from subs.recording.saver import Saver
+
+    def run(buff, name, wakeup, interval, write):
+        with tempfile.TemporaryDirectory() as tmp:
+            sav = Saver(paths={"save_dir": Path(tmp), "temp_dir": Path(tmp) / "temp"},
+                        shared_buffer=buff, buffer=buff.buffer,
+                        data_structure=buff.data_structure, recname="bench",
+                        out_buffers={}, save_block_lengths={par: block_size},
+                        JOURNAL=False, VERIFY=False, WAKEUP=wakeup, SAVE_LOOP_INTERVAL=interval)
+            sav.start()
+            latencies, full_since, n_saves = [], None, 0
+            t0, cpu = time.perf_counter(), time.process_time()
+            if write:
+                row = buff.row(par)
+                n_saved = row['n_saved']
+                for i in range(int(duration * freq / rows_per_write)):
+                    # write at freq, measure the time that a save block waits
+                    time.sleep(max(0, t0 + i * rows_per_write / freq - time.perf_counter()))
+                    buff.add_to_buf(par, rows)
+                    if row['n_saved'] != n_saved:
+                        n_saved = row['n_saved']
+                        n_saves += 1
+                        if full_since is not None:
+                            latencies.append(time.perf_counter() - full_since)
+                            full_since = None
+                    if full_since is None and row['n_written'] - row['n_saved'] >= block_size:
+                        full_since = time.perf_counter()
+            else:
+                time.sleep(duration)
+            cpu = time.process_time() - cpu
+            sav.stop()
+
+        txt = f"{name:<40} cpu: {cpu:.2f} s   wakeups: {sav.n_wakeups:>4}"
+        if write:
+            txt += (f"   saves: {n_saves:>4}   latency: {np.mean(latencies) * 1e3:>7.1f} ms (mean)"
+                    f" {np.max(latencies) * 1e3:>7.1f} ms (max)")
+        print(txt)
+
+    loops = (("polling (1 s)", False, Saver.SAVE_LOOP_INTERVAL),
+             (f"polling ({block_size / freq * 1e3:.0f} ms, 1 block)", False, block_size / freq),
+             ("woken by writer", True, Saver.SAVE_LOOP_INTERVAL))
+
+    buff, par = _create_buffer(freq * 60)
+    rows = np.zeros(rows_per_write, dtype=ROW_DTYPE)
+    try:
+        print(f"saveloop: idle for {duration} s, no parameters")
+        buff.remove_parameter(par)
+        for name, wakeup, interval in loops:
+            run(buff, name, wakeup, interval, False)
+
+        buff, par = _create_buffer(freq * 60)
+        print(f"saveloop: idle for {duration} s, no new data")
+        for name, wakeup, interval in loops:
+            run(buff, name, wakeup, interval, False)
+
+        print(f"saveloop: {duration} s at {freq:,} samples/s, save blocks of {block_size} samples")
+        for name, wakeup, interval in loops:
+            buff.clear_parameter(par)
+            run(buff, name, wakeup, interval, True)
+    finally:
+        _cleanup(buff)
+
+
+def bench_reader(days=7, freq=8, n_queries=50, query_seconds=600):
+    """
+    compare reading time ranges from a week of daily files: reading the 
+    time column of the file and searching it vs Recording.read (bisecting 
+    the time column, or with the sidecar index of the files)
+    """
+    import tempfile
+    from datetime import datetime, timedelta
+    from pathlib import Path
+    import h5py
+    from subs.recording.saver import Saver
+    from subs.recording.reader import Recording
+    from subs.recording.file_index import index_file
+
+    n_day = int(86400 * freq)
+    print(f"reader: {days} days at {freq} Hz ({n_day * days:,} samples), "
+          f"{n_queries} queries of {query_seconds} s")
+    with tempfile.TemporaryDirectory() as tmp:
+        sav = Saver(paths={"save_dir": Path(tmp), "temp_dir": Path(tmp) / "temp"},
+                    recname="bench", compression={'compression': "lzf"},
+                    JOURNAL=False, VERIFY=False)
+        start = datetime(2024, 1, 1)
+        data = np.zeros(Saver.BLOCK_SIZE, dtype=ROW_DTYPE)
+        for day in range(days):
+            sav.new_file(start + timedelta(days=day))
+            t0 = (start + timedelta(days=day)).timestamp()
+            for i in range(0, n_day, data.shape[0]):
+                block = data[:min(data.shape[0], n_day - i)]
+                block["time"] = t0 + (i + np.arange(block.shape[0])) / freq
+                sav.write("bench", block)
+            sav.close_file()
+
+        rec_dir = Path(tmp) / "bench"
+        rng = np.random.default_rng(0)
+        starts = start.timestamp() + rng.uniform(0, days * 86400 - query_seconds, n_queries)
+
+        def read_search(t):
+            parts = []
+            for file in sorted(rec_dir.glob("*.h5")):
+                with h5py.File(file, "r") as f:
+                    times = f["bench"]["time"]
+                    i0, i1 = np.searchsorted(times, (t, t + query_seconds))
+                    if i1 > i0:
+                        parts.append(f["bench"][i0:i1])
+            return np.concatenate(parts)
+
+        ref = None
+        for name, index in (("read time column + search", None), ("Recording (bisect)", False), 
+                            ("Recording (index)", True)):
+            if index:
+                for file in rec_dir.glob("*.h5"):
+                    index_file(file)
+            if index is None:
+                read = read_search
+            else:
+                rec = Recording(rec_dir)
+                read = lambda t: rec.read("bench", t, t + query_seconds)
+
+            t = time.perf_counter()
+            n_rows = sum(read(q).shape[0] for q in starts)
+            dt = time.perf_counter() - t
+            assert n_rows == n_queries * query_seconds * freq
+            rate = n_queries / dt
+            txt = f"{name:<40} {rate:>14,.1f} queries/s"
+            if ref is not None:
+                txt += f"   ({rate / ref:.0f}x)"
+            print(txt)
+            ref = ref or rate
+
+
+def bench_delta(n_items=0x20_0000, block_size=0x800, freq=2048):
+    """
+    compare saving time and us as is with delta encoding (Saver.DELTA_COLUMNS),
+    for the default compression and lzf: reports speed and file size
+    """
+    import tempfile
+    from pathlib import Path
+    from subs.recording.saver import Saver
+
+    data = np.zeros(n_items, dtype=ROW_DTYPE)
+    data["time"] = 1.7e9 + np.arange(n_items) / freq
+    data["us"] = (np.arange(n_items, dtype="i8") * 1_000_000 // freq) % 2 ** 32
+    for i in range(8):
+        data[f"CHIP{i}_SIG"] = np.sin(np.arange(n_items) / (100 + i)) + np.random.normal(0, 0.01, n_items)
+
+    print(f"delta: {n_items:,} samples at {freq:,} samples/s in blocks of {block_size}")
+    for compression in ({}, {"compression": "lzf", "shuffle": True}):
+        ref = None
+        for name, delta_columns in (("as is", {}), ("delta encoded", {"time": 1e6, "us": 1})):
+            name = f"{compression.get('compression', 'gzip')}, {name}"
+            with tempfile.TemporaryDirectory() as tmp:
+                sav = Saver(paths={"save_dir": Path(tmp), "temp_dir": Path(tmp) / "temp"},
+                            recname="bench", JOURNAL=False, VERIFY=False,
+                            DELTA_COLUMNS=delta_columns, **({"compression": compression} if compression else {}))
+                sav.new_file()
+                t = time.perf_counter()
+                for i in range(0, n_items, block_size):
+                    sav.write("bench", data[i:i + block_size])
+                sav.close_file()
+                rate = _report(name, n_items, time.perf_counter() - t, ref)
+                ref = ref or rate
+
+                file_size = sum(f.stat().st_size for f in (Path(tmp) / "bench").iterdir())
+                print(f"{'':<40} {file_size / 1e6:>14.1f} MB file")
+
+
+BENCHMARKS = {"ingest": bench_ingest,
+              "frames": bench_frames,
+              "framing": bench_framing,
+              "table": bench_table,
+              "reads": bench_reads,
+              "columns": bench_columns,
+              "pool": bench_pool,
+              "codecs": bench_codecs,
+              "datasets": bench_datasets,
+              "saveloop": bench_saveloop,
+              "reader": bench_reader,
+              "delta": bench_delta,
+              }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the recording pipeline")
+    parser.add_argument("benchmark", choices=list(BENCHMARKS) + ["all"])
+    args = parser.parse_args()
+
+    for name, func in BENCHMARKS.items():
+        if args.benchmark in (name, "all"):
+            func()
+            print()
@@ -22,15 +22,100 @@ def log(message, level="info"):
         print(f"{cls_name} - {level}: {message}")
 
 
-from subs.misc.shared_mem_np_dict import SharedTable, create_shared_np
+from subs.misc.shared_mem_np_dict import SharedTable, SharedPool, Wakeup, create_shared_np
 import numpy as np
 # from numpy.lib import recfunctions as rfn
 # import numba
 
 import pickle
-from bisect import bisect_left
+import time
 
 
+class ColumnBuffer():
+    """
+    Structure of arrays: a structured buffer of which each column is stored
+    as a contiguous array in one shared memory block (instead of rows with
+    all columns), so that reading (or saving) a column does not have to skip
+    over the other columns.
+
+    Behaves like the structured np array for SharedBuffer:
+        - buf['col']:           contiguous array of the column (view)
+        - buf[['c1', 'c2']]:    ColumnBuffer with only these columns (views)
+        - buf[rows]:            structured copy of the rows (int, slice, index array)
+        - buf[rows] = data:     write structured data (or tuple) per column
+
+    - raw:      shared uint8 array (see create_shared_np) of at least
+                nbytes(dtype, size) bytes
+    - dtype:    structured dtype of the rows
+    - size:     number of rows
+    """
+    ALIGN = 64                      # columns start at multiples of this (cache line)
+
+    def __init__(self, raw, dtype, size, columns=None) -> None:
+        self._raw = raw
+        self._shm = raw._shm
+        self.dtype = np.dtype(dtype)
+        self.shape = (size,)
+
+        if columns is None:
+            columns, offset = {}, 0
+            for name in self.dtype.names:
+                col_dtype = self.dtype[name]
+                columns[name] = np.ndarray((size, *col_dtype.shape), dtype=col_dtype.base,
+                                           buffer=raw, offset=offset)
+                offset += self._aligned(columns[name].nbytes)
+        self.columns = columns
+
+    @classmethod
+    def nbytes(cls, dtype, size):
+        """
+        number of bytes needed to store size rows of dtype
+        """
+        dtype = np.dtype(dtype)
+        return sum(cls._aligned(dtype[name].itemsize * size) for name in dtype.names)
+
+    @classmethod
+    def _aligned(cls, n):
+        return -(-n // cls.ALIGN) * cls.ALIGN
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if key is ...:
+            return self
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, list) and key and isinstance(key[0], str):
+            return ColumnBuffer(self._raw, [(name, self.dtype[name]) for name in key],
+                                self.shape[0], {name: self.columns[name] for name in key})
+
+        # rows: assemble structured copy
+        if isinstance(key, (int, np.integer)):
+            out = np.empty(1, dtype=self.dtype)
+            for name, col in self.columns.items():
+                out[name] = col[key]
+            return out[0]
+
+        first = next(iter(self.columns.values()))[key]
+        out = np.empty(first.shape[0], dtype=self.dtype)
+        for name, col in self.columns.items():
+            out[name] = col[key]
+        return out
+
+    def __setitem__(self, key, value):
+        if isinstance(key, str):
+            self.columns[key][...] = value
+            return
+        if isinstance(value, tuple):
+            value = np.array(value, dtype=self.dtype)
+        for name, col in self.columns.items():
+            col[key] = value[name]
+
+    def fill(self, value):
+        for col in self.columns.values():
+            col.fill(value)
+
 
 class SharedBuffer():
     """
@@ -38,8 +123,31 @@ class SharedBuffer():
     - data structure_format:    shared list with info about data structure
     - data_structure:           Shared np.recarray with par names write position, 
                                 dtype, dimensions etc
+                                - added:        position of the last written item (modulo dim0)
+                                - saved:        position of the last saved item (modulo dim0)
+                                - n_written:    total number of items written (does not wrap)
+                                - n_saved:      total number of items saved (does not wrap)
+                                - overrun:      total number of items that were overwritten
+                                                before they were saved (data loss)
+                                - first:        total item number of the oldest item that is
+                                                kept (older items are never in the buffer, 
+                                                e.g. after resizing)
+                                - save_at:      n_written at which the writer wakes the saver
+                                                (set by the saver, 0: no wake up)
+                                - created:      schema version at which the parameter was created
+                                - pyramid:      1 if min / max / mean pyramid is kept for the parameter
+                                - soa:          1 if the columns are stored separately (see ColumnBuffer)
+                                - seq:          write generation (seqlock), odd while a 
+                                                write is in progress
+                                - pool_offset:  offset of the slab of the parameter in the pool,
+                                                -1 if the parameter has its own shared memory
+                                - pool_size:    size (bytes) of the slab in the pool
     - shms:                     Dictionary with links to shared memory for buffer 
                                 (name of each shm is the name of the par)
+    - pool:                     shared memory reserved at start (POOL_SIZE) from which 
+                                the arrays of the parameters are taken (see SharedPool),
+                                parameters get their own shared memory if the pool is 
+                                full or not used
     """
     name = "Shared_Memory"          # change name on init if using multiple of these classes
 
@@ -48,12 +156,35 @@ class SharedBuffer():
     MAX_PAR_NAME_LEN = 128          # Max number of characters for par name
 
     buffer = {}                     # dictionary with with numpy arrays for main data as values and par name as key
+    created = {}                    # schema version at which each linked parameter in buffer was created
+    time_index = {}                 # coarse time index for parameters with time: {par: shared np array}
+    pyramid = {}                    # min / max / mean of columns per bucket of items: {par: [shared np array per level]}
+    version = None                  # shared schema version, increased on add / remove parameter
+    pools = {}                      # linked pools (one per name of the shared buffer): {name: SharedPool}
+    pool = None                     # pool of this shared buffer (see SharedPool)
+    wakeup = None                   # wakes the saver when a parameter reaches save_at (see Wakeup)
     data_structure_format = []      # list with shape and dtypes of data structure
     data_structure = None           # np.recarray with structure of the buffers
 
     defaults = {'added': -1,
                 'saved': 0,
-                'sent': 0}         # defaults for some paramters
+                'sent': 0,
+                'n_written': 0,
+                'seq': 0,
+                'n_saved': 0,
+                'overrun': 0,
+                'first': 0,
+                'save_at': 0,}     # defaults for some paramters
+
+    TOTALS = {'added': 'n_written', 
+              'saved': 'n_saved'}   # total counters from which the positions are derived
+
+    TIME_INDEX_STEP = 64            # items per entry in the time index
+    PYRAMID_FACTORS = (32, 512, 8192, 131072)   # items per bucket for each level of the pyramid
+    MAX_READ_RETRIES = 16           # max number of retries for a consistent read
+    READ_RETRY_WAIT = 0.001         # time (s) to wait between the last retries
+    POOL_SIZE = 0                   # bytes of shared memory to reserve for the buffers (0: no pool)
+    POOL_PREFAULT = True            # fault in the pool when it is created
 
     def __init__(self, *args, **kwargs) -> None:
         """
@@ -63,30 +194,61 @@ class SharedBuffer():
         self.__dict__.update(kwargs)
 
         self._create_shared_np = create_shared_np
+        self._rows = {}             # cached handles to the rows in the data structure: {par: TableRow}
+        self._version = -1          # schema version at last check_new
+        self._notified = {}         # save_at at which the saver was woken: {par: save_at}
         self.data_structure_format = ([('parname', f'<U{self.MAX_PAR_NAME_LEN}'), 
                               ('added', 'i8'), ('saved', 'i8'), ('network', 'i8'),
+                              ('n_written', 'i8'), ('seq', 'i8'),
+                              ('n_saved', 'i8'), ('overrun', 'i8'), ('first', 'i8'), ('created', 'i8'),
+                              ('save_at', 'i8'), ('pyramid', 'i8'), ('soa', 'i8'),
+                              ('pool_offset', 'i8'), ('pool_size', 'i8'),
                               ('type', '<S1024'),] 
                               + [(f'dim{i}', 'i8') for i in range(self.MAX_DIMS)]
                               )
         self._create_data_structure()
         self.check_new()            # link to existing if any
 
-    def add_parameter(self, parname, dtype, *shape):
+    def add_parameter(self, parname, dtype, *shape, pyramid=False, soa=False):
         """
         add parameter to shared memory
 
+        - pyramid:  keep min / max / mean of the numeric columns for buckets of 
+                    items (see get_envelope), for structured dtypes with time
+        - soa:      store each column contiguously (see ColumnBuffer), for 
+                    1 dimensional structured dtypes
+
         NOTE: dont forget to call check new in other processes to link to
               the new shared parameter
         """
+        soa = bool(soa and np.dtype(dtype).names and len(shape) == 1)
         dtype = pickle.dumps(dtype)
         shape = shape + ((0,) * (self.MAX_DIMS - len(shape)))  # pad shape with zeros
 
+        # slab in the pool for all arrays of the parameter
+        pool_size = sum(SharedPool.aligned(np.prod(spec_shape) * np.dtype(spec_dtype).itemsize, 
+                                           ColumnBuffer.ALIGN)
+                        for _, spec_shape, spec_dtype, _ in 
+                        self._array_specs(pickle.loads(dtype), [i for i in shape if i], pyramid, soa))
+        pool_offset = self.pool.allocate(pool_size, self._pool_slabs()) if self.pool else -1
+        if pool_offset < 0:
+            if self.pool:
+                log(f"{parname}: pool full, creating separate shared memory", "info")
+            pool_size = 0
+
+        created = self._bump_version()
         idx_new_par = self.data_structure.index.index('')
         self.data_structure.array[idx_new_par] = (parname, self.defaults['added'], self.defaults['saved'], self.defaults['sent'], 
-                                                  dtype, *shape)
+                                                  self.defaults['n_written'], self.defaults['seq'],
+                                                  self.defaults['n_saved'], self.defaults['overrun'],
+                                                  self.defaults['first'],
+                                                  created, self.defaults['save_at'], int(pyramid), int(soa), 
+                                                  pool_offset, pool_size, dtype, *shape)
         self.data_structure.index[idx_new_par] = parname
         self.data_structure.create_index_loopup()
-        self._make_buffer(parname, dtype, shape)
+        self._rows.clear()
+        self._make_buffer(parname, dtype, shape, pyramid, soa, pool_offset, new=True)
+        self.created[parname] = created
     
     def remove_parameter(self, parameter):
         """
@@ -97,42 +259,116 @@ class SharedBuffer():
             self.buffer[parameter]._shm.close()
             del self.buffer[parameter]
 
+            for aux in (self.time_index.pop(parameter, None), 
+                        *self.pyramid.pop(parameter, ())):
+                if aux is not None:
+                    aux._shm.unlink()
+                    aux._shm.close()
+
             self.data_structure.clear(index=parameter)
 
             idx = self.data_structure.index.index(parameter)
             self.data_structure.index[idx] = ''
+            self.data_structure.create_index_loopup()
+            self._rows.pop(parameter, None)
+            self.created.pop(parameter, None)
+            self._bump_version()
     
+    def resize_parameter(self, parameter, length):
+        """
+        changes the number of items (dim0) of parameter, the newest items and the 
+        counters (n_written, n_saved, overrun) are kept, so readers can continue
+        with their cursor (see read_since)
+
+        NOTE: the parameter is created again, so other processes have to call 
+              check_new, and nothing may be written to it during the resize
+        """
+        row = self.row(parameter)
+        if row['dim0'] == length:
+            return
+
+        data, n_written = self.read_last(parameter, min(length, row['dim0']))
+        n_saved, overrun = row['n_saved'], row['overrun']
+        pyramid, soa = bool(row['pyramid']), bool(row['soa'])
+        buf = self.buffer[parameter]
+
+        self.remove_parameter(parameter)
+        self.add_parameter(parameter, buf.dtype, length, *buf.shape[1:], 
+                           pyramid=pyramid, soa=soa)
+
+        row = self.row(parameter)
+        row['n_written'] = row['first'] = n_written - data.shape[0]
+        self.add_to_buf(parameter, data)
+        row['overrun'] = overrun
+        self.set_saved(parameter, n_saved)
+
     def clear_parameter(self, parameter, fill=None):
         """
-        empties parameter and sets counter to 0
+        empties parameter and resets the counters and positions to their defaults
         """
-        self.data_structure.set(self.defaults['added'], 'added', parameter)
-        self.data_structure.set(self.defaults['saved'], 'saved', parameter)
+        row = self.row(parameter)
+        seq = self._begin_write(row)
+        for col in ('added', 'saved', 'n_written', 'n_saved', 'overrun', 'first', 'save_at'):
+            row[col] = self.defaults[col]
+        self._notified.pop(parameter, None)
         self.buffer[parameter][:] = np.empty(self.buffer[parameter].shape,
                                              dtype=self.buffer[parameter].dtype)
         if fill is not None:
             self.buffer[parameter].fill(fill)
+        if parameter in self.time_index:
+            self.time_index[parameter].fill(np.nan)
+        self._end_write(row, seq)
 
     def check_new(self):
         """
-        checks and return if new parameters added to the datastructure 
+        checks and return if new parameters added to the datastructure,
+        links to new (or recreated) parameters and drops links to removed 
+        parameters.
+
+        NOTE: the data structure is only reloaded if the schema version changed
+              (parameters added or removed), otherwise this is a single compare
         """
+        version = self.version[0]
+        if version == self._version:
+            return set()
+        self._version = version             # changes during reload are found at next check
+
         self.data_structure.load(self.data_structure.name)
+        self._rows.clear()                  # rows can be moved by other processes
+
+        current = {par: created for par, created in 
+                   zip(self.data_structure.get('parname', ...), 
+                       self.data_structure.get('created', ...)) 
+                   if par}
 
-        pars = set(self.buffer)
-        new_pars = set(self.data_structure.get('parname', ...)) - pars
-        new_pars.discard('')
+        # drop links to removed or recreated parameters (shm is closed when not used anymore)
+        for par in [p for p in self.created if current.get(p) != self.created[p]]:
+            self.buffer.pop(par, None)
+            self.time_index.pop(par, None)
+            self.pyramid.pop(par, None)
+            del self.created[par]
+
+        new_pars = set(current) - set(self.buffer)
 
         # make or link buffer for each new parameter
         for par in new_pars:
-            dtype, *shape = self.data_structure.get(
-                ['type'] + [i for i in self.data_structure.dtype 
+            pyramid, soa, pool_offset, dtype, *shape = self.data_structure.get(
+                ['pyramid', 'soa', 'pool_offset', 'type'] + [i for i in self.data_structure.dtype 
                                         if i.startswith('dim')], 
                 par)
             shape = shape[:shape.index(0)]                                      # remove dims with 0
-            self._make_buffer(par, dtype, shape)
+            self._make_buffer(par, dtype, shape, pyramid, soa, pool_offset)
+            self.created[par] = current[par]
 
         return new_pars
+
+    def _bump_version(self):
+        """
+        increases the shared schema version (other processes relink on check_new),
+        returns the new version
+        """
+        self.version[0] += 1
+        return self.version[0]
         
     def get_buf(self,  par, 
                 start=None, end=None, subpar=..., n_items=None,
@@ -194,49 +430,268 @@ class SharedBuffer():
     def get_time_back(self, par, seconds_back, 
                       time_sub_par="time", 
                       subpar=...,
-                      decimated_out_len=None):
+                      decimated_out_len=None,
+                      out=None, copy=False):
         """
         get x secondsback from end
         - par: parameter where time is / par to return
         - time_sub_par: optional if time is a subpar from par e.g. par is data and time is within data
         - sub_par: sub parameter to return
         - seconds_back: time window to return from end in seconds
-        - decimated_out_len: desired length of output (achieved by decimation)
-
-
-
+        - decimated_out_len: desired length of output (achieved by decimation), 
+                             for parameters with a pyramid the min / max envelope
+                             is returned (see get_envelope)
+        - out, copy: see get_items (the envelope is always a new array)
         """
-        end_idx = self.data_structure.get('added', par)            # index of last recorded data
-        if end_idx == -1:                                          # no data added yet
+        n_written = self.row(par)['n_written']                      # total number of items
+        if n_written == 0:                                          # no data added yet
             log('No data in buffer (yet?)', "debug")
             return
 
-        end_time = self.buffer[par][time_sub_par][end_idx]          # time of last recorded data
-        start_time = end_time - seconds_back                        # time of first timepoint
-            
-        # find start time idx:
-        if start_time < self.buffer[par][time_sub_par][0]:
-            # buffer has looped or not enough data recorded yet
-            if start_time > self.buffer[par][time_sub_par][-1]:
-                # there is not enough data recorded yet to cover full secondsback
-                start_idx = 0   # limit to first position in buffer
+        times = self.buffer[par][time_sub_par]
+        end_time = times[(n_written - 1) % times.shape[0]]          # time of last recorded data
+        start = self.find_time(par, end_time - seconds_back, time_sub_par)
 
-            else:
-                # end index looped in circular buffer search for start after loop
-                start_idx = bisect_left(self.buffer[par][time_sub_par], 
-                                        start_time, lo=end_idx)
-        else:
-            start_idx = bisect_left(self.buffer[par][time_sub_par], 
-                                    start_time, hi=end_idx) # index of first timepoint for plot
+        if (decimated_out_len is not None and par in self.pyramid 
+                and time_sub_par == 'time'):
+            return self.get_envelope(par, start, n_written, decimated_out_len, subpar)
         
-        if start_idx == end_idx:
-            log(f'Start {start_idx} and end {end_idx} of data have same index', 'warning')
-            start_idx += 1         # return full buffer
-            # return
+        return self.get_items(par, start, n_written, subpar=subpar,
+                              decimated_out_len=decimated_out_len,
+                              out=out, copy=copy)
+
+    def get_envelope(self, par, start, end, out_len, subpar=...):
+        """
+        returns the min / max envelope of items start - end (total item numbers), 
+        so that short peaks are not lost by decimation: for each of max out_len // 2 
+        buckets a row with the minimum and a row with the maximum of each column 
+        (with the time of the first item of the bucket), followed by the last item.
         
-        return self.get_buf(par=par, subpar=subpar, 
-                            start=start_idx, end=end_idx,
-                            decimated_out_len=decimated_out_len)
+        The buckets are read from the coarsest pyramid level that still gives enough 
+        buckets, so the time to get the envelope does not depend on the number of items.
+
+        - subpar:   column name or list of column names (time is always included),
+                    only pyramid columns (numeric, not time)
+
+        returns items (without envelope) if there are less than out_len items
+        """
+        buf = self.buffer[par]
+        start = max(start, self.first_item(par, end))
+        n_buckets = max(1, int(out_len) // 2)
+
+        if subpar is ...:
+            columns = self._pyramid_columns(buf.dtype)
+        else:
+            columns = [c for c in np.atleast_1d(subpar) if c != 'time']
+
+        fields = ['time', *columns]
+        if end - start <= out_len:
+            return self._ring(buf[fields], start, end, copy=True)
+
+        # coarsest level with at least n_buckets buckets (level 0 is items)
+        factor, level = 1, buf
+        for f, lev in zip(self.PYRAMID_FACTORS, self.pyramid.get(par, ())):
+            if (end - start) // f < n_buckets:
+                break
+            factor, level = f, lev
+
+        j0, j1 = -(-start // factor), end // factor                # complete buckets in range
+        r = -(-(j1 - j0) // n_buckets)                              # combine r buckets per output bucket
+        n = (j1 - j0) // r
+        read = lambda col: self._ring(level[col], j0, j0 + n * r)   # per column (contiguous for soa)
+
+        out = np.empty(n * 2 + 1, dtype=[(f, buf.dtype[f]) for f in fields])
+        out['time'][0:-1:2] = out['time'][1:-1:2] = read('time')[::r]
+        for col in columns:
+            mins, maxs = ((read(col),) * 2 if factor == 1 
+                          else (read(f"{col}_min"), read(f"{col}_max")))
+            out[col][0:-1:2] = np.fmin.reduce(mins.reshape(n, r), axis=1)
+            out[col][1:-1:2] = np.fmax.reduce(maxs.reshape(n, r), axis=1)
+        out[-1] = buf[fields][(end - 1) % buf.shape[0]]
+        return out
+
+    @staticmethod
+    def _pyramid_columns(dtype):
+        """
+        names of the columns that are kept in the pyramid (numeric, scalar, not time)
+        """
+        return [name for name in dtype.names 
+                if name != 'time' and dtype[name].shape == () and dtype[name].kind in 'biuf']
+
+    @classmethod
+    def _pyramid_dtype(cls, dtype):
+        """
+        dtype of the pyramid levels: time and min / max / mean of each pyramid column
+        """
+        dtype = np.dtype(dtype)
+        return np.dtype([('time', 'f8')] + [
+            (f"{col}_{stat}", dtype[col] if stat != 'mean' else 'f4')
+            for col in cls._pyramid_columns(dtype)
+            for stat in ('min', 'max', 'mean')])
+
+    @classmethod
+    def bytes_per_item(cls, dtype, pyramid=False):
+        """
+        shared memory used per item of a parameter with dtype, including the 
+        time index and pyramid (see add_parameter)
+        """
+        dtype = np.dtype(dtype)
+        nbytes = dtype.itemsize
+        if dtype.names and 'time' in dtype.names:
+            nbytes += 8 / cls.TIME_INDEX_STEP
+            if pyramid:
+                nbytes += sum(cls._pyramid_dtype(dtype).itemsize / factor
+                              for factor in cls.PYRAMID_FACTORS)
+        return nbytes
+
+    def _update_pyramid(self, par, start, end):
+        """
+        calculates the buckets of the pyramid levels that are completed by 
+        items start - end (total item numbers), each level from the level below
+        """
+        if start // self.PYRAMID_FACTORS[0] == end // self.PYRAMID_FACTORS[0]:
+            return                                                  # no bucket completed
+
+        src, src_factor = self.buffer[par], 1
+        first = self.first_item(par, end)
+        columns = self._pyramid_columns(src.dtype)
+        for factor, level in zip(self.PYRAMID_FACTORS, self.pyramid[par]):
+            # completed buckets, of which the items are not overwritten
+            j0 = max(start // factor, -(-first // factor))
+            j1 = end // factor
+            if j1 <= j0:
+                break                                               # nothing completed on higher levels
+
+            r = factor // src_factor
+            n = j1 - j0
+            read = lambda col: self._ring(src[col], j0 * r, j1 * r)   # per column (contiguous for soa)
+
+            new = np.empty(n, dtype=level.dtype)
+            new['time'] = read('time')[::r]
+            for col in columns:
+                if src_factor == 1:
+                    mins = maxs = read(col).reshape(n, r)
+                    means = mins
+                else:
+                    mins = read(f"{col}_min").reshape(n, r)
+                    maxs = read(f"{col}_max").reshape(n, r)
+                    means = read(f"{col}_mean").reshape(n, r)
+                new[f"{col}_min"] = np.fmin.reduce(mins, axis=1)
+                new[f"{col}_max"] = np.fmax.reduce(maxs, axis=1)
+                new[f"{col}_mean"] = means.mean(axis=1)
+            level[np.arange(j0, j1) % level.shape[0]] = new
+
+            src, src_factor = level, factor
+
+    def find_time(self, par, t, time_sub_par="time"):
+        """
+        returns the total item number (see n_written) of the first item in the
+        buffer with time >= t, searches the coarse time index (one time stamp per 
+        TIME_INDEX_STEP items, in order of writing) and then the items in 
+        between, so it is also correct when the buffer has looped.
+
+        NOTE: time has to increase with each item
+        """
+        row = self.row(par)
+        n_written = row['n_written']
+        first = self.first_item(par, n_written)                     # oldest item in buffer
+        times = self.buffer[par][time_sub_par]
+
+        if time_sub_par != "time" or par not in self.time_index:
+            # no index: search all items
+            return first + int(np.searchsorted(self._ring(times, first, n_written), t))
+
+        step = self.TIME_INDEX_STEP
+        j0 = -(-first // step)                                      # first index entry in buffer
+        j1 = -(-n_written // step)                                  # last index entry + 1
+        k = int(np.searchsorted(self._ring(self.time_index[par], j0, j1), t))
+
+        # t is between index entry k - 1 and k: search items in between
+        lo = first if k == 0 else (j0 + k - 1) * step
+        hi = n_written if j0 + k >= j1 else (j0 + k) * step
+        return lo + int(np.searchsorted(self._ring(times, lo, hi), t))
+
+    def get_items(self, par, start, end, subpar=..., decimated_out_len=None,
+                  out=None, copy=False):
+        """
+        get items start - end (total item numbers, see n_written) from the
+        circular buffer, items that are overwritten already are skipped
+
+        - decimated_out_len: desired length of output (achieved by decimation)
+        - out:               array to copy the items to (reused by caller), must be 
+                             large enough, returns the filled part of out
+        - copy:              always return a copy (otherwise a view of the buffer 
+                             is returned if the items are not looped)
+        """
+        buf = self.buffer[par][subpar]
+        start = max(start, self.first_item(par, end))
+
+        step = 1
+        if decimated_out_len is not None and (end - start) > decimated_out_len:
+            step = int((end - start) // decimated_out_len)
+
+        return self._ring(buf, start, end, step, out=out, copy=copy)
+
+    def get_segments(self, par, start, end, subpar=...):
+        """
+        returns items start - end (total item numbers, see n_written) as a 
+        tuple of views of the buffer: one segment, or two if the items are
+        looped (process them in order instead of concatenating)
+
+        NOTE: the views change when new data is added, use within read_consistent
+        """
+        buf = self.buffer[par][subpar]
+        return self._segments(buf, max(start, self.first_item(par, end)), end)
+
+    @staticmethod
+    def _segments(arr, start, end, step=1):
+        """
+        returns items start - end (total item numbers) from circular array arr
+        as tuple with one view, or two views if looped
+        """
+        size = arr.shape[0]
+        if end <= start:
+            return (arr[0:0],)
+
+        i0 = start % size
+        i1 = i0 + end - start
+        if i1 <= size:
+            return (arr[i0:i1:step],)
+
+        part = arr[i0::step]
+        offset = part.shape[0] * step - (size - i0)               # start of second part
+        return part, arr[offset:i1 - size:step]
+
+    @classmethod
+    def _ring(cls, arr, start, end, step=1, out=None, copy=False):
+        """
+        returns items start - end (total item numbers) from circular array arr,
+        as view if possible or concatenated if looped, or copied in out
+        """
+        segments = cls._segments(arr, start, end, step)
+
+        if out is not None:
+            i = 0
+            for seg in segments:
+                out[i:i + seg.shape[0]] = seg
+                i += seg.shape[0]
+            return out[:i]
+
+        if len(segments) == 1:
+            return segments[0].copy() if copy else segments[0]
+        return np.concatenate(segments)
+
+    def _update_time_index(self, par, start, end):
+        """
+        stores the time of each TIME_INDEX_STEPth item of items start - end
+        (total item numbers) in the time index
+        """
+        index = self.time_index[par]
+        step = self.TIME_INDEX_STEP
+        items = np.arange(-(-start // step) * step, end, step)
+        if items.shape[0]:
+            times = self.buffer[par]['time']
+            index[(items // step) % index.shape[0]] = times[items % times.shape[0]]
 
     
     def add_to_buf(self, par, data):
@@ -245,42 +700,214 @@ class SharedBuffer():
         NOTE: data should have same structure as buffer[par]
         """
         n_items = data.shape[0]
-        
-        start = self.data_structure.get('added', par) + 1
+        if n_items == 0:
+            return
+
+        row = self.row(par)
+        buff_size = row['dim0']
+        n_written = row['n_written']
+        start = n_written % buff_size
+        n_total = n_items
+
+        if n_items > buff_size:
+            # block does not fit in buffer, only keep the newest items
+            start = (start + n_items - buff_size) % buff_size
+            data = data[-buff_size:]
+            n_items = buff_size
+
         end = start + n_items
-        
-        buff_size = self.data_structure.get('dim0', par)
 
+        seq = self._begin_write(row)
         if end <= buff_size:
             self.buffer[par][start:end] = data
 
         else:
             # circular write
             mid = buff_size - start
-            self.buffer[par][start:] = data[:buff_size - start]
-            end %= buff_size
-            self.buffer[par][:end] = data[mid:]
+            self.buffer[par][start:] = data[:mid]
+            self.buffer[par][:end - buff_size] = data[mid:]
         
-        self.data_structure.set(end, 'added', par)
+        row['added'] = (end - 1) % buff_size        # added is the position of the last written item
+        row['n_written'] = n_written + n_total
+        if par in self.time_index:
+            self._update_time_index(par, n_written + n_total - n_items, n_written + n_total)
+        if par in self.pyramid:
+            self._update_pyramid(par, n_written + n_total - n_items, n_written + n_total)
+        self._end_write(row, seq)
+        self._check_save_at(par, row)
     
     def add_1_to_buffer(self, par, data):
         """
         adds one value to the buffer (should be tuple with values for all columns if buffer is struct array)
         """              
-        pos = ((self.data_structure.get('added', par) + 1) 
-                    % self.data_structure.get('dim0', par))
+        row = self.row(par)
+        n_written = row['n_written']
+        pos = n_written % row['dim0']
+        seq = self._begin_write(row)
         self.buffer[par][pos] = data
-        self.data_structure.set(pos, 'added', par)
+        row['added'] = pos
+        row['n_written'] = n_written + 1
+        if par in self.time_index and n_written % self.TIME_INDEX_STEP == 0:
+            index = self.time_index[par]
+            index[(n_written // self.TIME_INDEX_STEP) % index.shape[0]] = self.buffer[par]['time'][pos]
+        if par in self.pyramid:
+            self._update_pyramid(par, n_written, n_written + 1)
+        self._end_write(row, seq)
+        self._check_save_at(par, row)
+
+    def _check_save_at(self, par, row):
+        """
+        wakes the saver (once per save_at) when the items written reach save_at
+        """
+        save_at = row['save_at']
+        if save_at and row['n_written'] >= save_at and self._notified.get(par) != save_at:
+            self._notified[par] = save_at
+            if self.wakeup is None:
+                SharedBuffer.wakeup = Wakeup(f"{self.name}_saver")
+            self.wakeup.notify()
+
+    def first_item(self, par, end):
+        """
+        total item number of the oldest item in the buffer, when end items
+        are written
+        """
+        row = self.row(par)
+        return max(end - row['dim0'], row['first'], 0)
+
+    def row(self, par):
+        """
+        returns the (cached) handle to the row of par in the data structure
+        (see SharedTable.row), raises KeyError if par is not in the data structure
+        """
+        try:
+            return self._rows[par]
+        except KeyError:
+            row = self._rows[par] = self.data_structure.row(par)
+            return row
+
+    def _begin_write(self, row):
+        """
+        marks the start of a write (seq becomes odd), returns the seq to pass
+        to _end_write
+
+        NOTE: only one process (the writer) may write to a parameter
+        """
+        seq = row['seq'] | 1
+        row['seq'] = seq
+        return seq
+
+    def _end_write(self, row, seq):
+        """
+        marks the end of a write (seq becomes even and is increased)
+        """
+        row['seq'] = seq + 1
+
+    def read_consistent(self, par, read, *args, **kwargs):
+        """
+        calls read(*args, **kwargs) until it is not overlapped by a write 
+        to par (seqlock), so that the data is not torn or overwritten 
+        during the read. 
+
+        NOTE: read has to copy the data (views of the buffer change after the call)
+
+        returns the output of read, if no consistent read is possible 
+        (buffer is written constantly) an unchecked read is returned (logged)
+        """
+        try:
+            row = self.row(par)
+        except KeyError:
+            return read(*args, **kwargs)            # parameter not in data structure
+
+        for i in range(self.MAX_READ_RETRIES):
+            if i:
+                # back off: first yield, then wait for a gap between writes
+                time.sleep(0 if i < self.MAX_READ_RETRIES // 2 else self.READ_RETRY_WAIT)
+
+            seq = row['seq']
+            if seq & 1:
+                continue                            # write in progress
+
+            out = read(*args, **kwargs)
+            if row['seq'] == seq:
+                return out
+
+        log(f"{par}: no consistent read after {self.MAX_READ_RETRIES} tries", "warning")
+        return read(*args, **kwargs)
+
+    def read_last(self, par, n_items, subpar=..., out=None):
+        """
+        returns a consistent copy of the last n_items of par and the 
+        total number of items written (cursor for read_since)
+
+        - out:          array to copy the items to (see get_items)
+        """
+        row = self.row(par)
+
+        def read():
+            n_written = row['n_written']
+            return self._copy_items(par, n_written - n_items, n_written, subpar, out), n_written
+
+        return self.read_consistent(par, read)
+
+    def read_since(self, par, cursor, max_items=None, subpar=..., out=None):
+        """
+        returns a consistent copy of the items written after cursor
+
+        - cursor:       total number of items written at the previous read
+                        (n_written returned by read_last / read_since, 0 for all)
+        - max_items:    return max this number of items (the oldest)
+        - out:          array to copy the items to (see get_items)
+
+        returns: data, new cursor, number of items that were overwritten before 
+                 they could be read (overrun)
+        """
+        row = self.row(par)
+
+        def read():
+            n_written = row['n_written']
+            start = max(cursor, self.first_item(par, n_written))
+            end = n_written if max_items is None else min(n_written, start + max_items)
+            return self._copy_items(par, start, end, subpar, out), end, start - cursor
+
+        return self.read_consistent(par, read)
+
+    def _copy_items(self, par, start, end, subpar=..., out=None):
+        """
+        copies items start - end (total item numbers, see n_written) from the
+        circular buffer (in out if defined)
+        """
+        return self.get_items(par, start, end, subpar, out=out, copy=True)
 
 
     def get_n_items(self, i1, i2, par):
         """
         calculates n items between iterator 1 and iterator 2
         (names of the iterators in data_structure)
+
+        NOTE: for iterators with a total counter (added, saved) the totals are
+              used, the result can be larger than the buffer (data was 
+              overwritten) and is 0 only if nothing new is added
+        """
+        row = self.row(par)
+        if i1 in self.TOTALS and i2 in self.TOTALS:
+            return row[self.TOTALS[i1]] - row[self.TOTALS[i2]]
+
+        return (row[i1] - row[i2]) % row['dim0']
+
+    def set_saved(self, par, n_saved, overrun=0):
+        """
+        sets the total number of saved items and the derived saved position
+
+        - n_saved:  total number of items saved (cursor returned by read_since)
+        - overrun:  number of items that were overwritten before they could 
+                    be saved, added to the overrun counter
         """
-        return ((self.data_structure.get(i1, par) 
-                 - self.data_structure.get(i2, par)) 
-                % self.data_structure.get('dim0', par))
+        row = self.row(par)
+        row['n_saved'] = n_saved
+        if n_saved > 0:
+            row['saved'] = (n_saved - 1) % row['dim0']
+        if overrun:
+            row['overrun'] += overrun
 
     def close_all(self):
         """
@@ -290,20 +917,28 @@ class SharedBuffer():
         and dump core
 
         """
-        for v in self.buffer.values():
+        for v in (*self.buffer.values(), *self.time_index.values(),
+                  *(lev for levels in self.pyramid.values() for lev in levels)):
             v._shm.close()
         self.buffer.clear()
+        self.time_index.clear()
+        self.pyramid.clear()
+        if self.pools.pop(self.name, None) is not None:
+            self.pool.close()
 
     def unlink_all(self):
         """
         destroys data block
 
         """
-        for v in self.buffer.values():
+        for v in (*self.buffer.values(), *self.time_index.values(),
+                  *(lev for levels in self.pyramid.values() for lev in levels)):
             try:
                 v._shm.unlink()
             except FileNotFoundError:
                 pass # already unlinked
+        if self.pool:
+            self.pool.unlink()
     
     def reset(self, par=...):
         """
@@ -335,17 +970,132 @@ class SharedBuffer():
             for i in range(len(self.data_structure.index)):
                 self.data_structure.index[i] = ''
 
+        self.version = create_shared_np(f'{self.name}_version', (1,), 'i8', fill=0)
+
+        # link to (or create) the pool, keep one link per process
+        self.pool = self.pools.get(self.name)
+        if not self.pool:
+            self.pool = self.pools[self.name] = SharedPool(f'{self.name}_pool', self.POOL_SIZE,
+                                                           prefault=self.POOL_PREFAULT)
+
         
-    def _make_buffer(self, parname, dtype, shape):
+    def _array_specs(self, dtype, shape, pyramid=False, soa=False):
+        """
+        returns (name suffix, shape, dtype, fill) of each shared array of a parameter:
+        the buffer, the time index and the pyramid levels
+        """
+        dtype = np.dtype(dtype)
+        if soa:
+            specs = [('', (ColumnBuffer.nbytes(dtype, shape[0]),), 'u1', None)]
+        else:
+            specs = [('', tuple(shape), dtype, None)]
+
+        if dtype.names and 'time' in dtype.names:
+            # coarse time index (one entry per TIME_INDEX_STEP items) 
+            specs.append(('_time_index', (-(-shape[0] // self.TIME_INDEX_STEP) + 1,), 
+                          'f8', np.nan))
+
+            if pyramid:
+                # min / max / mean per bucket for each level
+                level_dtype = self._pyramid_dtype(dtype)
+                specs += [(f"_pyramid{i}", (-(-shape[0] // factor) + 1,), level_dtype, None)
+                          for i, factor in enumerate(self.PYRAMID_FACTORS)]
+        return specs
+
+    def _pool_slabs(self):
+        """
+        (offset, size) of the slabs in the pool that are used by parameters
+        """
+        return [(offset, size) for offset, size in 
+                zip(self.data_structure.get('pool_offset', ...), 
+                    self.data_structure.get('pool_size', ...))
+                if size > 0]
+
+    def _make_buffer(self, parname, dtype, shape, pyramid=False, soa=False, 
+                     pool_offset=-1, new=False):
+        """
+        creates (or links to) the shared arrays of a parameter, in its own 
+        shared memory or in the slab at pool_offset of the pool
+
+        - new:  parameter is added (fill arrays in the pool)
+        """
         if not parname:
             return
         shape = [i for i in shape if i != 0]
         dtype = pickle.loads(dtype)
 
-        self.buffer[parname] = self._create_shared_np(f"{self.name}_{parname}", 
-                                                                          shape, 
-                                                                          dtype, 
-                                                                          )
+        arrays = []
+        for suffix, arr_shape, arr_dtype, fill in self._array_specs(dtype, shape, pyramid, soa):
+            if pool_offset < 0:
+                arrays.append(self._create_shared_np(f"{self.name}_{parname}{suffix}", 
+                                                     arr_shape, arr_dtype, fill=fill))
+            else:
+                arrays.append(self.pool.array(pool_offset, arr_shape, arr_dtype, 
+                                              fill=fill if new else None))
+                pool_offset += SharedPool.aligned(arrays[-1].nbytes, ColumnBuffer.ALIGN)
+
+        buffer, *aux = arrays
+        self.buffer[parname] = ColumnBuffer(buffer, dtype, shape[0]) if soa else buffer
+        if aux:
+            self.time_index[parname], *levels = aux
+            if levels:
+                self.pyramid[parname] = levels
+
+class BlockWriter():
+    """
+    Collects single rows for a parameter in a preallocated block and commits
+    them to the shared buffer with a single add_to_buf call, instead of 
+    writing (and updating the data structure) for every row
+
+    - shared_buffer:    SharedBuffer to write to
+    - par:              name of the parameter in the shared buffer
+    - dtype:            dtype of a row
+    - block_size:       maximum number of rows to collect before committing
+    - max_latency:      maximum time (s) the oldest row is kept before committing
+
+    NOTE: call flush when the data stream stops, otherwise the last rows
+          stay in the block until new data arrives
+    """
+
+    def __init__(self, shared_buffer, par, dtype, 
+                 block_size=64, max_latency=0.05) -> None:
+        self.shared_buffer = shared_buffer
+        self.par = par
+        self.block = np.zeros(max(1, int(block_size)), dtype=dtype)
+        self.block_size = self.block.shape[0]
+        self.max_latency = max_latency
+
+        self.n = 0                      # number of rows in block
+        self.first_time = 0             # time (monotonic) of first row in block
+
+    def add(self, row):
+        """
+        add one row (tuple or np.void with values for all columns) to the block
+        """
+        if self.n == 0:
+            self.first_time = time.monotonic()
+
+        self.block[self.n] = row
+        self.n += 1
+
+        if (self.n >= self.block_size
+                or (time.monotonic() - self.first_time) >= self.max_latency):
+            self.flush()
+
+    def flush(self):
+        """
+        commit collected rows to the shared buffer
+        """
+        if self.n:
+            self.shared_buffer.add_to_buf(self.par, self.block[:self.n])
+            self.n = 0
+
+    def clear(self):
+        """
+        discard collected rows
+        """
+        self.n = 0
+
 
 if __name__ == '__main__':
     '''
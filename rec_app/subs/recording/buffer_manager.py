@@ -0,0 +1,117 @@
+"""
+Divides the memory for the shared buffers over the connected interfaces
+
+Each interface registers its sample rate and the memory it uses per item
+(see SharedBuffer.bytes_per_item). The memory (MAX_MEM) is divided in
+proportion to rate * bytes per item, so that all interfaces keep the same
+time (retention) in their buffer. When an interface is added, removed or
+changes its rate, the buffers of the other interfaces are resized with the
+resize function they registered.
+"""
+
+# create logger
+try:
+    from subs.log import create_logger
+    logger = create_logger()
+
+except:
+    logger = None
+
+def log(message, level="info"):
+    cls_name = "BUFFER_MANAGER"
+    try:
+        getattr(logger, level)(f"{cls_name}: {message}")  # change CLASSNAME here
+    except AttributeError:
+        print(f"{cls_name} - {level}: {message}")
+
+
+class BufferManager():
+    """
+    - MAX_MEM:          total memory (bytes) for the buffers of all interfaces
+    - MIN_LENGTH:       min number of items of a buffer
+    - RESIZE_MARGIN:    only resize if the length changes more than this fraction
+    - interfaces:       registered interfaces (shared by all instances in a process):
+                        {name: {'rate': .., 'item_bytes': .., 'length': .., 'resize': ..}}
+    """
+    MAX_MEM = 128e6
+    MIN_LENGTH = 1024
+    RESIZE_MARGIN = 0.1
+
+    interfaces = {}
+
+    def __init__(self, **kwargs) -> None:
+        """
+        use kwargs to override MAX_MEM etc.
+        e.g. manager = BufferManager(MAX_MEM=64e6)
+        """
+        self.__dict__.update(kwargs)
+
+    def register(self, name, rate, item_bytes, resize=None):
+        """
+        registers (or updates) the buffer of an interface and resizes the
+        buffers of the other interfaces
+
+        - name:         name of the buffer
+        - rate:         sample rate (Hz)
+        - item_bytes:   memory used per item
+        - resize:       function that is called with the new length when the
+                        buffer has to be resized (None to keep size)
+
+        returns the length (number of items) for the buffer
+        """
+        self.interfaces[name] = {'rate': max(rate, 1),
+                                 'item_bytes': item_bytes,
+                                 'length': 0,
+                                 'resize': resize}
+        length = self.interfaces[name]['length'] = self.get_length(name)
+        self.rebalance(skip=name)
+        log(f"{name}: {length} items, {self.retention(name):.0f} s", "debug")
+        return length
+
+    def unregister(self, name):
+        """
+        removes the buffer of an interface, the memory is divided over the
+        other interfaces
+        """
+        if self.interfaces.pop(name, None) is not None:
+            self.rebalance()
+
+    def set_rate(self, name, rate):
+        """
+        changes the sample rate of an interface and divides the memory again
+        """
+        if name in self.interfaces:
+            self.interfaces[name]['rate'] = max(rate, 1)
+            self.rebalance()
+
+    def get_length(self, name):
+        """
+        number of items for the buffer of name, in proportion to
+        rate * bytes per item of all interfaces
+        """
+        info = self.interfaces[name]
+        total = sum(i['rate'] * i['item_bytes'] for i in self.interfaces.values())
+        share = self.MAX_MEM * info['rate'] * info['item_bytes'] / total
+        return max(self.MIN_LENGTH, int(share // info['item_bytes']))
+
+    def retention(self, name):
+        """
+        time (s) of data that fits in the buffer of name at the current rate
+        """
+        info = self.interfaces.get(name)
+        if not info:
+            return 0
+        return info['length'] / info['rate']
+
+    def rebalance(self, skip=None):
+        """
+        resizes the buffers of which the length changed more than RESIZE_MARGIN
+        (except skip)
+        """
+        for name, info in list(self.interfaces.items()):
+            length = self.get_length(name)
+            if name == skip or abs(length - info['length']) <= info['length'] * self.RESIZE_MARGIN:
+                continue
+            if info['resize'] is None or info['resize'](length) is False:
+                continue                            # cannot be resized now
+            info['length'] = length
@@ -0,0 +1,122 @@
+"""
+Compression filters for the h5 datasets of the Saver
+
+compression_options returns the keyword arguments for h5py create_dataset
+for a codec:
+    - gzip, lzf:            build into h5py
+    - lz4, zstd, blosc:     need hdf5plugin (pip install hdf5plugin), lzf is
+                            used if it is not installed
+    - None:                 no compression
+
+blosc uses its own (faster) byte shuffle if shuffle is set, blosc-bitshuffle
+shuffles the bits.
+
+Codecs per parameter are set with a string of pattern=codec pairs, e.g.:
+    "notes=gzip, *=lz4"
+(see parse_par_codecs, patterns as in fnmatch)
+"""
+
+# create logger
+try:
+    from subs.log import create_logger
+    logger = create_logger()
+
+except:
+    logger = None
+
+def log(message, level="info"):
+    cls_name = "COMPRESSION"
+    try:
+        getattr(logger, level)(f"{cls_name}: {message}")  # change CLASSNAME here
+    except AttributeError:
+        print(f"{cls_name} - {level}: {message}")
+
+
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+from fnmatch import fnmatch
+
+
+CODECS = ["gzip", "lzf", "lz4", "zstd", "blosc", "blosc-bitshuffle", "None"]
+PLUGIN_CODECS = {"lz4", "zstd", "blosc", "blosc-bitshuffle"}    # codecs that need hdf5plugin
+FALLBACK_CODEC = "lzf"                                          # used if hdf5plugin is not installed
+
+
+def available_codecs():
+    """
+    codecs that can be used with the installed packages
+    """
+    return [c for c in CODECS if hdf5plugin is not None or c not in PLUGIN_CODECS]
+
+
+def compression_options(codec="gzip", level=5, shuffle=False, fletcher32=False):
+    """
+    returns the keyword arguments for h5py create_dataset for codec
+
+    - level:        compression level (gzip: 0 - 9, zstd: 1 - 22, blosc: 0 - 9),
+                    not used for lzf and lz4
+    - shuffle:      shuffle bytes before compression (improves compression of
+                    slowly changing values)
+    - fletcher32:   add checksum to detect corruption
+    """
+    codec = str(codec)
+    if codec in PLUGIN_CODECS and hdf5plugin is None:
+        log(f"{codec} needs hdf5plugin (not installed), using {FALLBACK_CODEC}", "warning")
+        codec = FALLBACK_CODEC
+
+    level = int(level)
+    options = {'fletcher32': bool(fletcher32)}
+
+    if codec == "gzip":
+        options.update(compression="gzip", compression_opts=level, shuffle=bool(shuffle))
+
+    elif codec == "lzf":
+        options.update(compression="lzf", shuffle=bool(shuffle))
+
+    elif codec == "lz4":
+        options.update(dict(hdf5plugin.LZ4()), shuffle=bool(shuffle))
+
+    elif codec == "zstd":
+        options.update(dict(hdf5plugin.Zstd(clevel=max(1, level))), shuffle=bool(shuffle))
+
+    elif codec in ("blosc", "blosc-bitshuffle"):
+        if codec == "blosc-bitshuffle":
+            blosc_shuffle = hdf5plugin.Blosc.BITSHUFFLE
+        else:
+            blosc_shuffle = hdf5plugin.Blosc.SHUFFLE if shuffle else hdf5plugin.Blosc.NOSHUFFLE
+        options.update(dict(hdf5plugin.Blosc(cname="lz4", clevel=level, shuffle=blosc_shuffle)))
+
+    elif codec != "None":
+        log(f"unknown codec: {codec}, saving without compression", "warning")
+
+    return options
+
+
+def parse_par_codecs(text):
+    """
+    returns {pattern: codec} from a string with pattern=codec pairs
+    (separated by commas), e.g. "notes=gzip, *=lz4"
+    """
+    out = {}
+    for item in str(text or "").split(","):
+        if "=" not in item:
+            continue
+        pattern, codec = (i.strip() for i in item.split("=", 1))
+        if codec not in CODECS:
+            log(f"unknown codec for {pattern}: {codec}", "warning")
+            continue
+        out[pattern] = codec
+    return out
+
+
+def match_par(par, options):
+    """
+    returns the value for the first pattern in options ({pattern: value})
+    that matches par, None if no pattern matches
+    """
+    for pattern, value in options.items():
+        if fnmatch(par, pattern):
+            return value
@@ -0,0 +1,184 @@
+"""
+Delta encoding of nearly linear columns (time, counters) in the h5 files
+
+A delta encoded column is stored as the difference with the previous row,
+in integer units (value * scale, e.g. microseconds for time with scale 1e6),
+as DELTA_DTYPE. Constant steps compress much better (also without shuffle)
+than the absolute values.
+
+The absolute value is kept in anchors (dataset encoding/<dataset>/<column>:
+row, value) at the first row of each written block and where the
+difference does not fit in DELTA_DTYPE (gaps, counter wrap around), the
+difference of an anchor row is 0. Rows can be decoded from the last anchor
+before them, so a range of rows is read without reading the whole file.
+
+The scale of each encoded column is saved in the attribute
+delta_scale_<column> of the dataset, its original dtype in
+delta_dtype_<column>. Read encoded datasets with Decoder (see reader.py).
+"""
+
+import numpy as np
+
+
+DELTA_DTYPE = 'i4'
+
+
+def anchor_key(key, col):
+    """
+    name of the dataset with the anchors of column col of dataset key
+    """
+    return f"encoding/{key}/{col}"
+
+
+def is_encoded(dataset):
+    """
+    True if dataset has delta encoded columns
+    """
+    return any(name.startswith("delta_scale_") for name in dataset.attrs)
+
+
+def delta_encode(data, columns):
+    """
+    delta encodes columns of data (structured array)
+
+    - columns:      {column: scale}, columns that are not in data are skipped
+
+    returns: encoded data, {column: anchors (rows in data, value)}
+    """
+    columns = {col: scale for col, scale in columns.items()
+               if data.dtype.names and col in data.dtype.names and data.dtype[col].shape == ()}
+    if not columns or not data.shape[0]:
+        return data, {}
+
+    dtype = np.dtype([(name, DELTA_DTYPE if name in columns else data.dtype[name])
+                      for name in data.dtype.names])
+    out = np.empty(data.shape[0], dtype=dtype)
+    for name in data.dtype.names:
+        if name not in columns:
+            out[name] = data[name]
+
+    limits = np.iinfo(DELTA_DTYPE)
+    anchors = {}
+    for col, scale in columns.items():
+        ints = np.rint(data[col] * scale).astype('i8')
+        delta = np.diff(ints, prepend=ints[0])
+        anchor = (delta > limits.max) | (delta < limits.min)
+        anchor[0] = True
+        delta[anchor] = 0
+        out[col] = delta
+
+        rows = np.flatnonzero(anchor)
+        anchors[col] = np.empty(rows.shape[0], dtype=[('row', 'i8'), ('value', data.dtype[col])])
+        anchors[col]['row'] = rows
+        anchors[col]['value'] = data[col][rows]
+    return out, anchors
+
+
+def delta_decode(delta, anchors, first_row, scale, dtype):
+    """
+    decodes the rows first_row - first_row + len(delta) of a column
+
+    - delta:        encoded rows
+    - anchors:      all anchors of the column (rows, value)
+    - scale:        scale of the column
+    - dtype:        dtype of the decoded column
+
+    NOTE: first_row has to be an anchor (to read from other rows, decode 
+          from the last anchor before them, see Decoder)
+    """
+    n = delta.shape[0]
+    if n == 0:
+        return np.empty(0, dtype)
+    rows = anchors['row'] - first_row
+    i0, i1 = np.searchsorted(rows, (0, n))
+    rows, values = rows[i0:i1], anchors['value'][i0:i1]
+    if rows.shape[0] == 0 or rows[0] != 0:
+        raise ValueError(f"delta_decode: row {first_row} is not an anchor")
+
+    ints = np.cumsum(delta, dtype='i8')
+    base = np.rint(values.astype('f8') * scale).astype('i8') - ints[rows]
+    ints += np.repeat(base, np.diff(rows, append=n))
+    return (ints / scale if scale != 1 else ints).astype(dtype)
+
+
+class Decoder():
+    """
+    Reads rows of a (delta encoded) h5 dataset with the original dtype
+
+    - dataset:  h5py dataset
+    """
+    def __init__(self, dataset) -> None:
+        self.dataset = dataset
+        self.key = dataset.name.lstrip('/')
+        self.scales = {name[len("delta_scale_"):]: float(value)
+                       for name, value in dataset.attrs.items() if name.startswith("delta_scale_")}
+        self.dtypes = {col: np.dtype(dataset.attrs[f"delta_dtype_{col}"]) for col in self.scales}
+        self.dtype = np.dtype([(name, self.dtypes.get(name, dataset.dtype[name]))
+                               for name in dataset.dtype.names]) if self.scales else dataset.dtype
+        self._anchors = {}
+
+    def anchors(self, col):
+        """
+        anchors (row, value) of col (read once)
+        """
+        if col not in self._anchors:
+            self._anchors[col] = self.dataset.file[anchor_key(self.key, col)][:]
+        return self._anchors[col]
+
+    def read(self, i0, i1, columns=None):
+        """
+        returns rows i0 - i1 (columns: list of columns, None for all) decoded
+        """
+        n = self.dataset.shape[0]
+        i0, i1 = max(0, min(i0, n)), max(0, min(i1, n))
+        names = list(self.dtype.names) if columns is None else list(columns)
+        encoded = [col for col in names if col in self.scales]
+        if not encoded:
+            if columns is None:
+                return self.dataset[i0:i1]
+            return self.dataset.fields(names)[i0:i1]
+
+        # read from the last anchor before i0 of each encoded column
+        starts = {}
+        for col in encoded:
+            rows = self.anchors(col)['row']
+            starts[col] = int(rows[max(0, np.searchsorted(rows, i0, side='right') - 1)])
+        start = min(starts.values())
+
+        raw = self.dataset.fields(names)[start:i1]
+        out = np.empty(i1 - i0, dtype=[(name, self.dtype[name]) for name in names])
+        for name in names:
+            if name in encoded:
+                first = starts[name]
+                out[name] = delta_decode(raw[name][first - start:], self.anchors(name), first,
+                                         self.scales[name], self.dtypes[name])[i0 - first:]
+            else:
+                out[name] = raw[name][i0 - start:]
+        return out
+
+    def column(self, col, i0, i1):
+        return self.read(i0, i1, [col])[col]
+
+    def __getitem__(self, rows):
+        """
+        rows (slice) of the decoded dataset
+        """
+        i0, i1, _ = rows.indices(self.dataset.shape[0])
+        return self.read(i0, i1)
+
+
+# TEST
+if __name__ == "__main__":
+    data = np.zeros(10000, dtype=[('time', 'f8'), ('us', 'u4'), ('a', 'f4')])
+    data['time'] = 1.7e9 + np.arange(10000) / 2048
+    data['time'][5000:] += 3600                     # gap: anchor
+    data['us'] = (np.arange(10000, dtype='i8') * 488 + 2 ** 32 - 1_000_000) % 2 ** 32   # wraps
+    data['a'] = np.random.random(10000)
+
+    enc, anchors = delta_encode(data, {'time': 1e6, 'us': 1})
+    print(enc.dtype, {col: a['row'] for col, a in anchors.items()})
+    t = delta_decode(enc['time'], anchors['time'], 0, 1e6, 'f8')
+    us = delta_decode(enc['us'], anchors['us'], 0, 1, 'u4')
+    print(np.abs(t - data['time']).max() < 1e-6, np.array_equal(us, data['us']))
+    t = delta_decode(enc['time'][5000:], anchors['time'], 5000, 1e6, 'f8')
+    print(np.abs(t - data['time'][5000:]).max() < 1e-6)
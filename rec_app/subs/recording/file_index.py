@@ -0,0 +1,342 @@
+"""
+Verifies closed recording files and writes a sidecar index next to them
+
+verify_file reads every dataset of a file in blocks and checks:
+    - all datasets can be read (no corrupt chunks / checksums), delta
+      encoded columns are decoded (see encoding.py)
+    - time is monotonic
+    - no NaN gaps longer than MAX_NAN_GAP (s) in the float columns
+    - the datasets with time cover the same time range (within MAX_RANGE_DIFF s)
+
+the index (<file>.idx.npz) holds for each dataset:
+    <dataset>.n:            number of rows
+    <dataset>.time_range:   first and last time (nan if there is no time)
+    <dataset>.offsets:      row of the first item of each second, from
+                            int(first time), to seek without reading time
+
+The Verifier runs this for closed files in a separate low priority process,
+files can be verified (and indexed) by hand with:
+    python -m subs.recording.file_index <files or directories>
+"""
+
+# create logger
+try:
+    from subs.log import create_logger
+    logger = create_logger()
+
+except:
+    logger = None
+
+def log(message, level="info"):
+    cls_name = "FILE_INDEX"
+    try:
+        getattr(logger, level)(f"{cls_name}: {message}")  # change CLASSNAME here
+    except AttributeError:
+        print(f"{cls_name} - {level}: {message}")
+
+
+import os
+import sys
+import queue
+import subprocess
+import threading as tr
+import numpy as np
+from pathlib import Path
+
+import h5py
+
+from subs.recording.encoding import Decoder
+
+
+INDEX_SUFFIX = ".idx.npz"
+INDEX_VERSION = 1
+READ_BLOCK = 0x10_0000              # rows to read at once
+MAX_NAN_GAP = 1.0                   # max time (s) that a column can be NaN
+MAX_RANGE_DIFF = 60                 # max difference (s) in start or end time between datasets
+
+
+def index_path(path):
+    """
+    path of the index of the recording file path
+    """
+    path = Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _nan_gaps(nan, time, gap_start, max_gap):
+    """
+    finds the NaN gaps longer than max_gap in a block
+
+    - nan:          bool array, True where the column is NaN
+    - time:         time of the rows
+    - gap_start:    time at which a gap that is open at the start of the block
+                    started (nan if none)
+
+    returns: list of (start, duration) of long gaps that end in this block,
+             start of the gap that is open at the end of the block (nan if none)
+    """
+    edges = np.diff(np.concatenate(([0], nan.view('i1'), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)              # first row after gap
+
+    start_times = time[starts]
+    if starts.size and starts[0] == 0 and not np.isnan(gap_start):
+        start_times[0] = gap_start                  # continued from previous block
+
+    if ends.size and ends[-1] == nan.shape[0]:
+        gap_start = start_times[-1]                 # still open
+        start_times, ends = start_times[:-1], ends[:-1]
+    else:
+        gap_start = np.nan
+
+    durations = time[ends] - start_times
+    long = durations > max_gap
+    return list(zip(start_times[long], durations[long])), gap_start
+
+
+def verify_dataset(dataset, max_nan_gap=MAX_NAN_GAP):
+    """
+    reads dataset in blocks and checks time and NaN gaps
+
+    returns: (index of the dataset, list of problems)
+    """
+    n = dataset.shape[0]
+    names = dataset.dtype.names or ()
+    index = {"n": n, "time_range": np.full(2, np.nan), "offsets": np.zeros(0, dtype='i8')}
+    problems = []
+    if "time" not in names:
+        try:
+            for i in range(0, n, READ_BLOCK):
+                dataset[i:i + READ_BLOCK]
+        except Exception as e:
+            problems.append(f"cannot read rows from {i}: {e}")
+        return index, problems
+
+    decoder = Decoder(dataset)
+    float_cols = [c for c in names if c != "time" and decoder.dtype[c].kind == "f"]
+    gap_starts = dict.fromkeys(float_cols, np.nan)
+    n_backwards = 0
+    offsets, n_seconds = [], 0
+    t0 = prev = None
+
+    for i in range(0, n, READ_BLOCK):
+        try:
+            block = decoder.read(i, i + READ_BLOCK)
+        except Exception as e:
+            problems.append(f"cannot read rows from {i}: {e}")
+            break
+
+        time = block["time"]
+        if t0 is None:
+            t0 = np.floor(time[0])
+            index["time_range"][0] = time[0]
+            prev = time[0]
+
+        n_backwards += int(np.count_nonzero(np.diff(time, prepend=prev) < 0))
+        prev = time[-1]
+
+        # row of the first item of each second
+        seconds = np.arange(n_seconds, np.floor(np.nanmax(time) - t0) + 1)
+        if seconds.size:
+            offsets.append(np.searchsorted(time, t0 + seconds) + i)
+            n_seconds += seconds.size
+
+        for col in float_cols:
+            nan = np.isnan(block[col])
+            if nan.ndim > 1:
+                nan = nan.reshape(nan.shape[0], -1).all(axis=1)
+            gaps, gap_starts[col] = _nan_gaps(nan, time, gap_starts[col], max_nan_gap)
+            problems += [f"{col}: NaN for {dur:.1f} s at {start:.3f}" for start, dur in gaps]
+
+    if t0 is not None:
+        index["time_range"][1] = prev
+        index["offsets"] = np.concatenate(offsets).astype('i8') if offsets else index["offsets"]
+
+    for col, start in gap_starts.items():
+        if not np.isnan(start) and prev - start > max_nan_gap:
+            problems.append(f"{col}: NaN for {prev - start:.1f} s at {start:.3f} (until end)")
+    if n_backwards:
+        problems.append(f"time goes back {n_backwards} times")
+    return index, problems
+
+
+def verify_file(path, max_nan_gap=MAX_NAN_GAP, max_range_diff=MAX_RANGE_DIFF):
+    """
+    verifies all datasets in the file at path
+
+    returns: (index: {dataset: {'n', 'time_range', 'offsets'}},
+              problems: {dataset: [problems]})
+    """
+    index, problems = {}, {}
+    try:
+        with h5py.File(path, "r") as file:
+            for key, dataset in file.items():
+                if not isinstance(dataset, h5py.Dataset):
+                    continue
+                index[key], problems[key] = verify_dataset(dataset, max_nan_gap)
+
+    except Exception as e:
+        problems["file"] = [f"cannot open: {e}"]
+        return index, problems
+
+    # datasets with time should cover the same range (notes are not continuous)
+    ranges = {key: idx["time_range"] for key, idx in index.items()
+              if key != "notes" and not np.isnan(idx["time_range"][0])}
+    if ranges:
+        start = min(r[0] for r in ranges.values())
+        end = max(r[1] for r in ranges.values())
+        for key, (first, last) in ranges.items():
+            if first - start > max_range_diff or end - last > max_range_diff:
+                problems[key].append(f"starts {first - start:.1f} s later and ends "
+                                     f"{end - last:.1f} s earlier than the other datasets")
+
+    return index, {key: p for key, p in problems.items() if p}
+
+
+def write_index(path, index, problems):
+    """
+    writes the index and problems of the file at path to its sidecar file
+    """
+    stat = Path(path).stat()
+    arrays = {"version": INDEX_VERSION,
+              "file_size": stat.st_size,
+              "file_mtime": stat.st_mtime,
+              "datasets": np.array(list(index), dtype=str),
+              "problems": np.array([f"{key}: {p}" for key, ps in problems.items() for p in ps],
+                                   dtype=str)}
+    for key, idx in index.items():
+        arrays.update({f"{key}.{name}": value for name, value in idx.items()})
+
+    dst = index_path(path)
+    tmp = dst.with_name(f"{dst.name}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    tmp.replace(dst)
+
+
+def read_index(path):
+    """
+    returns the index of the file at path ({dataset: {'n', 'time_range', 'offsets'}}),
+    None if there is no (up to date) index
+    """
+    try:
+        with np.load(index_path(path)) as data:
+            stat = Path(path).stat()
+            if (data["version"] != INDEX_VERSION or data["file_size"] != stat.st_size
+                    or data["file_mtime"] != stat.st_mtime):
+                return None
+            return {str(key): {name: data[f"{key}.{name}"] for name in ("n", "time_range", "offsets")}
+                    for key in data["datasets"]}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def index_file(path):
+    """
+    verifies the file at path, writes the index and logs the problems
+
+    returns: index, problems (see verify_file)
+    """
+    index, problems = verify_file(path)
+    for key, ps in problems.items():
+        for p in ps:
+            log(f"{Path(path).name}/{key}: {p}", "warning")
+    if "file" not in problems:
+        write_index(path, index, problems)
+    return index, problems
+
+
+class Verifier():
+    """
+    Verifies and indexes closed files one by one, each in a separate process
+    with low priority (NICE), so that it does not slow down recording. The
+    problems that are found are logged here.
+    """
+    NICE = 19                           # priority of the process (19: lowest)
+    _shared = None                      # verifier of this process, see Verifier.shared
+
+    def __init__(self, **kwargs) -> None:
+        self.__dict__.update(kwargs)
+        self.queue = queue.Queue()
+        self.thread = None
+        self.pending = 0                # number of files added that are not verified yet
+        self._lock = tr.Lock()
+        self._done = tr.Condition(self._lock)
+
+    @classmethod
+    def shared(cls):
+        """
+        returns the verifier of this process, so that all savers use the same worker
+        """
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def add(self, path):
+        """
+        adds the file at path to be verified
+        """
+        self.queue.put(Path(path))
+        with self._lock:
+            self.pending += 1
+            if self.thread is None:
+                # one worker for all files, waits for new files until the program ends
+                self.thread = tr.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def wait(self, timeout=None):
+        """
+        waits until all added files are verified
+
+        Returns:
+            bool: False if there are still files pending after timeout
+        """
+        with self._done:
+            return self._done.wait_for(lambda: not self.pending, timeout)
+
+    def _run(self):
+        cwd = Path(__file__).parents[2]                 # rec_app
+        nice = (lambda: os.nice(self.NICE)) if hasattr(os, "nice") else None
+        while True:
+            path = self.queue.get()
+            self._verify(path, cwd, nice)
+            with self._done:
+                self.pending -= 1
+                self._done.notify_all()
+
+    def _verify(self, path, cwd, nice):
+        """
+        verifies the file at path in a separate process and logs the result
+        """
+        try:
+            result = subprocess.run([sys.executable, "-m", "subs.recording.file_index",
+                                     str(path.absolute())],
+                                    cwd=cwd, preexec_fn=nice, env={**os.environ, "KIVY_NO_ARGS": "1"},
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        except OSError as e:
+            log(f"cannot verify {path}: {e}", "error")
+            return
+
+        if result.returncode:
+            error = (result.stderr.strip().splitlines() or [f"exit code {result.returncode}"])[-1]
+            log(f"cannot verify {path}: {error}", "error")
+        elif result.stdout.strip().endswith(": ok"):
+            log(f"verified: {path}", "debug")
+        else:
+            log(result.stdout.strip(), "warning")
+
+
+# verify files by hand
+if __name__ == "__main__":
+    paths = []
+    for arg in sys.argv[1:]:
+        arg = Path(arg)
+        paths += sorted(arg.glob("**/*.h5")) if arg.is_dir() else [arg]
+
+    for path in paths:
+        index, problems = index_file(path)
+        status = "ok" if not problems else f"{sum(len(p) for p in problems.values())} problems"
+        print(f"{path}: {status}")
+        for key, ps in problems.items():
+            for p in ps:
+                print(f"    {key}: {p}")
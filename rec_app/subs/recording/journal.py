@@ -0,0 +1,197 @@
+"""
+Append only journal of the data that the Saver writes to an h5 file
+
+An h5 file that is not closed (power loss, crash) is often corrupt. The
+journal keeps a raw copy of every block that is written to the file,
+flushed to disk (fsync) per block, so that the file can be rebuilt from
+the journal (see Saver.recover_journals). The journal is removed when the
+file is closed.
+
+Layout of a journal (directory <file name>.journal in the temp dir):
+    meta:       file name, recording name, file attributes, the parameters:
+                {file: (key, dtype descr, shape)} and the total item number of
+                the first record of each parameter, as python literal
+    <n>.bin:    fixed size records (1 item of a parameter) of parameter n
+
+A partly written record at the end of a file (write interrupted) is ignored.
+
+Recover the journals in a temp dir with:
+    python -m subs.recording.journal <temp dir> <save dir>
+"""
+
+# create logger
+try:
+    from subs.log import create_logger
+    logger = create_logger()
+
+except:
+    logger = None
+
+def log(message, level="info"):
+    cls_name = "JOURNAL"
+    try:
+        getattr(logger, level)(f"{cls_name}: {message}")  # change CLASSNAME here
+    except AttributeError:
+        print(f"{cls_name} - {level}: {message}")
+
+
+import os
+import ast
+import numpy as np
+from pathlib import Path
+from shutil import rmtree
+
+
+class Journal():
+    """
+    - path:     directory of the journal, an existing journal is loaded
+    """
+    SUFFIX = ".journal"
+    FSYNC = True                                # sync each block to disk (False: leave it to the os)
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        self.files = {}                         # open files: {key: file}
+        self.meta = {'name': "", 'recname': "", 'attrs': {}, 'pars': {}, 'first_items': {}}
+
+        if (self.path / "meta").exists():
+            self.meta = ast.literal_eval((self.path / "meta").read_text())
+
+    @classmethod
+    def create(cls, temp_dir, full_file_name, recname="", attrs=None):
+        """
+        creates a new journal for the file full_file_name in temp_dir
+        """
+        journal = cls(Path(temp_dir) / f"{full_file_name}{cls.SUFFIX}")
+        journal.path.mkdir(parents=True, exist_ok=True)
+        journal.meta.update(name=full_file_name, recname=recname, attrs=dict(attrs or {}))
+        journal.write_meta()
+        return journal
+
+    @classmethod
+    def find(cls, path):
+        """
+        returns the journals in path (and its sub directories)
+        """
+        return [cls(p) for p in sorted(Path(path).glob(f"**/*{cls.SUFFIX}"))
+                if (p / "meta").exists()]
+
+    @property
+    def name(self):
+        return self.meta['name']
+
+    @property
+    def recname(self):
+        return self.meta['recname']
+
+    @property
+    def attrs(self):
+        return self.meta['attrs']
+
+    def first_item(self, key):
+        """
+        total item number of the first record of key (None if unknown)
+        """
+        return self.meta.get('first_items', {}).get(key)
+
+    def keys(self):
+        return [key for key, _, _ in self.meta['pars'].values()]
+
+    def write_meta(self):
+        """
+        writes the meta data (replaces the old file at once, so that it is
+        never partly written)
+        """
+        tmp = self.path / "meta.tmp"
+        with open(tmp, "w") as f:
+            f.write(repr(self.meta))
+            f.flush()
+            os.fsync(f.fileno())
+        tmp.replace(self.path / "meta")
+        self._sync_dir()
+
+    def _sync_dir(self):
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _file_name(self, key):
+        for name, (_key, _, _) in self.meta['pars'].items():
+            if _key == key:
+                return name
+
+    def _add(self, key, data, first_item=None):
+        """
+        adds parameter key with the dtype and shape of data, returns the file
+        """
+        name = f"{len(self.meta['pars'])}.bin"
+        self.meta['pars'][name] = (key,
+                                   np.lib.format.dtype_to_descr(data.dtype),
+                                   tuple(data.shape[1:]))
+        if first_item is not None:
+            self.meta['first_items'][key] = int(first_item)
+        f = self.files[key] = open(self.path / name, "ab")
+        self.write_meta()
+        return f
+
+    def append(self, key, data, first_item=None):
+        """
+        appends the items of data to the journal of key and syncs it to disk
+
+        - first_item:   total item number of the first item of data (only 
+                        saved for the first append of key)
+        """
+        f = self.files.get(key)
+        if f is None:
+            f = self._add(key, data, first_item)
+
+        f.write(np.ascontiguousarray(data).data)
+        f.flush()
+        if self.FSYNC:
+            os.fsync(f.fileno())
+
+    def read(self, key, block_size=0x7FFF):
+        """
+        yields the complete records of key in blocks of block_size items
+        """
+        name = self._file_name(key)
+        _, descr, shape = self.meta['pars'][name]
+        dtype = np.lib.format.descr_to_dtype(descr)
+        file = self.path / name
+
+        n_items = file.stat().st_size // (dtype.itemsize * int(np.prod(shape)) or 1)
+        if not n_items:
+            return
+
+        data = np.memmap(file, dtype=dtype, mode="r", shape=(n_items, *shape))
+        for i in range(0, n_items, block_size):
+            yield np.array(data[i:i + block_size])
+        del data
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def remove(self):
+        self.close()
+        rmtree(self.path, ignore_errors=True)
+
+
+# Recovery tool
+if __name__ == "__main__":
+    import sys
+    from subs.recording.saver import Saver
+
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    temp_dir, save_dir = (Path(p) for p in sys.argv[1:3])
+    for journal in Journal.find(temp_dir):
+        print(f"found: {journal.recname}/{journal.name} ({', '.join(journal.keys())})")
+
+    # the saver recovers the journals in the temp dir on creation
+    Saver(paths={"save_dir": save_dir, "temp_dir": temp_dir})
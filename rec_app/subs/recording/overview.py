@@ -0,0 +1,122 @@
+"""
+Overview (decimated) data for the files of the Saver
+
+Overview calculates the min / max / mean of the numeric columns of a
+parameter per bin of bin_size seconds, incrementally from the blocks that
+are saved, in the same format as the pyramid of the SharedBuffer (time of
+the start of the bin and <column>_min, <column>_max, <column>_mean).
+
+The Saver writes the bins to the datasets overview/<bin size>s/<parameter>
+of each file, so a whole file can be plotted by reading a few KB.
+"""
+
+import numpy as np
+
+from subs.recording.buffer import SharedBuffer
+
+
+def overview_key(par, bin_size):
+    """
+    name of the overview dataset of par with bins of bin_size seconds
+    """
+    return f"overview/{bin_size:g}s/{par}"
+
+
+class Overview():
+    """
+    - dtype:        dtype of the data (structured, with time)
+    - bin_size:     time (s) per bin
+    """
+    def __init__(self, dtype, bin_size) -> None:
+        dtype = np.dtype(dtype)
+        self.bin_size = bin_size
+        self.columns = SharedBuffer._pyramid_columns(dtype)
+        self.dtype = SharedBuffer._pyramid_dtype(dtype)
+
+        # running min / max / sum / count (of values that are not nan) of the bins
+        self._acc_dtype = np.dtype([('bin', 'i8')] + [
+            (f"{col}_{stat}", {'sum': 'f8', 'count': 'i8'}.get(stat, dtype[col]))
+            for col in self.columns for stat in ('min', 'max', 'sum', 'count')])
+        self.pending = np.zeros(0, dtype=self._acc_dtype)    # last bin (can get more items)
+
+    @classmethod
+    def has_columns(cls, dtype):
+        """
+        True if an overview can be made for data with dtype
+        """
+        dtype = np.dtype(dtype)
+        return bool(dtype.names and 'time' in dtype.names
+                    and SharedBuffer._pyramid_columns(dtype))
+
+    def add(self, data):
+        """
+        adds a block of data (time has to increase), returns the bins that
+        are completed
+        """
+        if not data.shape[0]:
+            return np.zeros(0, dtype=self.dtype)
+
+        bins = np.floor(data['time'] / self.bin_size).astype('i8')
+        starts = np.flatnonzero(np.diff(bins, prepend=bins[0] - 1))     # first row of each bin
+
+        acc = np.empty(starts.shape[0], dtype=self._acc_dtype)
+        acc['bin'] = bins[starts]
+        count = np.diff(starts, append=bins.shape[0])
+        for col in self.columns:
+            values = data[col]
+            acc[f"{col}_min"] = np.fmin.reduceat(values, starts)
+            acc[f"{col}_max"] = np.fmax.reduceat(values, starts)
+            if values.dtype.kind == 'f':
+                # skip nan (e.g. chip not recorded)
+                valid = ~np.isnan(values)
+                acc[f"{col}_sum"] = np.add.reduceat(np.where(valid, values, 0), starts, dtype='f8')
+                acc[f"{col}_count"] = np.add.reduceat(valid, starts, dtype='i8')
+            else:
+                acc[f"{col}_sum"] = np.add.reduceat(values, starts, dtype='f8')
+                acc[f"{col}_count"] = count
+
+        if self.pending.shape[0]:
+            if self.pending['bin'][0] == acc['bin'][0]:
+                # continue the pending bin
+                first, pending = acc[:1], self.pending[0]
+                for col in self.columns:
+                    first[f"{col}_min"] = np.fmin(first[f"{col}_min"], pending[f"{col}_min"])
+                    first[f"{col}_max"] = np.fmax(first[f"{col}_max"], pending[f"{col}_max"])
+                    first[f"{col}_sum"] += pending[f"{col}_sum"]
+                    first[f"{col}_count"] += pending[f"{col}_count"]
+            else:
+                acc = np.concatenate((self.pending, acc))
+
+        self.pending = acc[-1:].copy()
+        return self._bins(acc[:-1])
+
+    def flush(self):
+        """
+        returns the pending (incomplete) bin and starts again
+        """
+        out, self.pending = self._bins(self.pending), np.zeros(0, dtype=self._acc_dtype)
+        return out
+
+    def _bins(self, acc):
+        out = np.empty(acc.shape[0], dtype=self.dtype)
+        out['time'] = acc['bin'] * self.bin_size
+        for col in self.columns:
+            out[f"{col}_min"] = acc[f"{col}_min"]
+            out[f"{col}_max"] = acc[f"{col}_max"]
+            count = acc[f"{col}_count"]
+            out[f"{col}_mean"] = np.divide(acc[f"{col}_sum"], count, 
+                                           out=np.full(acc.shape[0], np.nan), where=count > 0)
+        return out
+
+
+# TEST
+if __name__ == "__main__":
+    data = np.zeros(1000, dtype=[('time', 'f8'), ('a', 'f4'), ('b', 'i2')])
+    data['time'] = np.arange(1000) / 100
+    data['a'] = np.random.random(1000)
+    data['b'] = np.arange(1000)
+
+    ov = Overview(data.dtype, 1)
+    bins = np.concatenate([ov.add(data[i:i + 37]) for i in range(0, 1000, 37)] + [ov.flush()])
+    print(bins.shape, np.allclose(bins['a_mean'], data['a'].reshape(10, 100).mean(axis=1)),
+          bins['b_min'], bins['b_max'])
@@ -0,0 +1,250 @@
+"""
+Reads time ranges of a recording from the files of the Saver
+
+A recording is the directory with the files of the Saver (./data/<recname>/),
+with a new file every NEW_FILE_INTERVAL. The catalog lists, for each file,
+the time range and number of rows of each dataset (from the sidecar index,
+see file_index.py, or from the first and last row). It is saved in the
+recording directory and only updated for new or changed files.
+
+A time range is read from the files that overlap it, the rows are found
+with the offsets per second of the index (or by bisecting the time column
+if there is no index), so only the chunks with the rows are read. Delta
+encoded columns (see encoding.py) are decoded:
+
+    rec = Recording("./data/my_recording")
+    data = rec.read("Internal", datetime(2024, 5, 7, 2, 0), datetime(2024, 5, 7, 2, 10),
+                    columns=["OIS_SIG"])
+"""
+
+# create logger
+try:
+    from subs.log import create_logger
+    logger = create_logger()
+
+except:
+    logger = None
+
+def log(message, level="info"):
+    cls_name = "READER"
+    try:
+        getattr(logger, level)(f"{cls_name}: {message}")  # change CLASSNAME here
+    except AttributeError:
+        print(f"{cls_name} - {level}: {message}")
+
+
+import pickle
+import numpy as np
+from datetime import datetime
+from pathlib import Path
+
+import h5py
+
+from subs.recording.file_index import read_index
+from subs.recording.overview import overview_key
+from subs.recording.encoding import Decoder
+
+
+def to_timestamp(t):
+    """
+    time as seconds since epoch (same as the time column), from datetime
+    (naive datetimes are local time) or number
+    """
+    return t.timestamp() if isinstance(t, datetime) else float(t)
+
+
+class Recording():
+    """
+    - path:     directory of the recording
+    - catalog:  {file name: {'size', 'mtime', 'datasets': {dataset: (first time, last time, n rows)}}}
+    """
+    PATTERN = "*.h5"                    # files of the recording
+    CATALOG_FILE = "catalog.pickle"     # catalog in the directory of the recording
+    SEARCH_ROWS = 0x1000                # rows of time to read at once when bisecting
+
+    def __init__(self, path, **kwargs) -> None:
+        self.__dict__.update(kwargs)
+        self.path = Path(path)
+        self.catalog = {}
+        self._indexes = {}              # indexes of the files: {file name: index or None}
+        self.update()
+
+    def update(self):
+        """
+        adds new and changed files to the catalog and removes deleted files
+        """
+        try:
+            with open(self.path / self.CATALOG_FILE, "rb") as f:
+                catalog = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            catalog = {}
+
+        changed = False
+        self.catalog = {}
+        for file in sorted(self.path.glob(self.PATTERN)):
+            stat = file.stat()
+            entry = catalog.get(file.name)
+            if entry is None or (entry['size'], entry['mtime']) != (stat.st_size, stat.st_mtime):
+                entry = self._catalog_entry(file, stat)
+                changed = True
+            if entry is not None:
+                self.catalog[file.name] = entry
+        self._indexes = {}
+
+        if changed or len(catalog) != len(self.catalog):
+            try:
+                with open(self.path / self.CATALOG_FILE, "wb") as f:
+                    pickle.dump(self.catalog, f)
+            except OSError as e:
+                log(f"cannot save catalog: {e}", "warning")
+
+    def _catalog_entry(self, file, stat):
+        """
+        time range and rows of each dataset in file
+        """
+        datasets = {}
+        index = read_index(file)
+        try:
+            if index is not None:
+                datasets = {key: (*idx['time_range'].tolist(), int(idx['n']))
+                            for key, idx in index.items()}
+            else:
+                with h5py.File(file, "r") as f:
+                    for key, dataset in f.items():
+                        if not isinstance(dataset, h5py.Dataset):
+                            continue
+                        n = dataset.shape[0]
+                        if n and dataset.dtype.names and 'time' in dataset.dtype.names:
+                            decoder = Decoder(dataset)
+                            datasets[key] = (float(decoder.column('time', 0, 1)[0]),
+                                             float(decoder.column('time', n - 1, n)[0]), n)
+                        else:
+                            datasets[key] = (np.nan, np.nan, n)
+
+        except OSError as e:
+            log(f"cannot read {file.name}: {e}", "warning")
+            return None
+
+        return {'size': stat.st_size, 'mtime': stat.st_mtime, 'datasets': datasets}
+
+    def parameters(self):
+        """
+        names of the datasets in the recording
+        """
+        return sorted({key for entry in self.catalog.values() for key in entry['datasets']})
+
+    def time_range(self, par):
+        """
+        first and last time of par in the recording
+        """
+        ranges = [entry['datasets'][par][:2] for entry in self.catalog.values()
+                  if par in entry['datasets']]
+        if not ranges:
+            return np.nan, np.nan
+        return min(r[0] for r in ranges), max(r[1] for r in ranges)
+
+    def files(self, par, start, end):
+        """
+        names of the files with data of par between start and end (s since epoch)
+        """
+        return [name for name, entry in self.catalog.items()
+                if par in entry['datasets']
+                and entry['datasets'][par][0] <= end and entry['datasets'][par][1] >= start]
+
+    def _index(self, name):
+        if name not in self._indexes:
+            self._indexes[name] = read_index(self.path / name)
+        return self._indexes[name]
+
+    def find_row(self, name, dataset, t):
+        """
+        first row of dataset (in file name) with time >= t
+        """
+        n = dataset.shape[0]
+        decoder = Decoder(dataset)
+        lo, hi = 0, n
+
+        index = self._index(name)
+        offsets = index[dataset.name.lstrip('/')]['offsets'] if index else None
+        if offsets is not None and offsets.shape[0]:
+            # row range of the second of t
+            t0 = np.floor(index[dataset.name.lstrip('/')]['time_range'][0])
+            s = int(np.floor(t - t0))
+            if s < 0:
+                return 0
+            if s >= offsets.shape[0]:
+                return n
+            lo = int(offsets[s])
+            hi = int(offsets[s + 1]) if s + 1 < offsets.shape[0] else n
+
+        if 'time' in decoder.scales:
+            # rows between the anchors (absolute times) around t
+            anchors = decoder.anchors('time')
+            a = np.searchsorted(anchors['value'], t, side='right')
+            if a:
+                lo = max(lo, int(anchors['row'][a - 1]))
+            if a < anchors.shape[0]:
+                hi = min(hi, int(anchors['row'][a]))
+
+        # bisect until the rows fit in one read
+        while hi - lo > self.SEARCH_ROWS:
+            mid = (lo + hi) // 2
+            if decoder.column('time', mid, mid + 1)[0] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo + int(np.searchsorted(decoder.column('time', lo, hi), t))
+
+    def read(self, par, start, end, columns=None):
+        """
+        returns the data of par with start <= time < end as structured array,
+        from all files in the range
+
+        - start, end:   datetime (naive: local time) or seconds since epoch
+        - columns:      columns to read (time is always included), None for all
+        """
+        start, end = to_timestamp(start), to_timestamp(end)
+        parts = []
+        for name in self.files(par, start, end):
+            with h5py.File(self.path / name, "r") as f:
+                dataset = f[par]
+                i0 = self.find_row(name, dataset, start)
+                i1 = self.find_row(name, dataset, end)
+                if columns is None:
+                    parts.append(Decoder(dataset).read(i0, i1))
+                else:
+                    names = ['time'] + [c for c in columns if c != 'time']
+                    parts.append(Decoder(dataset).read(i0, i1, names))
+
+        if not parts:
+            return None
+        return np.concatenate(parts)
+
+    def read_overview(self, par, start, end, bin_size=60):
+        """
+        returns the overview (min / max / mean per bin of bin_size seconds, 
+        see overview.py) of par with start <= time < end, None if there is
+        no overview
+        """
+        start, end = to_timestamp(start), to_timestamp(end)
+        key = overview_key(par, bin_size)
+        parts = []
+        for name in self.files(par, start, end):
+            with h5py.File(self.path / name, "r") as f:
+                if key in f:
+                    bins = Decoder(f[key])[:]
+                    parts.append(bins[(bins['time'] >= start) & (bins['time'] < end)])
+
+        if not parts:
+            return None
+        return np.concatenate(parts)
+
+
+# TEST
+if __name__ == "__main__":
+    import sys
+
+    rec = Recording(sys.argv[1])
+    for par in rec.parameters():
+        first, last = rec.time_range(par)
+        print(f"{par}: {datetime.fromtimestamp(first)} - {datetime.fromtimestamp(last)}")
@@ -1,5 +1,32 @@
 """
 This class saves data to h5 file
+
+Saver saves in a thread, SaverProcess runs a Saver in a separate process
+(reading, compressing and writing do not compete with the GUI for the GIL)
+
+The save loop is woken by the writers of the SharedBuffer when a parameter
+has a block of new data to save (see SharedBuffer.save_at), data is saved
+at least every FLUSH_DEADLINE.
+
+Each block that is written is also appended to a journal (see journal.py),
+files that were not closed (power loss, crash) are rebuilt from their 
+journal when a new Saver is created
+
+Closed files are verified and indexed in a low priority process (see 
+file_index.py)
+
+At each NEW_FILE_INTERVAL the next file is opened first and the old file is
+closed and moved to the save dir in the background (finalize_file), the 
+total item number of the first row of each dataset is saved in its 
+attribute 'first_item', so that files can be joined without duplicate or 
+missing rows
+
+Overview datasets with the min / max / mean per OVERVIEW_BINS seconds of the 
+numeric columns are written to overview/<bin size>s/<parameter> (see 
+overview.py)
+
+Columns in DELTA_COLUMNS (e.g. time, us) are stored delta encoded as
+integers (see encoding.py), read these files with reader.py
 """
 
 # create logger
@@ -15,15 +42,23 @@ except:
 
 import h5py
 import threading as tr
+import time
 import numpy as np
 from datetime import datetime, timedelta
+from multiprocessing import Event, Process, Queue
 
 from subs.recording.buffer import SharedBuffer
+from subs.recording.compression import match_par
+from subs.recording.journal import Journal
+from subs.recording.file_index import Verifier
+from subs.recording.overview import Overview, overview_key
+from subs.recording.encoding import delta_encode, anchor_key
+from subs.misc.shared_mem_np_dict import Wakeup, create_shared_np
 
 from pathlib import Path
 import tempfile
 
-from shutil import rmtree, disk_usage
+from shutil import rmtree, disk_usage, move
 
 
 class Saver():
@@ -36,6 +71,10 @@ class Saver():
     date = ""                                   # file timestamp
 
     file = None                                 # place holder for file object
+    journal = None                              # journal of the current file
+    JOURNAL = True                              # write a journal to recover files that are not closed
+    VERIFY = True                               # verify and index closed files (see file_index.py)
+    verifier = None                             # runs the verification of closed files
     
     shared_buffer = None                        # link to class shared memory
     buffer = {}                                 # buffer for data
@@ -43,10 +82,21 @@ class Saver():
 
     attrs = {}
     dataset = {}                                # links to datasets in h5 file are stored here
+    n_rows = {}                                 # number of rows written in each dataset (datasets are preallocated)
     
     last_pos = {}                               # position (index) in data of last written data
+    out_buffers = {}                            # reusable arrays to copy data from shared memory to
 
     BLOCK_SIZE = 0x7FFF                         # items (in 1st dim) to buffer data before writing to file
+    CHUNK_SECONDS = 10                          # time of data per chunk in the file (if the data has time)
+    CHUNK_BYTES = (0x1_0000, 0x10_0000)         # min and max bytes per chunk
+    PREALLOCATE_GROWTH = 2                      # factor to grow datasets with when they are full
+    OVERVIEW_BINS = (1, 60)                     # bin sizes (s) of the overview datasets, () for no overview
+    DELTA_COLUMNS = {}                          # columns to store delta encoded: {column: scale to integer units},
+                                                # e.g. {'time': 1e6, 'us': 1} (see encoding.py)
+    overviews = {}                              # overviews of the current file: {(parameter, bin size): Overview}
+    anchors = {}                                # anchors of delta encoded columns not written yet: {anchor dataset: [anchors]}
+    ANCHOR_BATCH = 0x400                        # anchors to collect before writing them to the file
     BLOCK_PAR = 'data'                          # parameter on which max items is tested
     MINIMAL_DISK_SPACE = 2.024e9                # Minimal free disk space to keep, saver will stop if this is not available
     save_block_lengths = {}                     # dictionary with buffer length for each save block
@@ -58,7 +108,12 @@ class Saver():
                                   seconds=0,)   # time interval to create new file in timedelta
 
     STOP = tr.Event()                           # flag to indicate stop of recording
-    SAVE_LOOP_INTERVAL = 1                      # time to wait before checking for new save data
+    SAVE_LOOP_INTERVAL = 1                      # time to wait before checking for new save data (if the writers cannot wake the saver)
+    FLUSH_DEADLINE = 10                         # max time (s) before new data is saved (also if it is less than a save block)
+    WAKEUP = True                               # let the writers wake the save loop (False: check every SAVE_LOOP_INTERVAL)
+    wakeup = None                               # woken by the writers (see Wakeup)
+    last_check = {}                             # time of last save, or check without new data, of each parameter
+    no_data = set()                             # parameters without data structure yet (checked every SAVE_LOOP_INTERVAL)
 
     start_time = None                           # start time of recording
 
@@ -67,16 +122,45 @@ class Saver():
                    'fletcher32': False,
                    'shuffle': False,            # Only shuffle if not linear data
                    }
+    par_compression = {}                        # compression parameters per parameter: {pattern: parameters}
+                                                # (see compression.py), compression is used if no pattern matches
     
     recname = ''
+    RECNAME_FILE = "recname"                    # file in the temp dir with recname (to recover files without journal)
 
     save_tr = None                              # Save loop thread
+    finalize_trs = []                           # threads that finalize the previous files (see finalize_file)
+    unfinalized = []                            # files that could not be moved to the save dir (kept in temp dir)
+
+    status = None                               # status array (see STATUS_DTYPE), shared with the gui if run in SaverProcess
+    bytes_written = 0                           # total bytes of data written (before compression)
+    n_wakeups = 0                               # number of times the save loop was woken by a writer
+    n_deadline_saves = 0                        # number of saves of less than a block (FLUSH_DEADLINE)
+    n_slow_saves = 0                            # number of times the save block was increased (save loop too slow)
+
+    STATUS_DTYPE = [('running', 'i8'),          # 1 while saving
+                    ('disk_full', 'i8'),        # 1 if saving stopped because the disk is full
+                    ('bytes_written', 'i8'),    # total bytes of data written (before compression)
+                    ('lag', 'i8'),              # max number of items in the buffer that are not saved yet
+                    ('compression_ratio', 'f8'),# size of data / size on disk of current file
+                    ('wakeups', 'i8'),          # number of times the save loop was woken by a writer
+                    ('deadline_saves', 'i8'),   # number of saves of less than a block (FLUSH_DEADLINE)
+                    ('slow_saves', 'i8'),       # number of times the save block was increased
+                    ('updated', 'f8'),          # time of last update
+                    ]
 
     def __init__(self, **kwargs):
         self.__dict__.update(kwargs)
+        self.unfinalized = []
+        self.overviews, self.anchors = {}, {}
+        if self.status is None:
+            self.status = np.zeros((1,), dtype=self.STATUS_DTYPE)
+        if self.VERIFY:
+            self.verifier = Verifier.shared()
         
         # empty tempdir
         if self.paths['temp_dir'].exists():
+            self.recover_journals()                     # rebuild files that were not closed
             rmtree(self.paths['temp_dir'])
 
         # make paths
@@ -84,9 +168,9 @@ class Saver():
             p.mkdir(parents=True, exist_ok=True)
             p.chmod(0o777)                              # set ownership to everyone
         
-        # create tempdir
-        self.tempdir = tempfile.TemporaryDirectory(dir=self.paths['temp_dir'])
-        self.paths['temp_dir'] = Path(self.tempdir.name)
+        # create tempdir (removed on stop, only if all files are saved)
+        self.paths['temp_dir'] = Path(tempfile.mkdtemp(dir=self.paths['temp_dir']))
+        (self.paths['temp_dir'] / self.RECNAME_FILE).write_text(self.recname)
         
         # clean tempdir
         
@@ -109,13 +193,63 @@ class Saver():
         
         self.save_tr = tr.Thread(target=self.save_loop)
         self.save_tr.start()
+        self.update_status(running=True)
         
     def stop(self):
         self.STOP.set()
-        self.save_tr.join() if self.save_tr else None
+        if self.save_tr:
+            waker = Wakeup(f"{self.shared_buffer.name}_saver")     # wake save loop
+            waker.notify()
+            waker.close()
+            self.save_tr.join()
         self.save_buffer()
         self.close_file()
-        self.tempdir.cleanup()                      # empty tempdir on clean stop
+        for finalize_tr in self.finalize_trs:
+            finalize_tr.join()
+        self.finalize_trs = []
+        if self.unfinalized:
+            # keep the files and journals, they are recovered when the saver is created again
+            log(f"files not saved, kept in {self.paths['temp_dir']}: "
+                f"{', '.join(f.name for f in self.unfinalized)}", "error")
+        else:
+            rmtree(self.paths['temp_dir'], ignore_errors=True)     # empty tempdir on clean stop
+        self.update_status(running=False)
+
+    def update_status(self, running=None):
+        """
+        writes the progress of saving to the shared status array (if linked)
+        """
+        if self.status is None:
+            return
+
+        if running is not None:
+            self.status['running'] = running
+        self.status['disk_full'] = self.disk_full
+        self.status['bytes_written'] = self.bytes_written
+        self.status['wakeups'] = self.n_wakeups
+        self.status['deadline_saves'] = self.n_deadline_saves
+        self.status['slow_saves'] = self.n_slow_saves
+
+        lag = 0
+        for par in self.buffer:
+            try:
+                lag = max(lag, self.shared_buffer.get_n_items('added', 'saved', par))
+            except KeyError:
+                pass                                # parameter removed
+        self.status['lag'] = lag
+
+        if self.file:
+            size = sum(self.n_rows[key] * ds.dtype.itemsize * int(np.prod(ds.shape[1:]))
+                       for key, ds in self.dataset.items())
+            stored = sum(ds.id.get_storage_size() for ds in self.dataset.values())
+            self.status['compression_ratio'] = size / stored if stored else 0
+        self.status['updated'] = time.time()
+
+    def get_status(self):
+        """
+        returns the progress of saving as dictionary (see STATUS_DTYPE)
+        """
+        return {name: self.status[name].item() for name in self.status.dtype.names}
 
     def link_buffer(self):
         if self.shared_buffer is None:
@@ -131,17 +265,20 @@ class Saver():
         self.shared_buffer.check_new()
 
     def new_file(self, start_time=None) -> h5py.File:
+        """
+        opens a new file, the current file is finalized (closed and moved to
+        the save dir) in the background after the new file is opened
+        """
         if self.STOP.is_set():
             return                   # dont create new file if recording is stopped
 
-        if self.file:
-            self.close_file()
-
         self.check_disk_space()   # check disk space
         if self.disk_full:
             self.stop()
             return                  # dont create file when not enough free disk space
 
+        previous = self.detach_file()
+
         self.start_time = start_time or datetime.now()
 
         self.date = self.start_time.strftime("_%Y%m%d_%H%M%S")
@@ -156,38 +293,115 @@ class Saver():
 
 
         self.dataset = {}
+        self.n_rows = {}
         self.attrs = {"timezone": str(datetime.now().astimezone().tzinfo),
                       "time_offset_utc": round((datetime.now() - datetime.utcnow()).total_seconds()),
                       }         # attributes to write to file
 
+        if self.JOURNAL:
+            self.journal = Journal.create(self.paths["temp_dir"], self.full_file_name,
+                                          recname=self.recname, attrs=self.attrs)
+
         log("new file: {}".format(self.full_file_name), "debug")
 
-    def close_file(self):
+        if previous:
+            self.finalize_trs = [t for t in self.finalize_trs if t.is_alive()]
+            self.finalize_trs.append(tr.Thread(target=self.finalize_file, args=(previous,)))
+            self.finalize_trs[-1].start()
+
+    def detach_file(self):
+        """
+        returns the current file with its datasets, rows written, attributes
+        and journal (for finalize_file), None if there is no file; the saver 
+        has no file after this
+        """
         if not self.file:
             return
-        self.file.attrs.update(self.attrs)
-        self.file.close()
-        self.file = None
+        self.flush_overviews()
+        self.flush_anchors()
+        previous = {'file': self.file, 'dataset': self.dataset, 'n_rows': self.n_rows, 
+                    'attrs': self.attrs, 'journal': self.journal,
+                    'full_file_name': self.full_file_name}
+        self.file, self.dataset, self.n_rows, self.journal = None, {}, {}, None
+        return previous
+
+    def close_file(self):
+        """
+        closes the current file and moves it to the save dir (waits until done)
+        """
+        previous = self.detach_file()
+        if previous:
+            self.finalize_file(previous)
 
-        src = self.paths["temp_dir"] / self.full_file_name
-        dst = self.paths["save_dir"] / self.recname
+    def finalize_file(self, previous):
+        """
+        closes a detached file (see detach_file) and moves it to the save dir
 
-        dst.mkdir(parents=True, exist_ok=True)
-        dst.chmod(0o777)                                                    # set permission so that everyone car read / write
+        if this fails (e.g. save dir full or removed), the file and its journal
+        are kept in the temp dir (see stop) and recovered when the saver is
+        created again (see recover_journals)
+        """
+        file = previous['file']
+        src = self.paths["temp_dir"] / previous['full_file_name']
+        part = None
+        try:
+            self.trim_datasets(previous['dataset'], previous['n_rows'])
+            file.attrs.update(previous['attrs'])
+            file.close()
+
+            dst = self.paths["save_dir"] / self.recname
+
+            dst.mkdir(parents=True, exist_ok=True)
+            dst.chmod(0o777)                                                    # set permission so that everyone car read / write
+
+            dst /= previous['full_file_name']                                   # add filename to destination
+            part = dst.with_name(f"{dst.name}.part")
+            move(src, part)                                                     # Move file (copies if on other disk)
+            part.rename(dst)                                                    # file only appears when complete
+
+        except Exception as e:
+            log(f"cannot save {previous['full_file_name']}: {e}, kept in {src.parent}", "error")
+            try:
+                file.close()
+            except Exception:
+                pass
+            if part is not None and src.exists():
+                part.unlink(missing_ok=True)                                    # remove incomplete copy
+            if previous['journal']:
+                previous['journal'].close()
+            self.unfinalized.append(src)
+            return
 
-        dst /= self.full_file_name                                              # add filename to destination        
-        src.rename(dst)                                                         # Move file
+        if previous['journal']:
+            previous['journal'].remove()                                        # file is complete
+        if self.verifier:
+            self.verifier.add(dst)
 
-        log("closed file: {}".format(self.full_file_name), "debug")
+        log("closed file: {}".format(previous['full_file_name']), "debug")
 
     def save_loop(self):
         """
-        Run this loop to check if data needs to be saved
+        Run this loop to save data: waits until a writer wakes it (a parameter 
+        reached save_at) or the first FLUSH_DEADLINE passes, and saves the 
+        parameters with a save block of new data or with new data that waited 
+        FLUSH_DEADLINE
         """
-        
-        while not self.STOP.wait(self.SAVE_LOOP_INTERVAL):
-            self.update_buffer_links()              # NOTE do only ondemand if taking too many resources
-            
+        self.wakeup = Wakeup(f"{self.shared_buffer.name}_saver", reader=self.WAKEUP)
+        self.last_check = {}
+        self.no_data = set()
+        timeout = 0                                                     # check all parameters at start
+
+        while not self.STOP.is_set():
+            if self.wakeup.wait(timeout):
+                self.n_wakeups += 1
+            if self.STOP.is_set():
+                break
+
+            self.update_buffer_links()
+            now = time.monotonic()
+            self.last_check = {par: t for par, t in self.last_check.items()
+                               if par in self.data_structure.parameters}     # drop removed parameters
+            self.no_data &= set(self.data_structure.parameters)
             for par in self.data_structure.parameters:
                 if par not in self.save_block_lengths:
                     self.save_block_lengths[par] = self.BLOCK_SIZE
@@ -197,26 +411,59 @@ class Saver():
                     
                 except IndexError:
                     # data structure not yet created by recorder
-                    log(f"no data for parameter: {par}", 'warning')
+                    if par not in self.no_data:
+                        log(f"no data for parameter: {par}", 'warning')
+                    self.no_data.add(par)
                     continue
+                self.no_data.discard(par)
 
                 if self.save_block_lengths[par] > data_size:
                     # limit buffer to half of the size of the data buffer and minimal 1
                     self.save_block_lengths[par] = int(data_size / 2) or 1
 
                 n_items = self.shared_buffer.get_n_items('added', 'saved', par)
+                overdue = now - self.last_check.setdefault(par, now) >= self.FLUSH_DEADLINE
                
-                if (n_items >= self.save_block_lengths[par]) and n_items > 0:
+                if n_items > 0 and (n_items >= self.save_block_lengths[par] or overdue):
+                    if n_items < self.save_block_lengths[par]:
+                        self.n_deadline_saves += 1
                     self.save_buffer(par)
 
                     # increase save block size if saving takes too long
                     if (data_size // 2) > n_items > (2 * self.save_block_lengths[par]):
                         self.save_block_lengths[par] *= 2
+                        self.n_slow_saves += 1
                         
                         log(f'Save loop too slow (or blocksize to small).'
                             f'increasing blocksize to {self.save_block_lengths[par]}', 
                             'warning')
 
+                if n_items == 0 or n_items >= self.save_block_lengths[par] or overdue:
+                    self.last_check[par] = now
+
+                # wake up when the next save block is written
+                self.shared_buffer.row(par)['save_at'] = (self.data_structure.get('n_saved', par)
+                                                          + self.save_block_lengths[par])
+
+            self.update_status()
+            timeout = self.next_timeout()
+
+        self.wakeup.close()
+        self.wakeup.unlink()
+
+    def next_timeout(self):
+        """
+        time (s) until the first parameter has to be checked for FLUSH_DEADLINE, 
+        SAVE_LOOP_INTERVAL if the saver cannot be woken by the writers or if 
+        there are no parameters with data yet (to find new parameters)
+        """
+        if not self.wakeup:
+            return self.SAVE_LOOP_INTERVAL
+        timeout = self.SAVE_LOOP_INTERVAL if not self.last_check or self.no_data else self.FLUSH_DEADLINE
+        if self.last_check:
+            timeout = min(timeout, min(self.last_check.values()) + self.FLUSH_DEADLINE - time.monotonic())
+        return max(0, timeout)
+
     def save_buffer(self, par=None):
         ''' 
         call this method to save data
@@ -225,11 +472,23 @@ class Saver():
             return   # no file to write in
         
         for par in (self.buffer if par is None else (par,)):
-            data, newest_pos = self.get_data(par)
+            data, n_saved, overrun = self.get_data(par)
+
+            if overrun:
+                log(f"{par}: {overrun} items overwritten before they were saved "
+                    f"(total: {self.data_structure.get('overrun', par) + overrun})",
+                    "warning")
             
             if data is not None:
-                self.write(par, data)
-                self.data_structure.set(newest_pos, 'saved', par)
+                if data.shape[0]:
+                    self.write(par, data)
+                    self.write_overview(par, data)
+                    first_item = n_saved - data.shape[0]        # total item number of the first row of data
+                    if self.n_rows[par] == data.shape[0]:
+                        self.dataset[par].attrs['first_item'] = first_item      # first rows in this file
+                    if self.journal:
+                        self.journal.append(par, data, first_item)
+                self.shared_buffer.set_saved(par, n_saved, overrun)
 
             if self.file:
                 self.file.flush()               # write all data to file
@@ -253,68 +512,321 @@ class Saver():
         """
         gets data for saving from shared memory
 
+        returns: data, total number of items saved after saving data, 
+                 number of items that were overwritten before saving (overrun)
         """
         try:
-            last_pos = self.data_structure.get('saved', par)
-            n_items = self.shared_buffer.get_n_items('added', 'saved', par)
-        except TypeError:
+            # limit to max items per block so that data stays in sync
+            return self.shared_buffer.read_since(
+                par, 
+                self.data_structure.get('n_saved', par),
+                max_items=self.BLOCK_SIZE,
+                out=self.get_out_buffer(par))
+
+        except (TypeError, KeyError):
             # data is not saved yet
-            return None, None
+            return None, None, 0
 
-
-        # limit newest pos to last saved plus max items so that data stays in sync
-        if n_items > self.BLOCK_SIZE:
-            newest_pos = last_pos + self.BLOCK_SIZE
-        else:
-            newest_pos = self.data_structure.get('added', par)
-
-        size = self.data_structure.get('dim0', par)
-        newest_pos = (newest_pos) % size
-
-        data = self.shared_buffer.get_buf(par, 
-                                          start=last_pos + 1, 
-                                          end=newest_pos
-                                          )  # add one to prevent double saving last position
-
-        newest_pos %= size                         
-
-        return data, newest_pos
+    def get_out_buffer(self, par):
+        """
+        returns the reusable array (BLOCK_SIZE items) to copy the data of par to, 
+        the data in it is valid until the next get_data of par
+        """
+        buf = self.buffer[par]
+        out = self.out_buffers.get(par)
+        if out is None or out.dtype != buf.dtype or out.shape[1:] != buf.shape[1:]:
+            out = self.out_buffers[par] = np.empty((self.BLOCK_SIZE, *buf.shape[1:]),
+                                                   dtype=buf.dtype)
+        return out
 
     def write(self, key, data):
         """
         this method writes data from buffer to file
         """
         items = data.shape[0]
+        self.bytes_written += data.nbytes
+        encoded, anchors = delta_encode(data, self.DELTA_COLUMNS)
+        n_rows = self.n_rows.get(key, 0)
 
         if key not in self.dataset:
             # create new data set entry
-            self.create_dataset(key, data)
-        
+            self.create_dataset(key, encoded, chunks=self.chunk_shape(key, data))
+            for col in anchors:
+                self.dataset[key].attrs[f"delta_scale_{col}"] = self.DELTA_COLUMNS[col]
+                self.dataset[key].attrs[f"delta_dtype_{col}"] = data.dtype[col].str
+
         else:
-            # expand data set with new data
-            dims = list(self.dataset[key].shape)
-            dims[0] += items
-            self.dataset[key].resize(dims)
-            self.dataset[key][-items:] = data
-        
-    def create_dataset(self, key, data) -> dict:
+            dataset = self.dataset[key]
+            if n_rows + items > dataset.shape[0]:
+                # grow data set geometrically (in whole chunks), trimmed on close_file
+                chunk = dataset.chunks[0]
+                dims = list(dataset.shape)
+                dims[0] = max(n_rows + items, int(dims[0] * self.PREALLOCATE_GROWTH))
+                dims[0] = -(-dims[0] // chunk) * chunk
+                dataset.resize(dims)
+
+            dataset[n_rows:n_rows + items] = encoded
+            self.n_rows[key] = n_rows + items
+
+        # anchors are written in batches (the journal has the data if they are lost)
+        for col, col_anchors in anchors.items():
+            col_anchors['row'] += n_rows                        # row in the data set
+            pending = self.anchors.setdefault(anchor_key(key, col), [])
+            pending.append(col_anchors)
+            if len(pending) >= self.ANCHOR_BATCH:
+                self.flush_anchors(anchor_key(key, col))
+
+    def write_overview(self, key, data):
+        """
+        adds data to the overviews of key and writes the completed bins 
+        (see overview.py)
+        """
+        for bin_size in self.OVERVIEW_BINS:
+            overview = self.overviews.get((key, bin_size))
+            if overview is None:
+                if not Overview.has_columns(data.dtype):
+                    return                                  # no time or numeric columns
+                overview = self.overviews[(key, bin_size)] = Overview(data.dtype, bin_size)
+
+            bins = overview.add(data)
+            if bins.shape[0]:
+                self.write(overview_key(key, bin_size), bins)
+
+    def flush_overviews(self):
         """
-        creates a data set for the key with the data
+        writes the incomplete last bins of the overviews to the current file
+        and starts new overviews
+        """
+        for (key, bin_size), overview in self.overviews.items():
+            bins = overview.flush()
+            if bins.shape[0]:
+                self.write(overview_key(key, bin_size), bins)
+        self.overviews = {}
+
+    def flush_anchors(self, key=None):
+        """
+        writes the collected anchors of the delta encoded columns (of anchor
+        dataset key, all if None) to the current file
+        """
+        for key in (list(self.anchors) if key is None else (key,)):
+            pending = self.anchors.pop(key, [])
+            if pending:
+                self.write(key, np.concatenate(pending))
+
+    def trim_datasets(self, dataset=None, n_rows=None):
+        """
+        shrink the (preallocated) data sets to the number of rows written
+        (of the current file if dataset and n_rows are not given)
+        """
+        dataset = self.dataset if dataset is None else dataset
+        n_rows = self.n_rows if n_rows is None else n_rows
+        for key, ds in dataset.items():
+            if ds.shape[0] != n_rows[key]:
+                ds.resize(n_rows[key], axis=0)
+
+    def chunk_shape(self, key, data):
+        """
+        returns the chunk shape for the data set of key: CHUNK_SECONDS of 
+        data (the rate is estimated from the time of the data), limited by
+        CHUNK_BYTES and the save block length
+        """
+        row_bytes = data.dtype.itemsize * int(np.prod(data.shape[1:]))
+        min_rows, max_rows = (max(1, int(b // row_bytes)) for b in self.CHUNK_BYTES)
+        rows = max_rows
+
+        if data.dtype.names and 'time' in data.dtype.names and data.shape[0] > 1:
+            duration = float(data['time'][-1] - data['time'][0])
+            if duration > 0:
+                rows = int((data.shape[0] - 1) / duration * self.CHUNK_SECONDS)
+
+        rows = min(rows, self.save_block_lengths.get(key, self.BLOCK_SIZE))
+        rows = max(min_rows, min(rows, max_rows))
+        return (rows, *data.shape[1:])
+
+    def create_dataset(self, key, data, chunks=None) -> dict:
+        """
+        creates a data set for the key with the data, the data set is
+        preallocated (see write)
+
+        - chunks:   chunk shape (see chunk_shape if None)
         """
         datatype = data.dtype
+        chunks = chunks or self.chunk_shape(key, data)
+        shape = list(data.shape)
+        shape[0] = -(-max(1, shape[0]) // chunks[0]) * chunks[0]            # whole chunks
         maxshape = list(data.shape)
         maxshape[0] = None
         self.dataset[key] = (self
                              .file
                              .create_dataset(key,
-                                             data=data,
+                                             shape=shape,
                                              dtype=datatype,
                                              maxshape=maxshape,
-                                             # chunks=(32000,),
-                                             chunks=True,
-                                             **self.compression,
+                                             chunks=chunks,
+                                             **self.get_compression(key),
                                     )
                             )
+        self.dataset[key][:data.shape[0]] = data
+        self.n_rows[key] = data.shape[0]
+
+    def recover_journals(self):
+        """
+        rebuilds the files of the journals in the temp dir (files that were 
+        not closed) and saves them in the save dir
+        """
+        journals = Journal.find(self.paths["temp_dir"])
+        journal_files = {j.path.with_name(j.name) for j in journals}     # files rebuilt from their journal
+        for journal in journals:
+            dst = self.paths["save_dir"] / journal.recname / journal.name
+            if dst.exists():
+                journal.remove()                        # file was closed before the journal was removed
+                continue
+
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            tmp = dst.with_name(f"{dst.name}.recovering")
+            try:
+                self.file = h5py.File(tmp, "w")
+                self.dataset = {}
+                self.n_rows = {}
+                self.overviews = {}
+                self.anchors = {}
+                for key in journal.keys():
+                    for data in journal.read(key, self.BLOCK_SIZE):
+                        self.write(key, data)
+                        self.write_overview(key, data)
+                    if key in self.dataset and journal.first_item(key) is not None:
+                        self.dataset[key].attrs['first_item'] = journal.first_item(key)
+                self.flush_overviews()
+                self.flush_anchors()
+                self.trim_datasets()
+                self.file.attrs.update(journal.attrs)
+                self.file.attrs["recovered"] = True
+                self.file.close()
+                self.file = None
+                tmp.rename(dst)
+                if self.verifier:
+                    self.verifier.add(dst)
+
+            except Exception as e:
+                # keep the journal next to the files (temp dir is removed)
+                log(f"cannot recover {journal.name}: {e}, journal moved to {dst.parent}", "error")
+                self.file.close() if self.file else None
+                self.file = None
+                journal.close()
+                journal.path.rename(dst.parent / journal.path.name)
+                continue
+
+            journal.remove()
+            log(f"recovered file: {dst} ({', '.join(f'{k}: {n}' for k, n in self.n_rows.items())} items)",
+                "warning")
+
+        # files without journal that were not moved to the save dir (see finalize_file)
+        for src in sorted(self.paths["temp_dir"].glob(f"**/*{self.extension}")):
+            if src in journal_files:
+                continue
+            recname = src.parent / self.RECNAME_FILE
+            dst = self.paths["save_dir"] / (recname.read_text() if recname.exists() else "") / src.name
+            if dst.exists():
+                continue
+            try:
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                move(src, dst)
+                log(f"moved file that was not saved to: {dst}", "warning")
+                if self.verifier:
+                    self.verifier.add(dst)
+            except Exception as e:
+                log(f"cannot move {src}: {e}", "error")
+
+        self.dataset = {}
+        self.n_rows = {}
+        self.anchors = {}
+        self.bytes_written = 0
+
+    def get_compression(self, par):
+        """
+        returns the compression parameters for par: of the first pattern in
+        par_compression that matches par, otherwise compression
+        """
+        options = match_par(par, self.par_compression)
+        return self.compression if options is None else options
+
+
+def _run_saver(kwargs, q_in, status_name, stopped):
+    """
+    runs a Saver in the saver process, until it is stopped with the "stop" 
+    command, then waits until the closed files are verified
+    """
+    saver = Saver(**kwargs)
+    saver.status = create_shared_np(status_name, (1,), Saver.STATUS_DTYPE)
+    while True:
+        cmd, value = q_in.get()
+        if cmd == "start":
+            saver.start(value)
+        elif cmd == "new_file":
+            saver.new_file(value)
+        elif cmd == "stop":
+            saver.stop()
+            stopped.set()
+            break
+
+    if saver.verifier and not saver.verifier.wait(SaverProcess.VERIFY_TIMEOUT):
+        log(f"{saver.verifier.pending} files not verified within "
+            f"{SaverProcess.VERIFY_TIMEOUT} s", "warning")
+
+
+class SaverProcess():
+    """
+    Runs a Saver in a separate process, that links to the SharedBuffer by name
+    and reads, compresses and writes the data to the h5 files there
+
+    Has the same methods as Saver for the GUI (start, stop, new_file, 
+    disk_full), the progress is read from a shared status array (see 
+    Saver.STATUS_DTYPE) without waiting for the process.
+
+    kwargs are passed to the Saver (e.g. recname, NEW_FILE_INTERVAL)
+    """
+    JOIN_TIMEOUT = 60                           # time to wait for saver to save the last data and close the file
+    VERIFY_TIMEOUT = 3600                       # time the process keeps running after stop to verify the last files
+
+    def __init__(self, **kwargs):
+        self.q_out = Queue()                    # commands for the saver
+        self.status = create_shared_np(f"{SharedBuffer.name}_saver_status", (1,), 
+                                       Saver.STATUS_DTYPE, fill=0)
+        self.status.fill(0)                     # reset if it already existed
+
+        self.stopped = Event()                  # set when the last file is closed
+        self.process = Process(target=_run_saver,
+                               args=(kwargs, self.q_out, self.status._shm.name, self.stopped),
+                               daemon=True)
+        self.process.start()
+
+    @property
+    def disk_full(self):
+        return bool(self.status['disk_full'])
+
+    def start(self, start_time=None):
+        self.q_out.put(("start", start_time))
+
+    def new_file(self, start_time=None):
+        self.q_out.put(("new_file", start_time))
+
+    def stop(self):
+        """
+        stops saving: the saver saves the last data and closes the file,
+        the process ends by itself when the closed files are verified
+        """
+        self.q_out.put(("stop", None))
+        if not self.stopped.wait(self.JOIN_TIMEOUT):
+            log(f"saver did not stop within {self.JOIN_TIMEOUT} s", "warning")
+            self.process.kill()
+            self.process.join()
+        self.status._shm.unlink()               # status stays readable until this is deleted
+
+    def get_status(self):
+        """
+        returns the progress of saving as dictionary (see Saver.STATUS_DTYPE)
+        """
+        return {name: self.status[name].item() for name in self.status.dtype.names}
 
 # TODO: use shared dictionary for shared pars?
 
@@ -343,6 +855,7 @@ if __name__ == "__main__":
             sav.buffer['linear'][i] = i
             sav.buffer['random'][i] = np.random.random()
             sav.data_structure.set((sav.data_structure.get('added', ...) + 1) % TEST_ITEMS, 'added', ...)
+            sav.data_structure.set(sav.data_structure.get('n_written', ...) + 1, 'n_written', ...)
        
             if i % SAV_STEPS == 0 and i > 1: 
                 sav.new_file() 
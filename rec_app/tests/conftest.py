@@ -0,0 +1,33 @@
+"""
+test setup: the app is run from the rec_app folder (imports start at subs.) 
+and writes its logs and data relative to the working directory, which is 
+moved to a temporary folder for the tests
+"""
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.chdir(tempfile.mkdtemp(prefix="rec_app_tests_"))
+
+
+@pytest.fixture
+def shared_buffer():
+    """
+    SharedBuffer with its own (unique) shared memory, removed after the test
+    """
+    from subs.recording.buffer import SharedBuffer
+
+    buff = SharedBuffer(name=f"test_{uuid.uuid4().hex[:8]}")
+    yield buff
+    buff.unlink_all()
+    buff.close_all()
+    buff.data_structure.unlink()
+    buff.version._shm.unlink()
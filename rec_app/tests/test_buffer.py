@@ -0,0 +1,84 @@
+import threading as tr
+import time
+
+import numpy as np
+import pytest
+
+DTYPE = np.dtype([("time", "f8"), ("n", "i8")])
+
+
+def _items(start, n):
+    """
+    items with the total item number in n (and time)
+    """
+    items = np.zeros(n, dtype=DTYPE)
+    items["n"] = np.arange(start, start + n)
+    items["time"] = items["n"] / 100
+    return items
+
+
+def test_clear_parameter(shared_buffer):
+    shared_buffer.add_parameter("par", DTYPE, 100)
+    shared_buffer.add_to_buf("par", _items(0, 250))
+    row = shared_buffer.row("par")
+    row["n_saved"], row["save_at"] = 200, 300
+
+    shared_buffer.clear_parameter("par")
+
+    for col in ("n_written", "n_saved", "overrun", "first", "save_at"):
+        assert row[col] == shared_buffer.defaults[col], col
+    data, cursor, overrun = shared_buffer.read_since("par", 0)
+    assert data.shape[0] == cursor == overrun == 0
+
+
+def test_read_consistent_with_writer(shared_buffer):
+    # the writer loops the buffer constantly, reads may not be torn
+    shared_buffer.add_parameter("par", DTYPE, 64)
+    stop = tr.Event()
+
+    def write():
+        n = 0
+        while not stop.is_set():
+            shared_buffer.add_to_buf("par", _items(n, 24))
+            n += 24
+            time.sleep(0)
+
+    writer = tr.Thread(target=write)
+    writer.start()
+    try:
+        n_reads = 0
+        t_end = time.monotonic() + 1
+        while time.monotonic() < t_end:
+            data, n_written = shared_buffer.read_last("par", 48)
+            assert data["n"].tolist() == list(range(n_written - data.shape[0], n_written))
+            n_reads += 1
+    finally:
+        stop.set()
+        writer.join()
+    assert n_reads > 100
+
+
+@pytest.mark.parametrize("soa", [False, True])
+def test_read_since_wrap(shared_buffer, soa):
+    shared_buffer.add_parameter("par", DTYPE, 100, soa=soa)
+    cursor, received = 0, []
+    for start, n in ((0, 70), (70, 50), (120, 30), (150, 150)):    # wraps, last block overruns
+        shared_buffer.add_to_buf("par", _items(start, n))
+        data, cursor, overrun = shared_buffer.read_since("par", cursor)
+        received += data["n"].tolist()
+        assert overrun == (50 if start == 150 else 0)           # 150 - 200 overwritten
+    assert received == list(range(150)) + list(range(200, 300))
+    assert cursor == 300
+
+
+def test_get_items_looped(shared_buffer):
+    shared_buffer.add_parameter("par", DTYPE, 100)
+    shared_buffer.add_to_buf("par", _items(0, 180))
+    out = np.zeros(100, dtype=DTYPE)
+
+    items = shared_buffer.get_items("par", 90, 170)                # looped
+    assert items["n"].tolist() == list(range(90, 170))
+    items = shared_buffer.get_items("par", 90, 170, out=out)
+    assert items["n"].tolist() == list(range(90, 170))
+    items = shared_buffer.get_items("par", 0, 180)                 # overwritten items skipped
+    assert items["n"].tolist() == list(range(80, 180))
@@ -0,0 +1,21 @@
+import numpy as np
+
+from subs.driver.data_decoder import DataDecoder
+
+DTYPE = np.dtype([("time", "f8"), ("us", "u4")])
+
+
+def _records(us):
+    return np.array([(u,) for u in us], dtype=[("us", "u4")])
+
+
+def test_decode_block_us_loop():
+    decoder = DataDecoder()
+    decoder.starttime = 100.0
+    step = 1000
+    us = (np.arange(0xFFFF_FFFF - 10 * step, 0xFFFF_FFFF + 10 * step, step) & 0xFFFF_FFFF)
+
+    block = decoder.decode_block(_records(us), DTYPE)           # us loops in this block
+
+    np.testing.assert_allclose(np.diff(block["time"]), step / 1e6, atol=2e-6)
+    np.testing.assert_allclose(decoder.emarate, 1e6 / step, rtol=1e-3)
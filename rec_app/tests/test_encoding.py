@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import h5py
+import numpy as np
+import pytest
+
+from subs.recording.encoding import Decoder, delta_decode, delta_encode
+from subs.recording.saver import Saver
+
+DTYPE = np.dtype([('time', 'f8'), ('us', 'u4'), ('a', 'f4')])
+COLUMNS = {'time': 1e6, 'us': 1}
+
+
+def _data(n=10_000, start=1.7e9):
+    data = np.zeros(n, dtype=DTYPE)
+    data['time'] = start + np.arange(n) / 2048
+    data['time'][n // 2:] += 3600                                           # gap
+    data['us'] = (np.arange(n, dtype='i8') * 488 + 2 ** 32 - 1_000_000) % 2 ** 32   # wraps
+    data['a'] = np.random.random(n)
+    return data
+
+
+def test_delta_encode_decode():
+    data = _data()
+    encoded, anchors = delta_encode(data, COLUMNS)
+
+    assert encoded.dtype['time'] == encoded.dtype['us'] == np.dtype('i4')
+    np.testing.assert_array_equal(encoded['a'], data['a'])
+    assert anchors['time']['row'].tolist() == [0, 5000]                     # start and gap
+    wrap = int(np.flatnonzero(np.diff(data['us'].astype('i8')) < 0)[0]) + 1
+    assert anchors['us']['row'].tolist() == [0, wrap]
+
+    for first_row in anchors['time']['row']:
+        time = delta_decode(encoded['time'][first_row:], anchors['time'], first_row, 1e6, 'f8')
+        np.testing.assert_allclose(time, data['time'][first_row:], rtol=0, atol=1e-6)
+    us = delta_decode(encoded['us'], anchors['us'], 0, 1, 'u4')
+    np.testing.assert_array_equal(us, data['us'])
+
+    with pytest.raises(ValueError):
+        delta_decode(encoded['us'][10:], anchors['us'], 10, 1, 'u4')       # not an anchor
+
+
+def test_saved_file(tmp_path):
+    # blocks written by the saver, anchors written in batches, rows read from anywhere
+    saver = Saver(paths={"save_dir": tmp_path / "save", "temp_dir": tmp_path / "temp"},
+                  recname="rec", DELTA_COLUMNS=COLUMNS, ANCHOR_BATCH=3, 
+                  JOURNAL=False, VERIFY=False)
+    data = _data()
+    saver.new_file(datetime(2026, 1, 1))
+    for i in range(0, data.shape[0], 700):
+        saver.write("par", data[i:i + 700])
+    saver.close_file()
+
+    with h5py.File(tmp_path / "save" / "rec" / "data_20260101_000000.h5") as f:
+        decoder = Decoder(f["par"])
+        assert decoder.dtype == DTYPE
+        for i0, i1 in ((0, 10_000), (1, 2), (699, 701), (4990, 5010), (9999, 10_000)):
+            out = decoder.read(i0, i1)
+            np.testing.assert_allclose(out['time'], data['time'][i0:i1], rtol=0, atol=1e-6)
+            np.testing.assert_array_equal(out['us'], data['us'][i0:i1])
+            np.testing.assert_array_equal(out['a'], data['a'][i0:i1])
+        np.testing.assert_array_equal(decoder.column('us', 2000, 3000), data['us'][2000:3000])
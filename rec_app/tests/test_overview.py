@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from subs.recording.overview import Overview
+
+DTYPE = np.dtype([('time', 'f8'), ('a', 'f4'), ('b', 'i2')])
+
+
+def _overview(data, block=37):
+    ov = Overview(data.dtype, 1)
+    return np.concatenate([ov.add(data[i:i + block]) for i in range(0, data.shape[0], block)]
+                          + [ov.flush()])
+
+
+def _data(n=1000):
+    data = np.zeros(n, dtype=DTYPE)
+    data['time'] = np.arange(n) / 100
+    data['a'] = np.random.random(n)
+    data['b'] = np.arange(n)
+    return data
+
+
+def test_min_max_mean():
+    data = _data()
+    bins = _overview(data)
+
+    assert bins.shape[0] == 10
+    np.testing.assert_allclose(bins['time'], np.arange(10))
+    np.testing.assert_allclose(bins['a_mean'], data['a'].reshape(10, 100).mean(axis=1), rtol=1e-6)
+    np.testing.assert_array_equal(bins['b_min'], np.arange(0, 1000, 100))
+    np.testing.assert_array_equal(bins['b_max'], np.arange(99, 1000, 100))
+
+
+@pytest.mark.filterwarnings("ignore:.*(empty|All-NaN) slice")
+def test_nan():
+    data = _data()
+    data['a'][::3] = np.nan             # some values missing in every bin
+    data['a'][200:300] = np.nan         # bin without values
+    bins = _overview(data)
+
+    a = data['a'].reshape(10, 100)
+    np.testing.assert_allclose(bins['a_mean'], np.nanmean(a, axis=1), rtol=1e-6)
+    np.testing.assert_allclose(bins['a_min'], np.nanmin(a, axis=1))
+    np.testing.assert_allclose(bins['a_max'], np.nanmax(a, axis=1))
+    assert np.isnan(bins['a_mean'][2])
+    np.testing.assert_allclose(bins['b_mean'], data['b'].reshape(10, 100).mean(axis=1))
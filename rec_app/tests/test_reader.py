@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from subs.recording.file_index import index_file
+from subs.recording.reader import Recording
+from subs.recording.saver import Saver
+
+DTYPE = np.dtype([('time', 'f8'), ('us', 'u4'), ('a', 'f4')])
+START = 1.7e9
+N_FILES, ROWS_PER_FILE, BLOCK = 3, 5000, 700
+
+
+@pytest.fixture(params=[(False, False), (True, False), (False, True), (True, True)],
+                ids=["plain", "delta", "indexed", "delta+indexed"])
+def recording(request, tmp_path):
+    """
+    recording of N_FILES files written by the Saver, at 100 Hz
+    """
+    delta, indexed = request.param
+    data = np.zeros(N_FILES * ROWS_PER_FILE, dtype=DTYPE)
+    data['time'] = START + np.arange(data.shape[0]) / 100
+    data['us'] = np.arange(data.shape[0]) * 10_000
+    data['a'] = np.random.random(data.shape[0])
+
+    saver = Saver(paths={"save_dir": tmp_path / "save", "temp_dir": tmp_path / "temp"},
+                  recname="rec", DELTA_COLUMNS={'time': 1e6, 'us': 1} if delta else {},
+                  JOURNAL=False, VERIFY=False)
+    for i in range(N_FILES):
+        saver.new_file(datetime(2026, 1, 1, 0, i))
+        block = data[i * ROWS_PER_FILE:(i + 1) * ROWS_PER_FILE]
+        for j in range(0, ROWS_PER_FILE, BLOCK):
+            saver.write("par", block[j:j + BLOCK])
+    saver.close_file()
+    for t in saver.finalize_trs:
+        t.join()
+
+    path = tmp_path / "save" / "rec"
+    if indexed:
+        for file in path.glob("*.h5"):
+            index_file(file)
+    return Recording(path, SEARCH_ROWS=16), data
+
+
+def test_time_range(recording):
+    rec, data = recording
+    assert len(rec.catalog) == N_FILES
+    assert rec.parameters() == ["par"]
+    assert rec.time_range("par") == (data['time'][0], data['time'][-1])
+
+
+@pytest.mark.parametrize("start, end", [(0, 10), (49.995, 50.5), (20, 130), (-5, 200), 
+                                        (149.99, 150), (10.001, 10.001)])
+def test_read(recording, start, end):
+    rec, data = recording
+    start, end = START + start, START + end
+    out = rec.read("par", start, end)
+
+    expected = data[(data['time'] >= start) & (data['time'] < end)]
+    if out is None:
+        assert expected.shape[0] == 0
+        return
+    np.testing.assert_allclose(out['time'], expected['time'], rtol=0, atol=1e-6)
+    np.testing.assert_array_equal(out['us'], expected['us'])
+    np.testing.assert_array_equal(out['a'], expected['a'])
+
+    out = rec.read("par", start, end, columns=['a'])
+    assert out.dtype.names == ('time', 'a')
+    np.testing.assert_array_equal(out['a'], expected['a'])
+
+
+def test_find_row(recording):
+    import h5py
+
+    rec, data = recording
+    name = sorted(rec.catalog)[1]
+    times = data['time'][ROWS_PER_FILE:2 * ROWS_PER_FILE]
+    with h5py.File(rec.path / name) as f:
+        for t in (times[0] - 1, times[0], times[1] - 0.001, times[2500], times[-1], times[-1] + 1):
+            assert rec.find_row(name, f["par"], t) == np.searchsorted(times, t)
@@ -0,0 +1,50 @@
+import h5py
+import numpy as np
+
+from subs.recording.journal import Journal
+from subs.recording.overview import overview_key
+from subs.recording.saver import Saver
+
+
+def _saver(tmp_path, **kwargs):
+    return Saver(paths={"save_dir": tmp_path / "save", "temp_dir": tmp_path / "temp"},
+                 VERIFY=False, **kwargs)
+
+
+def test_recover_file_without_journal(tmp_path):
+    # file that could not be moved to the save dir (e.g. disk full), JOURNAL off
+    saver = _saver(tmp_path, recname="rec", JOURNAL=False)
+    src = saver.paths["temp_dir"] / "data_20260101_000000.h5"
+    with h5py.File(src, "w") as f:
+        f["par"] = np.arange(10)
+
+    _saver(tmp_path, recname="other")                   # recovers the files in the temp dir
+    dst = tmp_path / "save" / "rec" / src.name
+    with h5py.File(dst) as f:
+        assert f["par"][:].tolist() == list(range(10))
+    assert not src.exists()
+
+
+def test_recover_journal(tmp_path):
+    # saver stopped while writing a file (e.g. power loss): the file is not 
+    # closed, the journal has all blocks and a partly written record
+    saver = _saver(tmp_path, recname="rec")
+    name = "data_20260101_000000.h5"
+    (saver.paths["temp_dir"] / name).write_bytes(b"not closed")
+    journal = Journal.create(saver.paths["temp_dir"], name, recname="rec", attrs={"timezone": "UTC"})
+    data = np.zeros(1000, dtype=[("time", "f8"), ("a", "f4")])
+    data["time"] = np.arange(1000) / 100
+    data["a"] = np.arange(1000)
+    journal.append("par", data[:600], first_item=5000)
+    journal.append("par", data[600:])
+    journal.close()
+    with open(journal.path / journal._file_name("par"), "ab") as f:
+        f.write(b"\0" * 5)
+
+    _saver(tmp_path, recname="other")
+    with h5py.File(tmp_path / "save" / "rec" / name) as f:
+        np.testing.assert_array_equal(f["par"][:], data)
+        assert f["par"].attrs["first_item"] == 5000
+        assert f.attrs["timezone"] == "UTC" and f.attrs["recovered"]
+        assert f[overview_key("par", 1)].shape[0] == 10
+    assert not journal.path.exists()
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from subs.driver.interface_drivers.serial_controller import (IOProtocol, encode_frame,
+                                                             frame_schema_id)
+
+DTYPE = np.dtype([("us", "<u4"), ("SIG", "<f4")])
+SCHEMA_ID = frame_schema_id(DTYPE)
+
+
+def _receive(data, burst, **kwargs):
+    """
+    feeds data to a protocol in bursts, returns the received lines and records
+    """
+    received = []
+    protocol = IOProtocol(do=lambda line: received.append(bytes(line)),
+                          do_frame=lambda schema_id, n, payload: received.append(
+                              np.frombuffer(payload, dtype=DTYPE, count=n)),
+                          **kwargs)
+    view = memoryview(data)
+    for i in range(0, len(data), burst):
+        protocol.save(view[i:i + burst])
+    return protocol, received
+
+
+def _records(start, n):
+    records = np.zeros(n, dtype=DTYPE)
+    records["us"] = np.arange(start, start + n)
+    records["SIG"] = np.arange(start, start + n) / 10
+    return records
+
+
+@pytest.mark.parametrize("burst", [1, 7, 64, 4096, 0x10_0000])
+@pytest.mark.parametrize("frames", [False, True])
+def test_lines(burst, frames):
+    lines = [b'{"us": %d}' % i for i in range(1000)] + [b'{"notes": "' + b"x" * 0x1_0000 + b'"}']
+    protocol, received = _receive(b"\n".join(lines) + b"\n", burst, frames=frames)
+
+    assert received == lines
+    assert protocol.stats.lines == len(lines)
+    assert not protocol.sub_buffer
+
+
+@pytest.mark.parametrize("burst", [1, 5, 64, 4096])
+def test_frames_between_lines(burst):
+    frame_1, frame_2 = _records(0, 100), _records(100, 3)
+    data = (b'{"idle": 1}\n' + encode_frame(SCHEMA_ID, frame_1) + encode_frame(SCHEMA_ID, frame_2)
+            + b'{"idle": 2}\n' + encode_frame(SCHEMA_ID, frame_1) + b'{"idle": 3}\n')
+    protocol, received = _receive(data, burst, frames=True)
+
+    assert [r if isinstance(r, bytes) else r["us"].tolist() for r in received] == [
+        b'{"idle": 1}', frame_1["us"].tolist(), frame_2["us"].tolist(),
+        b'{"idle": 2}', frame_1["us"].tolist(), b'{"idle": 3}']
+    assert protocol.stats.frames == 3
+    assert protocol.stats.errors == 0
+    assert protocol.stats.bytes == len(data)
+
+
+@pytest.mark.parametrize("burst", [1, 64])
+def test_magic_inside_line(burst):
+    # "¥Z" is encoded as C2 A5 5A, which contains the frame magic
+    lines = ['{"notes": "¥Z"}'.encode(), b'{"us": 1}']
+    protocol, received = _receive(b"\n".join(lines) + b"\n", burst, frames=True)
+
+    assert received == lines
+    assert protocol.stats.errors == 0
+
+
+def test_corrupt_frame():
+    frame = bytearray(encode_frame(SCHEMA_ID, _records(0, 10)))
+    frame[-1] ^= 0xFF
+    protocol, received = _receive(bytes(frame) + b'{"us": 1}\n' + encode_frame(SCHEMA_ID, _records(10, 2)),
+                                  64, frames=True)
+
+    assert protocol.stats.errors == 1
+    assert received[-1]["us"].tolist() == [10, 11]